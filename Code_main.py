@@ -1,20 +1,32 @@
-from EPANET_IWS.functions import fn
-from EPANET_IWS.functions import graph
+from EPANET_IWS.pipeline import run_iws
+from EPANET_IWS.iws_log import configure
 from os import getcwd
-import sys
-import subprocess
+import os
+import numpy as np
 
-'''Install EpyT and import EPANET'''
-subprocess.call([sys.executable, '-m', 'pip', 'install', 'epyt'])
-fn().info1_display()
-from epyt import epanet
+'''EpyT must be installed once beforehand (pip install epyt), nothing is installed here'''
+
+'''Logging'''
+log_level = 'info'  # 'debug' (every artificial element and time step), 'info' (progress summaries and results) or
+# 'quiet' (warnings only)
+log_file = None  # File receiving a time stamped copy of the messages (None for none)
+log_interval = 10  # Seconds between two progress summaries of the hydraulic simulation
+configure(log_level, log_file)
+
+'''Profiling'''
+profile_run = False  # Save the time, calls and peak memory of every phase and of the fn/graph methods (Profile.json
+# in the results folder)
+profile_memory = True  # Track the peak memory of every phase (tracemalloc, slows the run down)
+profile_cprofile = False  # Also save the cProfile statistics of the whole run (Profile.prof)
 
 '''INPUT'''
 network = 'Suvarnadhara_final3'  # Network name
-
-'''Load network'''
-file_path = getcwd() + '\\Networks\\' + str(network) + '.inp'
-d = epanet(file_path)
+input_folder = os.path.join(getcwd(), 'Networks')  # Folder of the input file
+output_folder = os.path.join(getcwd(), 'Analysis_Results')  # Folder of the result files and plots
+separate_run_folder = True  # Run on a copy of the input file and write the modified network, result files, plots and
+# profile of every run into a new subfolder of output_folder, so runs sharing a file system never share files (False
+# saves the modified network in input_folder and the results directly in output_folder, overwriting earlier runs)
+file_path = os.path.join(input_folder, str(network) + '.inp')
 
 '''INPUTS'''
 omitted_nodes = ['1']  # Name(s) of node(s) omitted from adding artificial (and/or) imaginary string
@@ -23,143 +35,52 @@ pc_demand = 60  # Per capita demand in Litres per day
 household = 5  # Average number of consumers per household
 tank_in_pipe_name = ['1'] # Name(s) of the inflow pipe(s) to the tank
 tank_out_pipe_name = ['P-448'] # name(s) of the outflow pipe(s) from the tank
-
-'''Get consumer type data'''
-cons_type_info = fn().consumer_type(d, d.getNodeCount(), d.getNodeReservoirCount(), d.getNodeTankCount(), a_nodes,
-                                    omitted_nodes)
-
-'''Modifying the network'''
-elevation_data = fn().node_elevations(d)
-base_demand_data = fn().node_base_demands(d)
-demand_nodes_org = d.getNodeCount() - d.getNodeReservoirCount() - d.getNodeTankCount()  # Storing the original count
-# of demand nodes in the network
-for n in range(demand_nodes_org):
-    '''Setting node base demand to zero'''
-    set_zero_base_demand = fn().set_zero_base_demand(d, n, omitted_nodes)
-
-    '''Adding two artificial pseudo nodes (for connecting flow control valve)'''
-    artificial_pseudo_nodes_data = fn().get_artificial_pseudo_nodes_info(d, n, cons_type_info)
-    add_artificial_pseudo_nodes = fn().add_artificial_pseudo_nodes(d, n, artificial_pseudo_nodes_data)
-
-    '''Adding artificial overhead tank'''
-    artificial_oht_data = fn().get_artificial_oht_info(d, n, pc_demand, household, cons_type_info, elevation_data,
-                                                       base_demand_data)
-    add_artificial_oht = fn().add_artificial_oht(d, n, artificial_oht_data)
-
-    '''Adding artificial consumer node (point where original water consumption occurs)'''
-    artificial_consumer_node_data = fn().get_artificial_consumer_node_info(d, n, base_demand_data[n], cons_type_info)
-    add_artificial_consumer_node = fn().add_artificial_consumer_node(d, n, artificial_consumer_node_data)
-
-    '''Adding artificial pseudo pipe between ferrule point (node) and pseudo node-1'''
-    artificial_pseudo_pipe_data = fn().get_artificial_pseudo_pipe_info(d, n, cons_type_info)
-    add_artificial_pseudo_pipe = fn().add_artificial_pseudo_pipe(d, n, artificial_pseudo_pipe_data)
-
-    '''Adding artificial FCV between pseudo nodes'''
-    artificial_FCV_data = fn().get_artificial_FCV_info(d, n, cons_type_info)
-    add_artificial_FCV = fn().add_artificial_FCV(d, n, artificial_FCV_data)
-
-    '''Adding artificial pipe between pseudo node-2 and overhead tank'''
-    artificial_pipe_to_oht_data = fn().get_artificial_pipe_to_oht_info(d, n, pc_demand, household, base_demand_data,
-                                                                       cons_type_info)
-    add_artificial_pipe_to_oht = fn().add_artificial_pipe_to_oht(d, n, artificial_pipe_to_oht_data)
-
-    '''Adding artificial pipe between artificial overhead tank and artificial consumer node'''
-    artificial_pipe_to_consumer_data = fn().get_artificial_pipe_to_consumer_info(d, n, pc_demand, household,
-                                                                                 base_demand_data, cons_type_info)
-    add_artificial_pipe_to_consumer = fn().add_artificial_pipe_to_consumer(d, n, artificial_pipe_to_consumer_data)
-
-'''Save modified network'''
-mod_network = network + '_mod'
-file_path_mod = getcwd() + '\\Networks\\' + str(mod_network) + '.inp'
-d.saveInputFile(file_path_mod)
-
-'''INPUTS'''
-d.setTimeHydraulicStep(300)  # Simulation time step in seconds
-d.setTimeSimulationDuration(20 * 24 * 3600)  # Simulation time duration in seconds
-
-'''Update the simulation information'''
-node_names = d.getNodeNameID()
-link_names = d.getLinkNameID()
-dh = d.getTimeHydraulicStep()
-T = d.getTimeSimulationDuration()
-total_h = int(T / dh)
-d.openHydraulicAnalysis()
-d.initializeHydraulicAnalysis()
-
-'''Initializing the variables'''
-t, t_step, Time, Pressure, Demand, Flow, TankVolume = 0, 0, [], [], [], [], []
-
-'''Starting the hydraulic simulation'''
-while t < T:
-    for i in range(demand_nodes_org):
-        if cons_type_info[i] != '' and cons_type_info[i] == 'B':
-            if t_step == 0:
-                p_head_node = 0
-            else:
-                p_head_node = Pressure[t_step - 1][i]
-            artificial_FCV_index = link_names.index(node_names[i] + str('-FCV')) + 1
-            artificial_FCV_setting = fn().compute_artificial_FCV_setting(d, i, p_head_node)
-            d.setLinkSettings(artificial_FCV_index, artificial_FCV_setting)
-
-    t = d.runHydraulicAnalysis()
-    Time.append(t)
-    Pressure.append(d.getNodePressure())
-    Demand.append(d.getNodeActualDemand())
-    Flow.append(d.getLinkFlows())
-    TankVolume.append(d.getNodeTankVolume())
-    d.nextHydraulicAnalysisStep()
-    t_step += 1
-    print("Hydraulic simulation time (s): %d\nHydraulic simulation time step: %d" % (t, t_step))
-d.closeHydraulicAnalysis()
-
-'''Processing the analysis report'''
-filtered_steps = fn().filter_time_steps((len(Time) - 1) / (int((d.getTimeSimulationDuration() / dh) + 1) - 1),
-                                        len(Time), dh, Time)
-hydraulic_report = fn().final_report(d, filtered_steps, Time, Pressure, Demand, Flow, TankVolume)
-
-dp = d.getTimePatternStep()
-total_p = int(T/ dp)
-'''Generating the output array for pipe flows'''
-Flow_out = fn().make_Flow_output(d, dh, dp, total_p, hydraulic_report[3])
-'''Generating the output array for tank volumes'''
-TankVolume_out = fn().make_TankVolume_output(d, dh, dp, total_p, hydraulic_report[4])
-'''Generating the output array for required demands at every node'''
-Required_Demand_out = fn().make_Required_Demand_output(d, demand_nodes_org, total_p, cons_type_info)
-'''Determing demand deficit values at every pattern step for every node
---- If the water volume avaialble in the household tank available during a pattern step is 
-more than the required demand, then deficit is zero. Else, deficit is estimated as:
-    ((volume available - volume required)/ volume required) * 100
-For omitted nodes, deficit is -100 ---
-'''
-Demand_deficit_out = fn().compute_demand_deficit(d, demand_nodes_org, dp, total_p, TankVolume_out,
-                                                 Required_Demand_out, cons_type_info)
-
-'''Determing relative distribution of water values at every pattern step for every node
---- ratio of water withdrawn at any node to the water delivered
-For omitted nodes, value is -100---
-'''
-Relative_distribution_out = fn().compute_relative_distribution(d, demand_nodes_org, tank_out_pipe_name, Flow_out, 
-                                                               cons_type_info)   
-folder_name = getcwd() + '\\Analysis_Results'
-
-'''Creating CSV files'''
-csv_out = fn().make_csv_out(Flow_out, TankVolume_out, Demand_deficit_out, Relative_distribution_out, folder_name)
-
-'''Creating plots'''
-plot_strored_volume_vs_time = graph().plot_stored_volume_vs_time(d, demand_nodes_org, TankVolume_out, cons_type_info, 
-                                                                 folder_name)
-plot_required_volume_vs_time = graph().plot_required_volume_vs_time(d, demand_nodes_org, dp, Required_Demand_out, 
-                                                                    cons_type_info, folder_name)
-plot_volume_surplus_deficit_vs_time = graph().plot_volume_surplus_deficit_vs_time(d, demand_nodes_org, dp, TankVolume_out, 
-                                                                                  Required_Demand_out, cons_type_info, 
-                                                                                  folder_name)
-plot_deficit_vs_time = graph().plot_deficit_percent_vs_time(d, demand_nodes_org, Demand_deficit_out, cons_type_info, 
-                                                            folder_name)
-plot_relative_distribution_vs_time = graph().plot_relative_distribution_vs_time(d, demand_nodes_org, Relative_distribution_out, 
-                                                                                cons_type_info, folder_name)
-
-"""CHECKING THE MASS BALANCE"""
-check = fn().check_mass_balance(d, demand_nodes_org, tank_in_pipe_name, tank_out_pipe_name, Flow_out, cons_type_info)
-
-d.unload()
-print("\nAnalysis completed.")
\ No newline at end of file
+supply_hours = None  # Daily supply periods [[start, end], ...] in hours of the tank inflow pipes, e.g. [[6, 10]] (None
+# keeps the supply of the input file)
+hydraulic_step = 300  # Simulation time step in seconds
+days = 20  # Simulation time duration in days
+use_conversion_cache = False  # Reuse the conversion of a previous run when the input file and parameters are unchanged
+conversion_cache_size = 500 * 1024 ** 2  # Maximum size of the conversion cache in bytes
+write_results = True  # Create result files (flows, tank volumes, demand deficit and relative distribution)
+result_format = 'npz'  # 'npz' (compressed, named columns), 'parquet' (requires pyarrow) or 'csv'
+make_plots = True  # Generate plots of the results
+check_balance = True  # Check the mass balance of inflows and outflows
+stream_outputs = True  # Average flows and tank volumes into pattern steps during the simulation
+recorder_folder = None  # Folder for memory-mapped result buffers of long simulations (None keeps them in RAM)
+fast_engine = True  # Run the hydraulic simulation loop directly on the EPANET library (iws_engine)
+record_dtype = np.float64  # np.float32 halves the recorded results, or a dictionary per variable, e.g.
+# {'Pressure': np.float64, 'Flow': np.float32, 'TankVolume': np.float32} (see results_recorder for the error bounds)
+record_every = 1  # Record every k-th hydraulic time step (k must divide the hydraulic steps per pattern step)
+convergence_tolerance = None  # Stop once the household tank volume and inflow profiles of two consecutive days differ
+# by less than this relative RMS difference, e.g. 0.01 (None simulates the full duration)
+convergence_mode = 'extrapolate'  # After an early stop: 'extrapolate' (repeat the last day) or 'trim' (simulated days)
+use_warm_start = False  # Start the household tanks from the state saved by the last run with the same modified network
+# and hydraulic time step instead of empty (the final state of this run is saved for the next one)
+warm_start_fcv = True  # Also start the FCV settings from the saved state
+plot_processes = 1  # Number of worker processes rendering the plots (1 renders them in this process)
+plot_mode = 'node'  # 'node' (one PNG per node and plot type), 'pdf' or 'png' (many nodes per page)
+plot_dpi = 150  # Resolution of the 'pdf' and 'png' reports
+plot_nodes = None  # Name(s) of node(s) included in the reports (None includes every Type B node)
+plot_worst = None  # Number of nodes with the largest mean demand deficit included in the reports (None for all)
+
+'''Converting the network, simulating it and evaluating the results (see EPANET_IWS.pipeline)'''
+results = run_iws(file_path, {'omitted_nodes': omitted_nodes, 'a_nodes': a_nodes, 'pc_demand': pc_demand,
+                              'household': household, 'tank_in_pipe_name': tank_in_pipe_name,
+                              'tank_out_pipe_name': tank_out_pipe_name, 'supply_hours': supply_hours,
+                              'hydraulic_step': hydraulic_step, 'days': days,
+                              'use_conversion_cache': use_conversion_cache,
+                              'conversion_cache_size': conversion_cache_size, 'write_results': write_results,
+                              'result_format': result_format, 'make_plots': make_plots, 'check_balance': check_balance,
+                              'stream_outputs': stream_outputs, 'recorder_folder': recorder_folder,
+                              'fast_engine': fast_engine, 'record_dtype': record_dtype, 'record_every': record_every,
+                              'convergence_tolerance': convergence_tolerance, 'convergence_mode': convergence_mode,
+                              'use_warm_start': use_warm_start, 'warm_start_fcv': warm_start_fcv,
+                              'plot_processes': plot_processes, 'plot_mode': plot_mode, 'plot_dpi': plot_dpi,
+                              'plot_nodes': plot_nodes, 'plot_worst': plot_worst, 'output_folder': output_folder,
+                              'log_interval': log_interval, 'profile': profile_run, 'profile_memory': profile_memory,
+                              'profile_cprofile': profile_cprofile, 'separate_run_folder': separate_run_folder})
+Flow_out = results['Flow_out']
+TankVolume_out = results['TankVolume_out']
+Required_Demand_out = results['Required_Demand_out']
+Demand_deficit_out = results['Demand_deficit_out']
+Relative_distribution_out = results['Relative_distribution_out']
@@ -0,0 +1,49 @@
+import numpy as np
+from EPANET_IWS.iws_log import logger
+
+
+class capture_plan:
+
+    def __init__(self, d, idx, arr1, arr2, results=True, plots=True, mass_balance=True, convergence=False):
+        """Deriving the smallest set of nodes, links and tanks needed by the requested outputs
+        :d: EPANET model (after network modification)
+        :idx: network index of the modified network
+        :arr1: list of tank inflow pipe names
+        :arr2: list of tank outflow pipe names
+        :results: result files are created (flows of every link and volumes of every tank)
+        :plots: plots are generated (overhead tank volumes, demand deficit and relative distribution)
+        :mass_balance: mass balance is checked (tank inflow, tank outflow and withdrawal at every consumer)
+        :convergence: daily profiles are compared by convergence_monitor (overhead tank volumes and consumer inflow)
+        All the index arrays hold sorted 0-based positions (EPANET index - 1) of the recorded elements.
+        """
+        consumers = idx.consumers
+        self.results = results
+        self.plots = plots
+        self.mass_balance = mass_balance
+        self.convergence = convergence
+        '''Pressures are only used for the artificial FCV settings (ferrule points of Type B consumers)'''
+        self.nodes = consumers
+        self.pressure_columns = np.arange(len(consumers))  # column of every consumer in the recorded pressures
+        '''Demands are not used by any output'''
+        self.demand_nodes = np.array([], dtype=int)
+        links = []
+        tanks = []
+        if results:
+            links.append(np.arange(d.getLinkCount()))
+            tanks.append(np.arange(d.getNodeTankCount()))
+        if results or plots:
+            '''Demand deficit (overhead tank volumes) and relative distribution (tank outflow and consumer inflow)'''
+            links.append(idx.link(arr2))
+            links.append(idx.pipe_to_oht[consumers])
+            tanks.append(idx.oht_tank[consumers])
+        if mass_balance:
+            links.append(idx.link(arr1))
+            links.append(idx.link(arr2))
+            links.append(idx.pipe_to_oht[consumers])
+        if convergence:
+            links.append(idx.pipe_to_oht[consumers])
+            tanks.append(idx.oht_tank[consumers])
+        self.links = np.unique(np.concatenate(links + [np.array([], dtype=int)])).astype(int)
+        self.tanks = np.unique(np.concatenate(tanks + [np.array([], dtype=int)])).astype(int)
+        logger.info("Capture plan: %d pressures, %d demands, %d flows and %d tank volumes per time step.",
+                    len(self.nodes), len(self.demand_nodes), len(self.links), len(self.tanks))
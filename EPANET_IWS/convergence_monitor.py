@@ -0,0 +1,102 @@
+import numpy as np
+from EPANET_IWS.iws_log import logger
+
+
+class convergence_monitor:
+
+    def __init__(self, idx, num1, num2, num3=0.01, callback=None):
+        """Detecting the periodic regime of the household tanks while the hydraulic simulation runs
+        :idx: network index of the aggregated flow and tank volume columns (see network_index.remap)
+        :num1: demand pattern time step in seconds
+        :num2: total number of pattern steps
+        :num3: tolerance of the difference between the profiles of two consecutive days
+        :callback: function called with the pattern step number and its averaged rows after the monitor (optional)
+        Used as the callback of pattern_aggregator. At the end of every day the overhead tank volume and the
+        -AP_to_OHT flow profiles (one value per pattern step and consumer) are compared with the previous day; the
+        difference is the RMS of the changes divided by the RMS of the previous day's profile.
+        """
+        self.steps_per_day = int(24 * 3600 / num1)
+        if self.steps_per_day * num1 != 24 * 3600:
+            raise ValueError("The demand pattern time step (%d s) does not divide a day." % num1)
+        self.total_p = num2
+        self.tolerance = num3
+        self.callback = callback
+        consumers = idx.consumers
+        self.tanks = idx.oht_tank[consumers]
+        self.pipes = idx.pipe_to_oht[consumers]
+        '''Profiles of the current and the previous day'''
+        self.profiles = {'TankVolume': np.zeros((2, self.steps_per_day, len(consumers))),
+                         'Flow': np.zeros((2, self.steps_per_day, len(consumers)))}
+        self.differences = []  # (tank volume, flow) difference of every completed day from the second one
+        self.converged = False
+        self.days = 0  # completed days
+        self.warmup_days = None
+
+    @property
+    def completed_steps(self):
+        return self.days * self.steps_per_day
+
+    def _difference(self, arr1, arr2):
+        """Relative RMS difference of two profiles
+        :arr1: profile of the current day
+        :arr2: profile of the previous day
+        :return: RMS of the differences divided by the RMS of the previous day's profile
+        """
+        scale = np.sqrt(np.mean(np.square(arr2)))
+        change = np.sqrt(np.mean(np.square(arr1 - arr2)))
+        if scale == 0:
+            return 0.0 if change == 0 else np.inf
+        return change / scale
+
+    def add(self, num1, dict1):
+        """Adding the averages of a completed pattern step (pattern_aggregator callback)
+        :num1: pattern step number
+        :dict1: dictionary of the averaged 'Flow' and 'TankVolume' rows
+        """
+        if self.converged != True:
+            day, slot = divmod(num1, self.steps_per_day)
+            self.profiles['TankVolume'][day % 2, slot] = dict1['TankVolume'][self.tanks]
+            self.profiles['Flow'][day % 2, slot] = dict1['Flow'][self.pipes]
+            if slot == self.steps_per_day - 1:
+                self.days = day + 1
+                if day > 0:
+                    differences = (self._difference(self.profiles['TankVolume'][day % 2],
+                                                    self.profiles['TankVolume'][1 - day % 2]),
+                                   self._difference(self.profiles['Flow'][day % 2], self.profiles['Flow'][1 - day % 2]))
+                    self.differences.append(differences)
+                    if max(differences) <= self.tolerance and self.completed_steps < self.total_p:
+                        self.converged = True
+                        self.warmup_days = day - 1  # the previous day already belongs to the periodic regime
+        if self.callback is not None:
+            self.callback(num1, dict1)
+
+    def report(self):
+        """Logging the detected warm-up period
+        :return: number of warm-up days (None if no periodic regime was detected)
+        """
+        if self.converged:
+            logger.info("Periodic regime reached after a warm-up of %d days (tank volumes and flows of days %d and %d "
+                        "differ by %.2e and %.2e); simulation stopped after %d of %d days.", self.warmup_days,
+                        self.days - 1, self.days, self.differences[-1][0], self.differences[-1][1], self.days,
+                        self.total_p // self.steps_per_day)
+        elif self.differences != []:
+            logger.info("No periodic regime detected (tank volumes and flows of the last two days differ by %.2e and "
+                        "%.2e).", *self.differences[-1])
+        return self.warmup_days
+
+    def complete(self, arr1, str1='extrapolate'):
+        """Completing an output array after the simulation stopped early
+        :arr1: output array (one row per pattern step)
+        :str1: 'extrapolate' repeats the last simulated day up to the full duration, 'trim' keeps the simulated days
+        :return: completed output array (arr1 itself if the simulation ran the full duration)
+        """
+        if self.converged != True:
+            return arr1
+        if str1 == 'trim':
+            return arr1[:self.completed_steps]
+        if str1 != 'extrapolate':
+            raise ValueError("Unknown completion mode '%s' ('extrapolate' or 'trim')." % str1)
+        n = self.completed_steps
+        rows = n - self.steps_per_day + (np.arange(n, len(arr1)) - n) % self.steps_per_day
+        arr1[n:] = arr1[rows]
+        return arr1
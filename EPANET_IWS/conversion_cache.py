@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import numpy as np
+from EPANET_IWS.result_store import atomic_path
+
+
+class conversion_cache:
+
+    version = 2  # Increase whenever the network modification changes, so older entries are not reused
+
+    def __init__(self, str1, num1=500 * 1024 ** 2, num2=None):
+        """Content-addressed cache of network conversions
+        :str1: cache folder name
+        :num1: maximum total size of the cached conversions in bytes
+        :num2: maximum number of cached conversions (optional)
+        An entry holds the artificial element properties of a conversion (see get_artificial_elements_info) at full
+        precision. A cached run adds them to the network in memory with add_artificial_elements, exactly as a fresh
+        conversion does, so runs with and without the cache give identical results.
+        """
+        self.folder = str1
+        self.max_size = num1
+        self.max_entries = num2
+        if os.path.exists(self.folder) != True:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def key(self, str1, dict1):
+        """Generating the cache key of a conversion
+        :str1: path of the original input file
+        :dict1: IWS parameters used for the conversion (omitted nodes, Type A nodes, per capita demand, ...)
+        :return: SHA-256 hash of the input file contents and the IWS parameters
+        """
+        h = hashlib.sha256()
+        with open(str1, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        h.update(json.dumps({'version': self.version, 'parameters': dict1}, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def path(self, str1):
+        """Getting the file path of a cache entry
+        :str1: cache key
+        :return: path of the cached conversion
+        """
+        return os.path.join(self.folder, str1 + '.npz')
+
+    def get(self, str1):
+        """Looking up a conversion in the cache
+        :str1: cache key
+        :return: artificial element properties (same layout as get_artificial_elements_info, None if not cached)
+        """
+        file_path = self.path(str1)
+        try:
+            with np.load(file_path) as data:
+                members = {name: data[name] for name in data.files}
+            os.utime(file_path)  # Mark as recently used
+        except FileNotFoundError:  # not cached, or evicted by a concurrent run
+            return None
+        dict1 = {'nodes': members['nodes'], 'names': members['names'].tolist()}
+        for name in ['pseudo_nodes', 'oht', 'consumer_node', 'pseudo_pipe', 'FCV', 'pipe_to_oht', 'pipe_to_consumer']:
+            dict1[name] = [members['%s_%d' % (name, k)] for k in range(int(members[name + '_count']))]
+        dict1['consumer_node'][2] = dict1['consumer_node'][2].tolist()  # pattern names
+        return dict1
+
+    def put(self, str1, dict1):
+        """Storing a conversion in the cache
+        :str1: cache key
+        :dict1: artificial element properties (from get_artificial_elements_info)
+        :return: path of the cached conversion
+        """
+        members = {'nodes': np.asarray(dict1['nodes']), 'names': np.array(dict1['names'], dtype=str)}
+        for name, arrays in dict1.items():
+            if name in ['nodes', 'names']:
+                continue
+            members[name + '_count'] = np.array(len(arrays))
+            for k, array in enumerate(arrays):
+                if isinstance(array, np.ndarray):
+                    members['%s_%d' % (name, k)] = array
+                else:
+                    members['%s_%d' % (name, k)] = np.array(array, dtype=str)  # pattern names
+        file_path = self.path(str1)
+        with atomic_path(file_path) as temp_path:  # concurrent runs never read a partial file
+            np.savez(temp_path, **members)
+        self.evict(str1)
+        return file_path
+
+    def evict(self, str1=None):
+        """Removing the least recently used conversions until the cache is within its size limits
+        :str1: cache key that must be kept (optional)
+        :return: list of removed cache keys
+        """
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.npz') and name.startswith('.') != True:  # skipping files being written (atomic_path)
+                file_path = os.path.join(self.folder, name)
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name, file_path))
+        entries.sort()
+        total_size = sum(entry[1] for entry in entries)
+        count = len(entries)
+        entries = [entry for entry in entries if entry[2] != str(str1) + '.npz']
+        removed = []
+        while entries != [] and (total_size > self.max_size or
+                                 (self.max_entries is not None and count > self.max_entries)):
+            mtime, size, name, file_path = entries.pop(0)
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            count -= 1
+            removed.append(name[:-len('.npz')])
+        return removed
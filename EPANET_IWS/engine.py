@@ -0,0 +1,152 @@
+import ctypes
+import numpy as np
+from EPANET_IWS.iws_log import logger
+
+
+class iws_engine:
+
+    def __init__(self, d, fcv=None):
+        """Hydraulic simulation loop running directly on the EPANET toolkit library (ctypes)
+        :d: EPANET model (after network modification, with the final hydraulic time step and simulation duration)
+        :fcv: artificial FCV data (fcv_batch, optional, no FCV settings are applied if not given)
+        The results of a time step are read into preallocated single precision buffers (legacy toolkit functions),
+        once per variable and time step. The getter methods have the names of the EpyT methods, so results_recorder
+        and pattern_aggregator can record from the engine instead of the EPANET model.
+        """
+        if d.api._ph is not None:
+            raise ValueError("iws_engine uses the legacy toolkit functions, the EPANET model must be opened without "
+                             "a project handle.")
+        self.d = d
+        self.fcv = fcv
+        '''Same library file as EpyT, so the functions work on the model opened by EpyT'''
+        self.lib = ctypes.CDLL(d.api.LibEPANET)
+        self._runH = self.lib.ENrunH
+        self._runH.argtypes = [ctypes.POINTER(ctypes.c_long)]
+        self._nextH = self.lib.ENnextH
+        self._nextH.argtypes = [ctypes.POINTER(ctypes.c_long)]
+        self._getnodevalues = self.lib.ENgetnodevalues
+        self._getnodevalues.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_float)]
+        self._getlinkvalues = self.lib.ENgetlinkvalues
+        self._getlinkvalues.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_float)]
+        self._setlinkvalue = self.lib.ENsetlinkvalue
+        self._setlinkvalue.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_float]
+        self._geterror = self.lib.ENgeterror
+        self._geterror.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        self.time = ctypes.c_long()
+        self.time_step = ctypes.c_long()
+        constants = d.ToolkitConstants
+        node_count = d.getNodeCount()
+        link_count = d.getLinkCount()
+        self.tanks = np.asarray(d.getNodeTankIndex(), dtype=int).reshape(-1) - 1  # node positions of the tanks
+        '''Toolkit function, property code and size of every variable'''
+        self.sources = {'Pressure': (self._getnodevalues, constants.EN_PRESSURE, node_count),
+                        'Demand': (self._getnodevalues, constants.EN_DEMAND, node_count),
+                        'Flow': (self._getlinkvalues, constants.EN_FLOW, link_count),
+                        'TankVolume': (self._getnodevalues, constants.EN_TANKVOLUME, node_count)}
+        '''Preallocated buffers filled by the toolkit and the values handed out (double precision, as in EpyT)'''
+        self.raw = {name: (ctypes.c_float * size)() for name, (func, code, size) in self.sources.items()}
+        self.views = {name: np.ctypeslib.as_array(buffer) for name, buffer in self.raw.items()}
+        self.values = {'Pressure': np.zeros(node_count), 'Demand': np.zeros(node_count), 'Flow': np.zeros(link_count),
+                       'TankVolume': np.zeros(len(self.tanks))}
+        self.fetched = {name: False for name in self.sources}
+        self.setting_code = constants.EN_SETTING
+        self.steps = 0
+        self.warned = set()  # warning codes reported during the current run
+
+    def _check(self, num1):
+        """Handling a toolkit error code (errors are raised, warnings are logged once per code and run)
+        :num1: error code
+        """
+        if num1:
+            buffer = ctypes.create_string_buffer(150)
+            self._geterror(num1, buffer, 150)
+            message = buffer.value.decode()
+            if num1 > 100:
+                raise RuntimeError("EPANET error %d during the hydraulic simulation: %s" % (num1, message))
+            if num1 not in self.warned:
+                self.warned.add(num1)
+                logger.warning("%s (EPANET warning %d, reported once per run)", message, num1)
+
+    def _fetch(self, str1):
+        """Reading the values of a variable at the current time step (once per time step)
+        :str1: variable name ('Pressure', 'Demand', 'Flow' or 'TankVolume')
+        :return: array of values (the same array is reused at every time step)
+        """
+        values = self.values[str1]
+        if self.fetched[str1] != True:
+            func, code, size = self.sources[str1]
+            self._check(func(code, self.raw[str1]))
+            if str1 == 'TankVolume':
+                values[:] = self.views[str1][self.tanks]
+            else:
+                values[:] = self.views[str1]
+            self.fetched[str1] = True
+        return values
+
+    def getNodePressure(self):
+        return self._fetch('Pressure')
+
+    def getNodeActualDemand(self):
+        return self._fetch('Demand')
+
+    def getLinkFlows(self):
+        return self._fetch('Flow')
+
+    def getNodeTankVolume(self):
+        return self._fetch('TankVolume')
+
+    def set_settings(self, arr1):
+        """Set the flow settings of all the artificial FCVs
+        :arr1: recorded pressure heads of the previous hydraulic step (None for the first step)
+        :return: array of FCV settings applied
+        """
+        settings = self.fcv.compute_settings(arr1)
+        setter = self._setlinkvalue
+        code = self.setting_code
+        for valve, setting in zip(self.fcv.valves.tolist(), settings.tolist()):
+            self._check(setter(valve, code, setting))
+        return settings
+
+    def run_step(self):
+        """Computing the hydraulic solution at the current time
+        :return: current hydraulic simulation time in seconds
+        """
+        self._check(self._runH(ctypes.byref(self.time)))
+        for name in self.fetched:
+            self.fetched[name] = False
+        self.steps += 1
+        return self.time.value
+
+    def next_step(self):
+        """Advancing to the next hydraulic event
+        :return: time until the next hydraulic event in seconds (0 at the end of the simulation)
+        """
+        self._check(self._nextH(ctypes.byref(self.time_step)))
+        return self.time_step.value
+
+    def run(self, num1, recorder, aggregator=None, monitor=None, progress=None):
+        """Running the hydraulic simulation with the artificial FCV settings updated at every time step
+        :num1: simulation time duration in seconds
+        :recorder: results recorder (the pressures of the previous time step give the FCV settings)
+        :aggregator: pattern aggregator (optional)
+        :monitor: convergence monitor (optional, the simulation stops once it has converged)
+        :progress: progress summaries (optional, see iws_log.progress)
+        :return: number of hydraulic time steps
+        """
+        self.d.openHydraulicAnalysis()
+        self.d.initializeHydraulicAnalysis()
+        t = 0
+        self.steps = 0
+        self.warned = set()
+        while t < num1 and (monitor is None or monitor.converged != True):
+            if self.fcv is not None:
+                self.set_settings(recorder.last('Pressure'))
+            t = self.run_step()
+            recorder.record(self, t)
+            if aggregator is not None:
+                aggregator.add(self, t)
+            self.next_step()
+            if progress is not None:
+                progress.update(t)
+        self.d.closeHydraulicAnalysis()
+        return self.steps
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class fcv_batch:
+
+    def __init__(self, d, idx, arr1=None):
+        """Caching the artificial pipe (between pseudo node-2 and oht) properties of every Type B consumer
+        :d: EPANET model (after network modification)
+        :idx: network index of the modified network
+        :arr1: column of every consumer in the recorded pressures (optional, see capture_plan.pressure_columns)
+        """
+        flow_unit = d.getFlowUnits()
+        self.nodes = idx.consumers  # ferrule point (original demand node) of every consumer
+        self.pressure_columns = self.nodes if arr1 is None else np.asarray(arr1)
+        self.valves = idx.fcv[self.nodes] + 1
+        pipes = list(idx.pipe_to_oht[self.nodes] + 1)
+        self.elevation_difference = 7  # 7 m difference between ferrule point and OHT base
+        self.L = np.trunc(d.getLinkLength(pipes))  # length of artificial pipe to OHT
+        self.D = np.trunc(d.getLinkDiameter(pipes))  # diameter of artificial pipe to OHT
+        self.CHW = np.trunc(d.getLinkRoughnessCoeff(pipes))  # CHW of artificial pipe to OHT
+        self.kL = np.full(len(pipes), 5.90)  # minor loss coefficient
+        self.pressure_factor = 1
+        if flow_unit == 'GPM':
+            self.L = self.L * 0.3048
+            self.D = self.D / 0.0394
+            self.pressure_factor = 0.70325
+            self.flow_factor = (1 / 6.3e-5)
+        elif flow_unit == 'LPS':
+            self.flow_factor = 1000
+        elif flow_unit == 'LPM':
+            self.flow_factor = (1 / 1.67e-5)
+        elif flow_unit == 'CMH':
+            self.flow_factor = 3600
+        else:
+            self.flow_factor = 1
+        '''Resistance of the artificial pipe (Hazen-Williams) and its minor loss'''
+        self.A = 10.68 * self.L / (self.CHW * (self.D / 1000) ** 4.87)
+        self.B = 8 * self.kL / (9.81 * (self.D / 1000) ** 2)
+        self.setting_code = d.ToolkitConstants.EN_SETTING
+        self.initial_settings = None  # settings of the first step (e.g. from a warm start snapshot)
+
+    def compute_settings(self, arr1):
+        """Compute the flow settings of all the artificial FCVs
+        :arr1: recorded pressure heads of the previous hydraulic step (None for the first step)
+        :return: array of FCV settings (one per Type B consumer)
+        """
+        if arr1 is None and self.initial_settings is not None:
+            return self.initial_settings.copy()
+        if arr1 is None:
+            head = np.zeros(len(self.nodes))
+        else:
+            head = np.asarray(arr1)[self.pressure_columns] * self.pressure_factor
+        available_head = head - self.elevation_difference
+        q_max = np.zeros(len(self.nodes))
+        flowing = available_head > 0
+        q_max[flowing] = (available_head[flowing] / (self.A[flowing] + self.B[flowing])) ** 0.5
+        return q_max * self.flow_factor
+
+    def set_settings(self, d, arr1):
+        """Set the flow settings of all the artificial FCVs
+        :d: EPANET model
+        :arr1: recorded pressure heads of the previous hydraulic step (None for the first step)
+        :return: array of FCV settings applied
+        """
+        settings = self.compute_settings(arr1)
+        for valve, setting in zip(self.valves.tolist(), settings.tolist()):
+            d.api.ENsetlinkvalue(valve, self.setting_code, setting)
+        return settings
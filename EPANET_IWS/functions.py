@@ -1,16 +1,18 @@
 import numpy as np
 import math
 import copy
-import pandas as pd
-from matplotlib import pyplot as plt
-import matplotlib as mpl
-import os
+from EPANET_IWS.network_index import network_index
+from EPANET_IWS.iws_log import logger
+from EPANET_IWS.result_store import result_writer
+
+'''matplotlib (plot_render) and pandas are imported by the methods using them, so runs without plots or CSV files
+do not load them'''
 
 
 class fn:
 
     def info1_display(self):
-        print("EPyT installed successfully.")
+        logger.info("EPyT installed successfully.")
 
     def consumer_type(self, d, num1, num2, num3, arr1, arr2):
         """Defining the consumer types at nodes
@@ -33,7 +35,7 @@ class fn:
                     consumer_type.append('B')
             else:
                 consumer_type.append('')
-        print("Consumer type data updated successfully.")
+        logger.info("Consumer type data updated successfully.")
         return consumer_type
 
     def node_elevations(self, d):
@@ -45,7 +47,7 @@ class fn:
         flow_unit = d.getFlowUnits()
         if flow_unit == 'GPM':
             node_elevations = np.multiply(node_elevations, 0.3048)
-        print("Node elevations updated.")
+        logger.debug("Node elevations updated.")
         return node_elevations
 
     def node_base_demands(self, d):
@@ -65,7 +67,7 @@ class fn:
             node_base_demands = np.multiply(node_base_demands, 1.67e-5)
         elif flow_unit == 'CMH':
             node_base_demands = np.multiply(node_base_demands, (1 / 3600))
-        print("Node base demands updated.")
+        logger.debug("Node base demands updated.")
         return node_base_demands
 
     def set_zero_base_demand(self, d, num1, arr1):
@@ -93,10 +95,10 @@ class fn:
             demand_pseudo_node = 0  # zero base demand
             elevation_pseudo_node = d.getNodeElevations()[num1] + elevation_difference
             pseudo_node_properties = [elevation_pseudo_node, demand_pseudo_node]
-            print("Artificial pseudo node properties generated for Node '" + node_names[num1] + "'")
+            logger.debug("Artificial pseudo node properties generated for Node '%s'", node_names[num1])
         else:
             pseudo_node_properties = []
-            print("Omitted Node '" + node_names[num1] + "'. No information generated for artificial pseudo node.")
+            logger.debug("Omitted Node '%s'. No information generated for artificial pseudo node.", node_names[num1])
         return pseudo_node_properties
 
     def add_artificial_pseudo_nodes(self, d, num1, arr1):
@@ -113,7 +115,7 @@ class fn:
                 artificial_pseudo_node_index = d.addNodeJunction(artificial_pseudo_node_name)
                 d.setNodeElevations(artificial_pseudo_node_index, arr1[0])
                 d.setNodeBaseDemands(artificial_pseudo_node_index, arr1[1])
-            print("Artificial pseudo nodes added for Node '" + node_names[num1] + "'")
+            logger.debug("Artificial pseudo nodes added for Node '%s'", node_names[num1])
 
     def get_artificial_oht_info(self, d, num1, num2, num3, arr1, arr2, arr3):
         """Generating artificial overhead tank properties at every node (Type A and B)
@@ -146,10 +148,10 @@ class fn:
                 diameter_artificial_oht *= 39.37
             artificial_oht_properties = [elevation_artificial_oht, diameter_artificial_oht, max_level_artificial_oht,
                                          min_level_artificial_oht, initial_level_artificial_oht]
-            print("Artificial overhead tank properties generated for Node '" + node_names[num1] + "'")
+            logger.debug("Artificial overhead tank properties generated for Node '%s'", node_names[num1])
         else:
             artificial_oht_properties = []
-            print("Omitted Node '" + node_names[num1] + "'. No information generated for artificial tank.")
+            logger.debug("Omitted Node '%s'. No information generated for artificial tank.", node_names[num1])
         return artificial_oht_properties
 
     def add_artificial_oht(self, d, num1, arr1):
@@ -168,7 +170,7 @@ class fn:
             d.setNodeTankMaximumWaterLevel(artificial_oht_index, arr1[2])
             d.setNodeTankMinimumWaterLevel(artificial_oht_index, arr1[3])
             d.setNodeTankInitialLevel(artificial_oht_index, arr1[4])
-            print("Artificial overhead tank added for Node '" + node_names[num1] + "'")
+            logger.debug("Artificial overhead tank added for Node '%s'", node_names[num1])
 
     def get_artificial_consumer_node_info(self, d, num1, num2, arr1):
         """Generating 'consumer' node properties at every node (Type A and B)
@@ -196,10 +198,10 @@ class fn:
                 demand_consumer_node = num2
             elevation_consumer_node = d.getNodeElevations()[num1] + elevation_difference
             consumer_node_properties = [elevation_consumer_node, demand_consumer_node]
-            print("Artificial consumer node properties generated for Node '" + node_names[num1] + "'")
+            logger.debug("Artificial consumer node properties generated for Node '%s'", node_names[num1])
         else:
             consumer_node_properties = []
-            print("Omitted Node '" + node_names[num1] + "'. No information generated for artificial consumer node.")
+            logger.debug("Omitted Node '%s'. No information generated for artificial consumer node.", node_names[num1])
         return consumer_node_properties
 
     def add_artificial_consumer_node(self, d, num1, arr1):
@@ -216,7 +218,7 @@ class fn:
             d.setNodeElevations(artificial_consumer_node_index, arr1[0])
             d.setNodeBaseDemands(artificial_consumer_node_index, arr1[1])
             d.setNodeDemandPatternIndex(artificial_consumer_node_index, 1, d.getNodeDemandPatternIndex()[1][num1])
-            print("Artificial consumer node added for Node '" + node_names[num1] + "'")
+            logger.debug("Artificial consumer node added for Node '%s'", node_names[num1])
 
     def get_artificial_pseudo_pipe_info(self, d, num1, arr1):
         """Generating artificial pseudo pipe (between ferrule point and pseudo node-1) properties
@@ -237,13 +239,12 @@ class fn:
                 artificial_pseudo_pipe_diameter *= 0.0394
             artificial_pseudo_pipe_properties = [artificial_pseudo_pipe_length, artificial_pseudo_pipe_diameter,
                                                  artificial_pseudo_pipe_CHW, artificial_pseudo_pipe_rough_coeff]
-            print("Artificial pseudo pipe (between ferrule point and pseudo node-1) properties generated for Node '" +
-                  node_names[num1] + "'")
+            logger.debug("Artificial pseudo pipe (between ferrule point and pseudo node-1) properties generated for "
+                         "Node '%s'", node_names[num1])
         else:
             artificial_pseudo_pipe_properties = []
-            print("Omitted Node '" + node_names[
-                num1] + "'. No information generated for artificial pseudo pipe (between ferrule point and "
-                        "pseudo node-1).")
+            logger.debug("Omitted Node '%s'. No information generated for artificial pseudo pipe (between ferrule "
+                         "point and pseudo node-1).", node_names[num1])
         return artificial_pseudo_pipe_properties
 
     def add_artificial_pseudo_pipe(self, d, num1, arr1):
@@ -262,8 +263,8 @@ class fn:
             d.setLinkDiameter(artificial_pseudo_pipe_index, arr1[1])
             d.setLinkRoughnessCoeff(artificial_pseudo_pipe_index, arr1[2])
             d.setLinkMinorLossCoeff(artificial_pseudo_pipe_index, arr1[3])
-            print("Artificial pseudo pipe (between ferrule point and pseudo node-1) added for Node '" + node_names[
-                num1] + "'")
+            logger.debug("Artificial pseudo pipe (between ferrule point and pseudo node-1) added for Node '%s'",
+                         node_names[num1])
 
     def get_artificial_FCV_info(self, d, num1, arr1):
         """Getting artificial FCV (between pseudo nodes) properties
@@ -279,12 +280,11 @@ class fn:
             if flow_unit == 'GPM':
                 artificial_FCV_diameter *= 0.0394
             artificial_FCV_properties = [artificial_FCV_diameter]
-            print("Artificial FCV (between pseudo nodes) properties generated for Node '" +
-                  node_names[num1] + "'")
+            logger.debug("Artificial FCV (between pseudo nodes) properties generated for Node '%s'", node_names[num1])
         else:
             artificial_FCV_properties = []
-            print("Omitted Node '" + node_names[
-                num1] + "'. No information generated for artificial FCV (between pseudo nodes).")
+            logger.debug("Omitted Node '%s'. No information generated for artificial FCV (between pseudo nodes).",
+                         node_names[num1])
         return artificial_FCV_properties
 
     def add_artificial_FCV(self, d, num1, arr1):
@@ -300,7 +300,7 @@ class fn:
             artificial_FCV_index = d.addLinkValveFCV(artificial_FCV_name, node_names[num1] + str('-PseudoN-1'),
                                                      node_names[num1] + str('-PseudoN-2'))
             d.setLinkDiameter(artificial_FCV_index, arr1[0])
-            print("Artificial FCV (between pseudo nodes) added for Node '" + node_names[num1] + "'")
+            logger.debug("Artificial FCV (between pseudo nodes) added for Node '%s'", node_names[num1])
 
     def get_artificial_pipe_to_oht_info(self, d, num1, num2, num3, arr1, arr2):
         """Generating artificial pipe (between pseudo node-2 and oht) properties
@@ -326,12 +326,12 @@ class fn:
                 artificial_pipe_diameter *= 0.0394
             artificial_pipe_to_oht_properties = [artificial_pipe_length, artificial_pipe_diameter,
                                                  artificial_pipe_CHW, artificial_pipe_rough_coeff]
-            print("Artificial pipe (between pseudo node-2 and overhead tank) properties generated for Node '" +
-                  node_names[num1] + "'")
+            logger.debug("Artificial pipe (between pseudo node-2 and overhead tank) properties generated for Node '%s'",
+                         node_names[num1])
         else:
             artificial_pipe_to_oht_properties = []
-            print("Omitted Node '" + node_names[
-                num1] + "'. No information generated for artificial pipe (between pseudo node-2 and overhead tank).")
+            logger.debug("Omitted Node '%s'. No information generated for artificial pipe (between pseudo node-2 and "
+                         "overhead tank).", node_names[num1])
         return artificial_pipe_to_oht_properties
 
     def add_artificial_pipe_to_oht(self, d, num1, arr1):
@@ -351,7 +351,8 @@ class fn:
             d.setLinkDiameter(artificial_pipe_to_oht_index, arr1[1])
             d.setLinkRoughnessCoeff(artificial_pipe_to_oht_index, arr1[2])
             d.setLinkMinorLossCoeff(artificial_pipe_to_oht_index, arr1[3])
-            print("Artificial pipe (between pseudo node-2 and overhead tank) added for Node '" + node_names[num1] + "'")
+            logger.debug("Artificial pipe (between pseudo node-2 and overhead tank) added for Node '%s'",
+                         node_names[num1])
 
     def get_artificial_pipe_to_consumer_info(self, d, num1, num2, num3, arr1, arr2):
         """Generating artificial pipe (between oht and consumer node) properties
@@ -377,14 +378,12 @@ class fn:
                 artificial_pipe_diameter *= 0.0394
             artificial_pipe_to_consumer_properties = [artificial_pipe_length, artificial_pipe_diameter,
                                                       artificial_pipe_CHW, artificial_pipe_rough_coeff]
-            print(
-                "Artificial pipe (between overhead tank and artificial consumer node) properties generated for Node '" +
-                node_names[num1] + "'")
+            logger.debug("Artificial pipe (between overhead tank and artificial consumer node) properties generated "
+                         "for Node '%s'", node_names[num1])
         else:
             artificial_pipe_to_consumer_properties = []
-            print("Omitted Node '" + node_names[
-                num1] + "'. No information generated for artificial pipe (between overhead tank and artificial "
-                        "consumer node).")
+            logger.debug("Omitted Node '%s'. No information generated for artificial pipe (between overhead tank and "
+                         "artificial consumer node).", node_names[num1])
         return artificial_pipe_to_consumer_properties
 
     def add_artificial_pipe_to_consumer(self, d, num1, arr1):
@@ -404,18 +403,166 @@ class fn:
             d.setLinkDiameter(artificial_pipe_to_consumer_index, arr1[1])
             d.setLinkRoughnessCoeff(artificial_pipe_to_consumer_index, arr1[2])
             d.setLinkMinorLossCoeff(artificial_pipe_to_consumer_index, arr1[3])
-            print("Artificial pipe (between overhead tank and artificial consumer node) added for Node '" + node_names[
-                num1] + "'")
+            logger.debug("Artificial pipe (between overhead tank and artificial consumer node) added for Node '%s'",
+                         node_names[num1])
+
+    def get_artificial_elements_info(self, d, num1, num2, num3, arr1, arr2):
+        """Generating the properties of all the artificial elements at once (vectorized over Type B nodes)
+        :d: EPANET model
+        :num1: original number of demand nodes (before network modification)
+        :num2: per capita demand
+        :num3: number of consumers per household
+        :arr1: consumer type list
+        :arr2: node base demands
+        :return: dictionary of artificial element properties (one array entry per Type B node)
+        """
+        node_names = d.getNodeNameID()
+        flow_unit = d.getFlowUnits()
+        node_elevations = np.asarray(d.getNodeElevations(), dtype=float)
+        node_patterns = d.getNodeDemandPatternIndex()[1]
+        pattern_names = d.getPatternNameID()
+        nodes = np.array([n for n in range(num1) if arr1[n] != '' and arr1[n] == 'B'], dtype=int)
+        elevations = node_elevations[nodes]
+        base_demands = np.asarray(arr2, dtype=float)[nodes]
+        households = np.ceil((base_demands * (24 * 3600 * 1000) / num2) / num3)
+        '''Artificial pseudo nodes'''
+        pseudo_node_elevation = elevations + 0  # 0 m difference between ferrule point and the pseudo nodes
+        pseudo_node_demand = np.zeros(len(nodes))  # zero base demand
+        '''Artificial overhead tank'''
+        oht_elevation_difference = 7  # 7 m difference between ferrule point and OHT base
+        volume_oht_house = 1  # 1 cub.m (1000 L) capacity considered for individual household overhead tanks
+        max_level_artificial_oht = 2  # 2 m maximum height considered for individual household overhead tanks
+        initial_level_artificial_oht = 0  # Initial condition: Individual household overhead tanks are empty
+        min_level_artificial_oht = 0  # 0 m is the minimum level considered
+        volume_artificial_oht = volume_oht_house * households
+        diameter_artificial_oht = np.sqrt((4 * volume_artificial_oht) / (math.pi * max_level_artificial_oht))
+        '''Artificial consumer node'''
+        consumer_elevation_difference = 7  # 7 m difference between ferrule point and the actual consumer node
+        '''Artificial pipes and FCV'''
+        pseudo_pipe_length = 0.1  # 0.1 m long pseudo pipe
+        pseudo_pipe_diameter = 1000  # 1000 mm diameter
+        FCV_diameter = 1000  # 1000 mm diameter
+        pipe_to_oht_length = 10  # 10 m is the distance between ferrule point and oht inlet
+        pipe_to_oht_diameter = 19.03 * households ** 0.38  # 19.03 mm (0.75 in pipe) per household
+        pipe_to_consumer_length = 5  # 5 m is the distance between oht outlet and consumer taps
+        pipe_to_consumer_diameter = 12.69 * households ** 0.38  # 12.69 mm (0.50 in pipe) per household
+        artificial_pipe_CHW = 130
+        artificial_pipe_rough_coeff = 0.02
+        if flow_unit == 'GPM':
+            oht_elevation_difference = oht_elevation_difference / 0.3048
+            max_level_artificial_oht /= 0.3048
+            initial_level_artificial_oht /= 0.3048
+            diameter_artificial_oht = diameter_artificial_oht * 39.37
+            consumer_elevation_difference = consumer_elevation_difference / 0.304
+            consumer_node_demand = base_demands * (1 / 6.3e-5)
+            pseudo_pipe_length /= 0.3048
+            pseudo_pipe_diameter *= 0.0394
+            FCV_diameter *= 0.0394
+            pipe_to_oht_length /= 0.3048
+            pipe_to_oht_diameter = pipe_to_oht_diameter * 0.0394
+            pipe_to_consumer_length /= 0.3048
+            pipe_to_consumer_diameter = pipe_to_consumer_diameter * 0.0394
+        elif flow_unit == 'LPS':
+            consumer_node_demand = base_demands * 1000
+        elif flow_unit == 'LPM':
+            consumer_node_demand = base_demands * (1 / 1.67e-5)
+        elif flow_unit == 'CMH':
+            consumer_node_demand = base_demands * 3600
+        else:
+            consumer_node_demand = base_demands
+        consumer_node_pattern = [pattern_names[node_patterns[n] - 1] if node_patterns[n] > 0 else '' for n in nodes]
+        count = len(nodes)
+        artificial_elements_properties = {
+            'nodes': nodes,
+            'names': [node_names[n] for n in nodes],
+            'pseudo_nodes': [pseudo_node_elevation, pseudo_node_demand],
+            'oht': [elevations + oht_elevation_difference, diameter_artificial_oht,
+                    np.full(count, max_level_artificial_oht), np.full(count, min_level_artificial_oht),
+                    np.full(count, initial_level_artificial_oht)],
+            'consumer_node': [elevations + consumer_elevation_difference, consumer_node_demand,
+                              consumer_node_pattern],
+            'pseudo_pipe': [np.full(count, pseudo_pipe_length), np.full(count, pseudo_pipe_diameter),
+                            np.full(count, artificial_pipe_CHW), np.full(count, artificial_pipe_rough_coeff)],
+            'FCV': [np.full(count, FCV_diameter)],
+            'pipe_to_oht': [np.full(count, pipe_to_oht_length), pipe_to_oht_diameter,
+                            np.full(count, artificial_pipe_CHW), np.full(count, artificial_pipe_rough_coeff)],
+            'pipe_to_consumer': [np.full(count, pipe_to_consumer_length), pipe_to_consumer_diameter,
+                                 np.full(count, artificial_pipe_CHW), np.full(count, artificial_pipe_rough_coeff)]
+        }
+        logger.info("Artificial element properties generated for %d nodes.", count)
+        return artificial_elements_properties
+
+    def add_artificial_elements(self, d, num1, arr1, dict1):
+        """Adding all the artificial elements to the network in a single pass
+        :d: EPANET model
+        :num1: original number of demand nodes (before network modification)
+        :arr1: names of omitted nodes
+        :dict1: artificial element properties (from get_artificial_elements_info)
+        :return: add pseudo nodes, overhead tanks, consumer nodes, pipes and FCVs of every Type B node
+        Elements are added in the same order as the node-by-node get_*_info/add_* methods, so the element
+        indices and the saved network are identical.
+        """
+        node_names = d.getNodeNameID()
+        api = d.api
+        constants = d.ToolkitConstants
+        for n in range(num1):  # through the toolkit, setNodeBaseDemands rescans all node types on every call
+            if node_names[n] not in arr1:
+                api.ENsetnodevalue(n + 1, constants.EN_BASEDEMAND, 0)
+        names = dict1['names']
+        pseudo_nodes = [a.tolist() for a in dict1['pseudo_nodes']]
+        oht = [a.tolist() for a in dict1['oht']]
+        consumer_node = [a.tolist() for a in dict1['consumer_node'][:2]] + [dict1['consumer_node'][2]]
+        pseudo_pipe = [a.tolist() for a in dict1['pseudo_pipe']]
+        FCV = [a.tolist() for a in dict1['FCV']]
+        pipe_to_oht = [a.tolist() for a in dict1['pipe_to_oht']]
+        pipe_to_consumer = [a.tolist() for a in dict1['pipe_to_consumer']]
+        '''Junctions (pseudo nodes and consumer nodes)'''
+        for i, name in enumerate(names):
+            for j in range(2):
+                index = api.ENaddnode(name + str('-PseudoN-') + str(j + 1), constants.EN_JUNCTION)
+                api.ENsetcoord(index, 0, 0)
+                api.ENsetjuncdata(index, pseudo_nodes[0][i], pseudo_nodes[1][i], '')
+            index = api.ENaddnode(name + str('-CN'), constants.EN_JUNCTION)
+            api.ENsetcoord(index, 0, 0)
+            api.ENsetjuncdata(index, consumer_node[0][i], consumer_node[1][i], consumer_node[2][i])
+        '''Overhead tanks'''
+        for i, name in enumerate(names):
+            index = api.ENaddnode(name + str('-OHT'), constants.EN_TANK)
+            api.ENsetcoord(index, 0, 0)
+            api.ENsetnodevalue(index, constants.EN_ELEVATION, oht[0][i])
+            api.ENsetnodevalue(index, constants.EN_TANKDIAM, oht[1][i])
+            api.ENsetnodevalue(index, constants.EN_MAXLEVEL, oht[2][i])
+            api.ENsetnodevalue(index, constants.EN_MINLEVEL, oht[3][i])
+            api.ENsetnodevalue(index, constants.EN_TANKLEVEL, oht[4][i])
+        '''Pipes and FCVs'''
+        for i, name in enumerate(names):
+            index = api.ENaddlink(name + str('-PseudoP'), constants.EN_CVPIPE, name, name + str('-PseudoN-1'))
+            api.ENsetpipedata(index, pseudo_pipe[0][i], pseudo_pipe[1][i], pseudo_pipe[2][i], pseudo_pipe[3][i])
+            index = api.ENaddlink(name + str('-FCV'), constants.EN_FCV, name + str('-PseudoN-1'),
+                                  name + str('-PseudoN-2'))
+            api.ENsetlinkvalue(index, constants.EN_DIAMETER, FCV[0][i])
+            index = api.ENaddlink(name + str('-AP_to_OHT'), constants.EN_CVPIPE, name + str('-PseudoN-2'),
+                                  name + str('-OHT'))
+            api.ENsetpipedata(index, pipe_to_oht[0][i], pipe_to_oht[1][i], pipe_to_oht[2][i], pipe_to_oht[3][i])
+            index = api.ENaddlink(name + str('-AP_to_CN'), constants.EN_PIPE, name + str('-OHT'),
+                                  name + str('-CN'))
+            api.ENsetpipedata(index, pipe_to_consumer[0][i], pipe_to_consumer[1][i], pipe_to_consumer[2][i],
+                              pipe_to_consumer[3][i])
+        logger.info("Artificial elements added for %d nodes.", len(names))
 
-    def compute_artificial_FCV_setting(self, d, num1, num2):
+    def compute_artificial_FCV_setting(self, d, num1, num2, idx=None):
         """Compute the flow setting of the artificial FCV connected to every consumer node
         :d: EPANET model
         :num1: demand node index
         :num2: node pressure head value
+        :idx: network index of the modified network (optional)
         """
         elevation_difference = 7  # 7 m difference between ferrule point and OHT base
         flow_unit = d.getFlowUnits()
-        artificial_pipe_to_oht_index = d.getLinkNameID().index(d.getNodeNameID()[num1] + str('-AP_to_OHT')) + 1
+        if idx is not None:
+            artificial_pipe_to_oht_index = idx.pipe_to_oht[num1] + 1
+        else:
+            artificial_pipe_to_oht_index = d.getLinkNameID().index(d.getNodeNameID()[num1] + str('-AP_to_OHT')) + 1
 
         L = int(d.getLinkLength(artificial_pipe_to_oht_index))  # length of artificial pipe to OHT
         D = int(d.getLinkDiameter(artificial_pipe_to_oht_index))  # diameter of artificial pipe to OHT
@@ -467,6 +614,16 @@ class fn:
                     arr2[step] = time
         return filtered_time_steps
 
+    def scale_rows(self, arr1, num1, num2=4096):
+        """Multiplying an array by a factor in place, a block of rows at a time
+        :arr1: array (in RAM or memory-mapped)
+        :num1: factor
+        :num2: number of rows per block
+        """
+        for start in range(0, len(arr1), num2):
+            block = arr1[start: start + num2]
+            np.multiply(block, num1, out=block)
+
     def final_report(self, d, arr1, arr2, arr3, arr4, arr5, arr6):
         """Creating the final report of the hydraulic analysis
         :d: EPANET model
@@ -477,106 +634,117 @@ class fn:
         :arr5: Flow rate
         :arr6: Tank volume
         :return: list of all outputs
+        Arrays passed in are converted to the output units in place (float32 results stay float32).
         """
         flow_unit = d.getFlowUnits()
-        '''Converting lists to arrays'''
-        T_array = np.array(arr2)
-        P_array = np.array(arr3)
-        D_array = np.array(arr4)
-        F_array = np.array(arr5)
-        TV_array = np.array(arr6)
+        '''Converting lists to arrays (arrays, e.g. results_recorder views, are used as they are)'''
+        T = np.asarray(arr2)
+        P = np.asarray(arr3)
+        D = np.asarray(arr4)
+        F = np.asarray(arr5)
+        TV = np.asarray(arr6)
         '''Deleting unwanted rows'''
-        T = np.delete(T_array, arr1, 0)
-        P = np.delete(P_array, arr1, 0)
-        D = np.delete(D_array, arr1, 0)
-        F = np.delete(F_array, arr1, 0)
-        TV = np.delete(TV_array, arr1, 0)
-        
+        if len(arr1) > 0:
+            T = np.delete(T, arr1, 0)
+            P = np.delete(P, arr1, 0)
+            D = np.delete(D, arr1, 0)
+            F = np.delete(F, arr1, 0)
+            TV = np.delete(TV, arr1, 0)
+        '''Converting units in place (a block of rows at a time, so memory-mapped results stay out of core)'''
         if flow_unit == 'GPM':
-            P = np.multiply(P, 0.70325)
-            D = np.multiply(D, 6.3e-5)
-            F = np.multiply(F, 6.3e-5)
-            TV = np.multiply(TV, 0.0283)
+            self.scale_rows(P, 0.70325)
+            self.scale_rows(D, 6.3e-5)
+            self.scale_rows(F, 6.3e-5)
+            self.scale_rows(TV, 0.0283)
         elif flow_unit == 'LPS':
-            D = np.multiply(D, (1/ 1000))
-            F = np.multiply(F, (1/ 1000))
+            self.scale_rows(D, (1/ 1000))
+            self.scale_rows(F, (1/ 1000))
         elif flow_unit == 'LPM':
-            D = np.multiply(D, 1.67e-5)
-            F = np.multiply(F, 1.67e-5)
+            self.scale_rows(D, 1.67e-5)
+            self.scale_rows(F, 1.67e-5)
         elif flow_unit == 'CMH':
-            D = np.multiply(D,(1/ 3600))
-            F = np.multiply(F,(1/ 3600))
+            self.scale_rows(D,(1/ 3600))
+            self.scale_rows(F,(1/ 3600))
         report = [T, P, D, F, TV]
-        print("\nFinal report prepared.\n")
+        logger.info("Final report prepared.")
         return report
     
+    def pattern_step_mean(self, num1, num2, num3, arr1, num4=8192):
+        """Averaging hydraulic step results into pattern steps
+        :num1: time between two recorded steps in seconds (hydraulic time step times the recording interval)
+        :num2: demand pattern time step in seconds
+        :num3: total number of pattern steps
+        :arr1: filtered output (one row per recorded step, in RAM or memory-mapped)
+        :num4: number of hydraulic steps averaged at a time (bounds the memory used by the block copies)
+        :return: array of pattern step averages (one row per pattern step, double precision for float32 results too)
+        """
+        arr1 = np.asarray(arr1)
+        m = int(num2/ num1)
+        full = min(num3, len(arr1) // m)  # pattern steps with all their hydraulic steps available
+        out = np.zeros((num3, arr1.shape[1]))
+        '''Every element's hydraulic steps are made contiguous, so the averages match np.mean of each column'''
+        step = max(1, num4 // m)  # pattern steps per block
+        for start in range(0, full, step):
+            stop = min(start + step, full)
+            blocks = arr1[start * m: stop * m].reshape(stop - start, m, arr1.shape[1]).transpose(0, 2, 1)
+            out[start: stop] = np.ascontiguousarray(blocks).mean(axis=2, dtype=np.float64)
+        for j in range(full, num3):
+            out[j] = np.ascontiguousarray(arr1[j * m: (j + 1) * m].T).mean(axis=1, dtype=np.float64)
+        return out
+
     def make_Flow_output(self, d, num1, num2, num3, arr1):
         """Generating the output array for pipe flows
         :d: EPANET model
-        :num1: hydraulic simulation time step in seconds
+        :num1: hydraulic simulation time step in seconds (times the recording interval, see results_recorder)
         :num2: demand pattern time step in seconds
         :num3: total number of pattern steps
-        :arr1: filtered flow output
+        :arr1: filtered flow output (one column per recorded link)
         :return: final flow output array
         """
-        Flow_out = np.zeros((num3, d.getLinkCount()))
-        for i in range(d.getLinkCount()):
-            m = int(num2/ num1)
-            a = 0
-            b = a + m
-            for j in range(num3):
-                Flow_out[j, i] = np.mean(arr1[a : b, i])
-                a += m
-                b += m
+        Flow_out = self.pattern_step_mean(num1, num2, num3, arr1)
         Flow_out[Flow_out < 0] = 0
         return Flow_out
     
     def make_TankVolume_output(self, d, num1, num2, num3, arr1):
         """Generating the output array for tank volumes
         :d: EPANET model
-        :num1: hydraulic simulation time step in seconds
+        :num1: hydraulic simulation time step in seconds (times the recording interval, see results_recorder)
         :num2: demand pattern time step in seconds
         :num3: total number of pattern steps
-        :arr1: filtered tank volume output
+        :arr1: filtered tank volume output (one column per recorded tank)
         :return: final tank volume output array
         """
-        TankVolume_out = np.zeros((num3, d.getNodeTankCount()))
-        for i in range(d.getNodeTankCount()):
-            m = int(num2/ num1)
-            a = 0
-            b = a + m
-            for j in range(num3):
-                TankVolume_out[j, i] = np.mean(arr1[a : b, i])
-                a += m
-                b += m
+        TankVolume_out = self.pattern_step_mean(num1, num2, num3, arr1)
         return TankVolume_out
     
-    def make_Required_Demand_output(self, d, num1, num2, arr1):
+    def make_Required_Demand_output(self, d, num1, num2, arr1, idx=None):
         """Generating the output array for required demands at every node
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
         :num2: total number of pattern steps
         :arr1: consumer type list
+        :idx: network index of the modified network (optional)
         :return: final array of required nodal demands
         """
-        patterns = list(d.getNodeDemandPatternIndex().items())[0][1]
+        if idx is None:
+            idx = network_index(d, num1, arr1)
         Required_Demand_out = np.zeros((num2, num1))
-        for n in range(num1):
-            if arr1[n] != '' and arr1[n] == 'B':
-                pattern_id = patterns[n]
-                pattern_array = d.getPattern()[pattern_id - 1]
-                artificial_consumer_node_index = d.getNodeNameID().index(d.getNodeNameID()[n] + str('-CN')) + 1
-                base_demand = list(d.getNodeBaseDemands().items())[0][1][artificial_consumer_node_index - 1]
-                m = int(len(pattern_array))
-                a = 0
-                b = a + m
-                for j in range(int(num2/ len(pattern_array))):
-                    Required_Demand_out[a: b, n] = np.multiply(pattern_array, base_demand)
-                    a += m
-                    b += m
+        consumers = idx.consumers
+        if len(consumers) == 0:
+            return Required_Demand_out
+        consumer_nodes = idx.consumer_node[consumers]
+        patterns = np.asarray(list(d.getNodeDemandPatternIndex().items())[0][1])
+        base_demands = np.asarray(list(d.getNodeBaseDemands().items())[0][1])
+        pattern_arrays = np.asarray(d.getPattern())
+        pattern_arrays = pattern_arrays.reshape(-1, pattern_arrays.shape[-1])
+        '''Pattern multipliers of every consumer node (same pattern as the original node) times its base demand'''
+        demand_arrays = pattern_arrays[patterns[consumer_nodes] - 1] * base_demands[consumer_nodes][:, None]
+        m = demand_arrays.shape[1]
+        repeats = -(-num2 // m)  # a partial last pattern cycle is filled as well
+        Required_Demand_out[:, consumers] = np.tile(demand_arrays.T, (repeats, 1))[:num2]
         return Required_Demand_out
     
-    def compute_demand_deficit(self, d, num1, num2, num3, arr1, arr2, arr3):
+    def compute_demand_deficit(self, d, num1, num2, num3, arr1, arr2, arr3, idx=None):
         """Compute the demand deficit (%) in every consumer node
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
@@ -585,63 +753,63 @@ class fn:
         :arr1: final tank volume output array
         :arr2: final array of required nodal demands
         :arr3: consumer type list
+        :idx: network index of the modified network (optional)
         :return: array of demand deficit (%) in every demand node (-100 value indicate omitted node)
+        Arrays with leading dimensions (e.g. one result set per scenario) are processed in a single batch.
         """
-        Demand_deficit_out = np.zeros((num3, num1))
-        for n in range(num1):
-            if arr3[n] != '' and arr3[n] == 'B':
-                artificial_oht_index = d.getNodeTankNameID().index(d.getNodeNameID()[n] + str('-OHT')) + 1
-                for j in range(num3):
-                    volume_deficit = arr1[j, artificial_oht_index - 1] - arr2[j, n] * (num2/ 1000)
-                    if volume_deficit < 0:
-                        Demand_deficit_out[j , n] = (abs(volume_deficit) / (arr2[j, n] * (num2/ 1000))) * 100
-                    else:
-                        Demand_deficit_out[j , n] = 0
-            else:
-                Demand_deficit_out[: , n] = -100
+        if idx is None:
+            idx = network_index(d, num1, arr3)
+        arr1 = np.asarray(arr1)
+        arr2 = np.asarray(arr2)
+        consumers = idx.consumers
+        Demand_deficit_out = np.full(arr2.shape[:-2] + (num3, num1), -100.0)
+        required_volume = arr2[..., :num3, consumers] * (num2/ 1000)
+        volume_deficit = arr1[..., :num3, idx.oht_tank[consumers]] - required_volume
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Demand_deficit_out[..., consumers] = np.where(volume_deficit < 0,
+                                                          (np.abs(volume_deficit) / required_volume) * 100, 0)
         return Demand_deficit_out
     
-    def compute_relative_distribution(self, d, num1, arr1, arr2, arr3):
+    def compute_relative_distribution(self, d, num1, arr1, arr2, arr3, idx=None):
         """Compute plot of relative distribution of supply for every node (excluding the omitted nodes)
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
         :arr1: list of tank outflow pipe names
         :arr2: final flow output array
         :arr3: consumer type list
+        :idx: network index of the modified network (optional)
         return: array of relative distribution in every demand node
+        Arrays with leading dimensions (e.g. one result set per scenario) are processed in a single batch.
         """
-        tank_outflow = np.zeros(len(arr2))
-        for i in range(len(arr1)):
-            tank_out_pipe_index = d.getLinkNameID().index(arr1[i]) + 1
-            tank_outflow = np.add(tank_outflow, arr2[:, tank_out_pipe_index - 1])
-        Relative_distribution_out = np.zeros((len(arr2), num1))
-        for n in range(num1):
-            if arr3[n] != '' and arr3[n] == 'B':
-                artificial_pipe_to_OHT_index = d.getLinkNameID().index(d.getNodeNameID()[n] + str('-AP_to_OHT')) + 1
-                node_withdrawal = arr2[:, artificial_pipe_to_OHT_index - 1]
-                Relative_distribution_out[:, n] = np.where(tank_outflow == 0, 0, node_withdrawal/tank_outflow)
-            else:
-                Relative_distribution_out[: , n] = -100
+        if idx is None:
+            idx = network_index(d, num1, arr3)
+        arr2 = np.asarray(arr2)
+        consumers = idx.consumers
+        tank_outflow = np.zeros(arr2.shape[:-1])
+        for tank_out_pipe_column in idx.link(arr1):
+            tank_outflow = np.add(tank_outflow, arr2[..., tank_out_pipe_column])
+        tank_outflow = tank_outflow[..., None]
+        Relative_distribution_out = np.full(arr2.shape[:-1] + (num1,), -100.0)
+        node_withdrawal = arr2[..., idx.pipe_to_oht[consumers]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Relative_distribution_out[..., consumers] = np.where(tank_outflow == 0, 0, node_withdrawal/tank_outflow)
         return Relative_distribution_out
     
     def make_csv_out(self, arr1, arr2, arr3, arr4, str1):
-        """Create CSV outputs
+        """Create CSV outputs (the 'csv' format of result_writer, see result_store.write_csv)
         :arr1: final flow output array
         :arr2: final tank volume output array
         :arr3: array of demand deficit (%) in every demand node (-100 value indicate omitted node)
         :arr4: array of relative distribution in every demand node
         :str1: output folder name
-        :return: CSV files
-        """
-        path = str1
-        if os.path.exists(path) != True:
-            os.makedirs(path)
-        pd.DataFrame(arr1). to_csv(path + '\\Flow')
-        pd.DataFrame(arr2). to_csv(path + '\\Tank Volume')
-        pd.DataFrame(arr3). to_csv(path + '\\Demand deficit')
-        pd.DataFrame(arr4). to_csv(path + '\\Relative distribution')
+        :return: list of CSV file paths
+        """
+        writer = result_writer(str1, 'csv')
+        return [writer.write(name, arr, range(np.shape(arr)[1]), np.arange(len(arr)), {})
+                for name, arr in [('Flow', arr1), ('Tank Volume', arr2), ('Demand deficit', arr3),
+                                  ('Relative distribution', arr4)]]
         
-    def check_mass_balance(self, d, num1, arr1, arr2, arr3, arr4):
+    def check_mass_balance(self, d, num1, arr1, arr2, arr3, arr4, idx=None):
         """Checking the mass balance of inflows and outflows
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
@@ -649,109 +817,91 @@ class fn:
         :arr2: list of tank outflow pipe names
         :arr3: final flow output array
         :arr4: consumer type list
-        :return: print mass balance results
-        """
-        net_tank_inflow = 0
-        net_tank_outflow = 0
-        node_withdrawal = 0
-        for i in range(len(arr1)):
-            tank_in_pipe_index = d.getLinkNameID().index(arr1[i]) + 1
-            net_tank_inflow += sum(arr3[:, tank_in_pipe_index - 1])
-        net_tank_inflow = round(net_tank_inflow, 3)
-        for i in range(len(arr2)):
-            tank_out_pipe_index = d.getLinkNameID().index(arr2[i]) + 1
-            net_tank_outflow += sum(arr3[:, tank_out_pipe_index - 1])
-        for n in range(num1):
-            if arr4[n] != '' and arr4[n] == 'B':
-                artificial_pipe_to_OHT_index = d.getLinkNameID().index(d.getNodeNameID()[n] + str('-AP_to_OHT')) + 1
-                node_withdrawal += sum(arr3[:, artificial_pipe_to_OHT_index - 1])
-        print("Net supply to tank = %.3f m\N{SUPERSCRIPT THREE}/s" % net_tank_inflow)
-        print("Net delivery from tank = %.3f m\N{SUPERSCRIPT THREE}/s" % net_tank_outflow)
-        print("Net water consumption at the nodes = %.3f m\N{SUPERSCRIPT THREE}/s" % node_withdrawal)
-        perc_differnce_consumption = ((node_withdrawal - net_tank_outflow)/ net_tank_outflow) * 100
-        print("\nDifference between delivered and consumed = %.3f percent\n" % perc_differnce_consumption)
+        :idx: network index of the modified network (optional)
+        :return: dictionary of net tank inflow, net tank outflow, node withdrawal and percent difference
+        (print mass balance results for a single result set; arrays with leading dimensions give one value per set)
+        """
+        if idx is None:
+            idx = network_index(d, num1, arr4)
+        arr3 = np.asarray(arr3)
+        net_tank_inflow = np.round(arr3[..., idx.link(arr1)].sum(axis=(-2, -1)), 3)
+        net_tank_outflow = arr3[..., idx.link(arr2)].sum(axis=(-2, -1))
+        node_withdrawal = arr3[..., idx.pipe_to_oht[idx.consumers]].sum(axis=(-2, -1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            perc_differnce_consumption = ((node_withdrawal - net_tank_outflow)/ net_tank_outflow) * 100
+        if arr3.ndim == 2:
+            logger.info("Net supply to tank = %.3f m\N{SUPERSCRIPT THREE}/s", net_tank_inflow)
+            logger.info("Net delivery from tank = %.3f m\N{SUPERSCRIPT THREE}/s", net_tank_outflow)
+            logger.info("Net water consumption at the nodes = %.3f m\N{SUPERSCRIPT THREE}/s", node_withdrawal)
+            logger.info("Difference between delivered and consumed = %.3f percent", perc_differnce_consumption)
+        return {'net_tank_inflow': net_tank_inflow, 'net_tank_outflow': net_tank_outflow,
+                'node_withdrawal': node_withdrawal, 'difference_percent': perc_differnce_consumption}
             
         
 class graph:
 
-    def plot_demand_deficit_vs_time(self, d, num1, arr1, arr2, str1):
+    def oht_capacities(self, d, num1, arr1, idx):
+        """Getting the overhead tank capacity of every node (tank data are read once)
+        :d: EPANET model
+        :num1: original number of demand nodes (before network modification)
+        :arr1: consumer type list
+        :idx: network index of the modified network
+        :return: dictionary of overhead tank capacity in m3 (rounded up) with node position as key
+        """
+        tank_data = d.getNodeTankData()
+        tank_position = {name: i for i, name in enumerate(d.getNodeTankNameID())}  # idx may be remapped to columns
+        capacities = {}
+        for n in range(num1):
+            if arr1[n] != '' and arr1[n] == 'B':
+                artificial_oht_index = tank_position[idx.node_names[n] + '-OHT'] + 1
+                artificial_oht_diameter = tank_data.Diameter[artificial_oht_index - 1]
+                artificial_oht_depth = tank_data.Maximum_Water_Level[artificial_oht_index - 1]
+                if d.getFlowUnits() == 'GPM':
+                    artificial_oht_diameter *= 0.0254
+                    artificial_oht_depth *= 0.3048
+                capacities[n] = math.ceil((math.pi/ 4) * artificial_oht_diameter**2 * artificial_oht_depth)
+        return capacities
+
+    def plot_demand_deficit_vs_time(self, d, num1, arr1, arr2, str1, idx=None, processes=1):
         """Generate a plot of demand deficit versus time for every node (excluding the omitted node)
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
         :arr1: output array of demand deficit at every node
         :arr2: consumer type list
         :str1: output folder name
-        return: plot of demand deficit versus time
+        :idx: network index of the modified network (optional)
+        :processes: number of worker processes rendering the plots (optional)
+        return: list of (node name, error message) of the plots that failed in the worker processes
         """
-        mpl.rcParams.update({'font.family':'Sans-Serif'})
-        x = np.arange(1, len(arr1) + 1)
-        for n in range(num1):
-            if arr2[n] != '' and arr2[n] == 'B':
-                title = "Node " + d.getNodeNameID()[n]
-                y = arr1[:, n]
-                plt.plot(x, y, marker = 'o', markersize = 2, markerfacecolor = 'gold', markeredgecolor = 'crimson', markeredgewidth = 0.5, linestyle = '--',
-                         linewidth = 0.5, color = 'k')
-                plt.xticks(np.arange(0, len(arr1) + 1, 48), fontsize = 6)
-                plt.yticks(np.arange(0, 110, 20), fontsize = 6)
-                plt.ylabel('Demand deficit (%)', fontsize = 8)
-                plt.xlabel('Time (h)', fontsize = 8)
-                plt.title(title, fontsize = 6, color = 'r')
-                path = str1 + '\\'
-                if os.path.exists(path) != True:
-                    os.makedirs(path)
-                fig_name = d.getNodeNameID()[n] + ' Demand_deficit_versus_time.png'
-                plt.savefig(path + fig_name, dpi = 600)
-                plt.close()
-        print("Demand deficit verus time plots created.\n")
+        from EPANET_IWS.plot_render import render_plots, render_demand_deficit
+        if idx is None:
+            idx = network_index(d, num1, arr2)
+        jobs = [(idx.node_names[n], arr1[:, n], str1) for n in range(num1) if arr2[n] != '' and arr2[n] == 'B']
+        errors = render_plots(render_demand_deficit, jobs, processes, "Demand deficit")
+        logger.info("Demand deficit verus time plots created.")
+        return errors
         
-    def plot_stored_volume_vs_time(self, d, num1, arr1, arr2, str1):
+    def plot_stored_volume_vs_time(self, d, num1, arr1, arr2, str1, idx=None, processes=1):
         """Generate a plot of stored water volume versus time for every node (excluding the omitted node)
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
         :arr1: final tank volume output array
         :arr2: consumer type list
         :str1: output folder name
-        return: plot of stored water volume versus time
+        :idx: network index of the modified network (optional)
+        :processes: number of worker processes rendering the plots (optional)
+        return: list of (node name, error message) of the plots that failed in the worker processes
         """
-        mpl.rcParams.update({'font.family':'Sans-Serif'})
-        x = np.arange(1, len(arr1) + 1)
-        for n in range(num1):
-            if arr2[n] != '' and arr2[n] == 'B':
-                title = "Node " + d.getNodeNameID()[n]
-                artificial_oht_index = d.getNodeTankNameID().index(d.getNodeNameID()[n] + str('-OHT')) + 1
-                artificial_oht_diameter = d.getNodeTankData().Diameter[artificial_oht_index - 1]
-                artificial_oht_depth = d.getNodeTankData().Maximum_Water_Level[artificial_oht_index - 1]
-                if d.getFlowUnits() == 'GPM':
-                    artificial_oht_diameter *= 0.0254
-                    artificial_oht_depth *= 0.3048
-                ymax = math.ceil((math.pi/ 4) * artificial_oht_diameter**2 * artificial_oht_depth)
-                y = arr1[:, artificial_oht_index - 1]
-                plt.axhline(y = ymax, linestyle = ':', linewidth = 0.5, color = 'b')
-                plt.plot(x, y, marker = 'o', markersize = 2, markerfacecolor = 'gold', markeredgecolor = 'crimson', markeredgewidth = 0.5, linestyle = '--',
-                         linewidth = 0.5, color = 'k')
-                plt.xticks(np.arange(0, len(arr1) + 1, 48), fontsize = 6)
-                if ymax <= 5:
-                    o = 1
-                elif ymax <= 15:
-                    o = 3
-                elif ymax <= 25:
-                    o = 5
-                else:
-                    o = 6
-                plt.yticks(np.arange(0, ymax + o, o), fontsize = 6)
-                plt.ylabel('Stored volume in the \nnode overhead tank (m$^{3}$)', fontsize = 8)
-                plt.xlabel('Time (h)', fontsize = 8)
-                plt.legend(['Overhead tank capacity'], loc = 'best', fontsize = 4)
-                plt.title(title, fontsize = 6, color = 'r')
-                path = str1 + '\\'
-                if os.path.exists(path) != True:
-                    os.makedirs(path)
-                fig_name = d.getNodeNameID()[n] + ' Stored volume_versus_time.png'
-                plt.savefig(path + fig_name, dpi = 600)
-                plt.close()
-        print("Stored volume verus time plots created.\n")
+        from EPANET_IWS.plot_render import render_plots, render_stored_volume
+        if idx is None:
+            idx = network_index(d, num1, arr2)
+        capacities = self.oht_capacities(d, num1, arr2, idx)
+        jobs = [(idx.node_names[n], arr1[:, idx.oht_tank[n]], capacities[n], str1) for n in sorted(capacities)]
+        errors = render_plots(render_stored_volume, jobs, processes, "Stored volume")
+        logger.info("Stored volume verus time plots created.")
+        return errors
         
-    def plot_required_volume_vs_time(self, d, num1, num2, arr1, arr2, str1):
+    def plot_required_volume_vs_time(self, d, num1, num2, arr1, arr2, str1, idx=None, processes=1):
         """Generate a plot of required water volume versus time for every node (excluding the omitted node)
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
@@ -759,39 +909,19 @@ class graph:
         :arr1: final array of required nodal demands
         :arr2: consumer type list
         :str1: output folder name
-        return: plot of required water volume versus time
+        :idx: network index of the modified network (optional)
+        :processes: number of worker processes rendering the plots (optional)
+        return: list of (node name, error message) of the plots that failed in the worker processes
         """
-        mpl.rcParams.update({'font.family':'Sans-Serif'})
-        x = np.arange(1, len(arr1) + 1)
-        for n in range(num1):
-            if arr2[n] != '' and arr2[n] == 'B':
-                title = "Node " + d.getNodeNameID()[n]
-                y = np.multiply(arr1[:, n], num2/ 1000)
-                ymax = np.max(y)
-                plt.plot(x, y, marker = 's', markersize = 2, markerfacecolor = 'cyan', markeredgecolor = 'magenta', markeredgewidth = 0.5, linestyle = '--',
-                         linewidth = 0.5, color = 'k')
-                plt.xticks(np.arange(0, len(arr1) + 1, 48), fontsize = 6)
-                if ymax <= 0.1:
-                    o = 0.01
-                elif ymax <= 0.5:
-                    o = 0.05
-                elif ymax <= 1:
-                    o = 0.1
-                else:
-                    o = 0.2
-                plt.yticks(np.arange(0, ymax + o, o), fontsize = 6)
-                plt.ylabel('Required volume for meeting \nnode demands (m$^{3}$)', fontsize = 8)
-                plt.xlabel('Time (h)', fontsize = 8)
-                plt.title(title, fontsize = 6, color = 'r')
-                path = str1 + '\\'
-                if os.path.exists(path) != True:
-                    os.makedirs(path)
-                fig_name = d.getNodeNameID()[n] + ' Required volume_versus_time.png'
-                plt.savefig(path + fig_name, dpi = 600)
-                plt.close()
-        print("Required volume verus time plots created.\n")
+        from EPANET_IWS.plot_render import render_plots, render_required_volume
+        if idx is None:
+            idx = network_index(d, num1, arr2)
+        jobs = [(idx.node_names[n], num2, arr1[:, n], str1) for n in range(num1) if arr2[n] != '' and arr2[n] == 'B']
+        errors = render_plots(render_required_volume, jobs, processes, "Required volume")
+        logger.info("Required volume verus time plots created.")
+        return errors
     
-    def plot_volume_surplus_deficit_vs_time(self, d, num1, num2, arr1, arr2, arr3, str1):
+    def plot_volume_surplus_deficit_vs_time(self, d, num1, num2, arr1, arr2, arr3, str1, idx=None, processes=1):
         """Generate a plot of surplus or deficit water volume versus time for every node (excluding the omitted node)
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
@@ -800,100 +930,101 @@ class graph:
         :arr2: final array of required nodal demands
         :arr3: consumer type list
         :str1: output folder name
-        return: plot of surplus/ deficit water volume in OHT versus time
+        :idx: network index of the modified network (optional)
+        :processes: number of worker processes rendering the plots (optional)
+        return: list of (node name, error message) of the plots that failed in the worker processes
         """
-        mpl.rcParams.update({'font.family':'Sans-Serif'})
-        x = np.arange(1, len(arr1) + 1)
-        for n in range(num1):
-            if arr3[n] != '' and arr3[n] == 'B':
-                title = "Node " + d.getNodeNameID()[n]
-                artificial_oht_index = d.getNodeTankNameID().index(d.getNodeNameID()[n] + str('-OHT')) + 1
-                y1 = arr1[:, artificial_oht_index - 1]
-                y2 = np.multiply(arr2[:, n], num2/ 1000)
-                y = y1 - y2
-                ymin = math.floor(np.min(y))
-                ymax = math.ceil(np.max(y))
-                plt.plot(x, y, marker = '^', markersize = 3, markerfacecolor = 'w', markeredgecolor = 'r', markeredgewidth = 0.5, linestyle = '--',
-                         linewidth = 0.5, color = 'k')
-                plt.xticks(np.arange(0, len(arr1) + 1, 48), fontsize = 6)
-                if ymax <= 5:
-                    o = 1
-                elif ymax <= 15:
-                    o = 3
-                elif ymax <= 25:
-                    o = 5
-                else:
-                    o = 6
-                plt.yticks(np.arange(ymin, ymax + o, o), fontsize = 6)
-                plt.ylabel('Volume surplus/ deficit in the \nnode overhead tank(m$^{3}$)', fontsize = 8)
-                plt.xlabel('Time (h)', fontsize = 8)
-                plt.title(title, fontsize = 6, color = 'r')
-                path = str1 + '\\'
-                if os.path.exists(path) != True:
-                    os.makedirs(path)
-                fig_name = d.getNodeNameID()[n] + ' Volume surplus or deficit_versus_time.png'
-                plt.savefig(path + fig_name, dpi = 600)
-                plt.close()
-        print("Volume surplus/deficit verus time plots created.\n")
+        from EPANET_IWS.plot_render import render_plots, render_volume_surplus_deficit
+        if idx is None:
+            idx = network_index(d, num1, arr3)
+        jobs = [(idx.node_names[n], num2, arr1[:, idx.oht_tank[n]], arr2[:, n], str1) for n in range(num1)
+                if arr3[n] != '' and arr3[n] == 'B']
+        errors = render_plots(render_volume_surplus_deficit, jobs, processes, "Volume surplus/deficit")
+        logger.info("Volume surplus/deficit verus time plots created.")
+        return errors
         
-    def plot_deficit_percent_vs_time(self, d, num1, arr1, arr2, str1):
+    def plot_deficit_percent_vs_time(self, d, num1, arr1, arr2, str1, idx=None, processes=1):
         """Generate a plot of deficit water volume percentage versus time for every node (excluding the omitted node)
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
         :arr1: array of demand deficit (%) in every demand node (-100 value indicate omitted node)
         :arr2: consumer type list
         :str1: output folder name
-        return: plot of demand deficit percentrage in node versus time
+        :idx: network index of the modified network (optional)
+        :processes: number of worker processes rendering the plots (optional)
+        return: list of (node name, error message) of the plots that failed in the worker processes
         """
-        mpl.rcParams.update({'font.family':'Sans-Serif'})
-        x = np.arange(1, len(arr1) + 1)
-        for n in range(num1):
-            if arr2[n] != '' and arr2[n] == 'B':
-                title = "Node " + d.getNodeNameID()[n]
-                y = arr1[:, n]
-                plt.plot(x, y, marker = 'v', markersize = 3, markerfacecolor = 'y', markeredgecolor = 'b', markeredgewidth = 0.5, linestyle = '--',
-                         linewidth = 0.5, color = 'k')
-                plt.xticks(np.arange(0, len(arr1) + 1, 48), fontsize = 6)
-                plt.yticks(np.arange(0, 110, 20), fontsize = 6)
-                plt.ylabel('Volume deficit in the \nnode overhead tank(%)', fontsize = 8)
-                plt.xlabel('Time (h)', fontsize = 8)
-                plt.title(title, fontsize = 6, color = 'r')
-                path = str1 + '\\'
-                if os.path.exists(path) != True:
-                    os.makedirs(path)
-                fig_name = d.getNodeNameID()[n] + ' Volume deficit percentage_versus_time.png'
-                plt.savefig(path + fig_name, dpi = 600)
-                plt.close()
-        print("Deficit percentage verus time plots created.\n")
+        from EPANET_IWS.plot_render import render_plots, render_deficit_percent
+        if idx is None:
+            idx = network_index(d, num1, arr2)
+        jobs = [(idx.node_names[n], arr1[:, n], str1) for n in range(num1) if arr2[n] != '' and arr2[n] == 'B']
+        errors = render_plots(render_deficit_percent, jobs, processes, "Deficit percentage")
+        logger.info("Deficit percentage verus time plots created.")
+        return errors
         
-    def plot_relative_distribution_vs_time(self, d, num1, arr1, arr2, str1):
+    def plot_relative_distribution_vs_time(self, d, num1, arr1, arr2, str1, idx=None, processes=1):
         """Generate the plot of relative distribution of supply for every node (excluding the omitted nodes)
         :d: EPANET model
         :num1: original number of demand nodes (before network modification)
         :arr1: array of relative distribution in every demand node
         :arr2: consumer type list
         :str1: output folder name
-        return: plot of relative distribution of delivered volume in node versus time 
+        :idx: network index of the modified network (optional)
+        :processes: number of worker processes rendering the plots (optional)
+        return: list of (node name, error message) of the plots that failed in the worker processes
         """
-        mpl.rcParams.update({'font.family':'Sans-Serif'})
-        x = np.arange(1, len(arr1) + 1)
-        for n in range(num1):
-            if arr2[n] != '' and arr2[n] == 'B':
-                title = "Node " + d.getNodeNameID()[n]
-                y = arr1[:, n]
-                plt.plot(x, y, marker = 'o', markersize = 2, markerfacecolor = 'orange', markeredgecolor = 'g', markeredgewidth = 0.5, linestyle = '--',
-                         linewidth = 0.5, color = 'crimson')
-                ymax = round(np.max(y), 1)
-                plt.xticks(np.arange(0, len(arr2) + 1, 48), fontsize = 6)
-                plt.yticks(np.arange(0, ymax + 0.05, 0.05), fontsize = 6)
-                plt.ylabel('Relative distribution of \ndelivered water', fontsize = 8)
-                plt.xlabel('Time (h)', fontsize = 8)
-                plt.title(title, fontsize = 6, color = 'r')
-                path = str1 + '\\'
-                if os.path.exists(path) != True:
-                    os.makedirs(path)
-                fig_name = d.getNodeNameID()[n] + ' Relative distribution_versus_time.png'
-                plt.savefig(path + fig_name, dpi = 600)
-                plt.close()
-        print("Relative distribution verus time plots created.\n")                
-                
+        from EPANET_IWS.plot_render import render_plots, render_relative_distribution
+        if idx is None:
+            idx = network_index(d, num1, arr2)
+        jobs = [(idx.node_names[n], arr1[:, n], len(arr2), str1) for n in range(num1)
+                if arr2[n] != '' and arr2[n] == 'B']
+        errors = render_plots(render_relative_distribution, jobs, processes, "Relative distribution")
+        logger.info("Relative distribution verus time plots created.")
+        return errors
+
+    def plot_report(self, d, num1, num2, arr1, arr2, arr3, arr4, arr5, str1, idx=None, str2='pdf', num3=12, num4=150,
+                    arr6=None, num5=None):
+        """Generate multi-node report pages (one multi-page PDF or tiled PNG pages per plot type) instead of one PNG
+        per node and plot type
+        :d: EPANET model
+        :num1: original number of demand nodes (before network modification)
+        :num2: demand pattern time step in seconds
+        :arr1: final tank volume output array
+        :arr2: final array of required nodal demands
+        :arr3: array of demand deficit (%) in every demand node (-100 value indicate omitted node)
+        :arr4: array of relative distribution in every demand node
+        :arr5: consumer type list
+        :str1: output folder name
+        :idx: network index of the modified network (optional)
+        :str2: output format ('pdf' or 'png')
+        :num3: number of nodes per page
+        :num4: resolution in dots per inch
+        :arr6: list of node names to plot (optional, every Type B node if not given)
+        :num5: plot only this number of nodes with the largest mean demand deficit (optional)
+        return: list of created files
+        """
+        from EPANET_IWS.plot_render import render_report
+        if idx is None:
+            idx = network_index(d, num1, arr5)
+        nodes = [n for n in range(num1) if arr5[n] != '' and arr5[n] == 'B']
+        if arr6 is not None:
+            nodes = [n for n in nodes if idx.node_names[n] in arr6]
+        if num5 is not None:
+            mean_deficit = np.asarray(arr3)[:, nodes].mean(axis=0)
+            order = np.argsort(-mean_deficit, kind='stable')[:num5]
+            nodes = [nodes[k] for k in order]
+        if nodes == []:
+            logger.warning("No Type B node selected for the report, no report created.")
+            return []
+        capacities = self.oht_capacities(d, num1, arr5, idx)
+        names = [idx.node_names[n] for n in nodes]
+        jobs = {'stored_volume': [(arr1[:, idx.oht_tank[n]], capacities[n]) for n in nodes],
+                'required_volume': [(num2, arr2[:, n]) for n in nodes],
+                'volume_surplus_deficit': [(num2, arr1[:, idx.oht_tank[n]], arr2[:, n]) for n in nodes],
+                'deficit_percent': [(arr3[:, n],) for n in nodes],
+                'relative_distribution': [(arr4[:, n], len(arr5)) for n in nodes]}
+        files = []
+        for plot_type, args in jobs.items():
+            files += render_report(plot_type, list(zip(names, args)), str1, str2, num3, num4)
+        logger.info("Report of %d nodes created (%d files).", len(nodes), len(files))
+        return files
@@ -0,0 +1,95 @@
+import logging
+import sys
+import time
+
+'''Logging of the package
+--- Details of every element (network modification) and of every time step (hydraulic simulation) are logged at
+debug level, progress summaries and results at info level and problems at warning level. Until configure is called
+only warnings are shown (Python's default) ---
+'''
+logger = logging.getLogger('EPANET_IWS')
+
+'''Level names accepted by configure'''
+levels = {'debug': logging.DEBUG, 'info': logging.INFO, 'quiet': logging.WARNING}
+
+
+class _stdout_handler(logging.StreamHandler):
+
+    def __init__(self):
+        """Handler writing to the current sys.stdout, so contextlib.redirect_stdout (e.g. the scenario logs of
+        sweep) captures the messages as it captured print
+        """
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+
+def configure(str1='info', str2=None):
+    """Setting the level and the outputs of the package logger (calling it again replaces the previous settings)
+    :str1: level ('debug', 'info' or 'quiet', or a logging level number)
+    :str2: log file path (optional, a copy of the messages with time stamps is appended to it)
+    :return: package logger
+    """
+    level = levels[str1] if isinstance(str1, str) else str1
+    logger.setLevel(level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    handler = _stdout_handler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    if str2 is not None:
+        handler = logging.FileHandler(str2)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+
+def verbose(str1='info'):
+    """Checking whether the messages of a level are shown (e.g. for the display_msg and display_warnings options of
+    EpyT, the latter repeating the toolkit warnings at every time step)
+    :str1: level name ('debug' or 'info')
+    :return: True if the messages are shown
+    """
+    return logger.isEnabledFor(levels[str1])
+
+
+class progress:
+
+    def __init__(self, num1, str1='Hydraulic simulation', num2=10):
+        """Periodic progress summaries of a long loop (instead of one message per iteration)
+        :num1: total amount of work (e.g. simulation duration in seconds)
+        :str1: name of the loop used in the messages
+        :num2: minimum time between two summaries in seconds
+        """
+        self.total = num1
+        self.name = str1
+        self.interval = num2
+        self.steps = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def update(self, num1, num2=1):
+        """Counting finished iterations and logging a summary when the interval has passed
+        :num1: amount of work done so far (e.g. current hydraulic simulation time in seconds)
+        :num2: number of iterations finished since the last call
+        """
+        self.steps += num2
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            elapsed = now - self.start
+            done = min(num1 / self.total, 1) if self.total > 0 else 1
+            logger.info("%s: %.0f%% done, %d steps in %.1f s (%.0f steps/s), about %.0f s left.", self.name,
+                        done * 100, self.steps, elapsed, self.steps / elapsed,
+                        elapsed * (1 - done) / done if done > 0 else float('nan'))
+
+    def close(self):
+        """Logging the final summary
+        :return: number of iterations
+        """
+        logger.info("%s completed in %d steps (%.1f s).", self.name, self.steps, time.perf_counter() - self.start)
+        return self.steps
@@ -0,0 +1,81 @@
+import copy
+import numpy as np
+
+
+class network_index:
+
+    def __init__(self, d, num1, arr1):
+        """Building the name to index lookup tables of the modified network
+        :d: EPANET model (after network modification)
+        :num1: original number of demand nodes (before network modification)
+        :arr1: consumer type list
+        All the index arrays have one entry per original demand node and hold 0-based positions (EPANET index - 1);
+        -1 marks a node without the corresponding artificial element (omitted or Type A nodes).
+        """
+        node_names = d.getNodeNameID()
+        link_names = d.getLinkNameID()
+        tank_names = d.getNodeTankNameID()
+        self.node_lookup = {name: i for i, name in enumerate(node_names)}
+        self.link_lookup = {name: i for i, name in enumerate(link_names)}
+        self.tank_lookup = {name: i for i, name in enumerate(tank_names)}
+        self.node_names = node_names[:num1]
+        self.consumer_type = list(arr1[:num1])
+        self.consumers = np.array([n for n in range(num1) if arr1[n] == 'B'], dtype=int)
+        self.pseudo_node_1 = self._lookup(self.node_lookup, '-PseudoN-1')
+        self.pseudo_node_2 = self._lookup(self.node_lookup, '-PseudoN-2')
+        self.oht_node = self._lookup(self.node_lookup, '-OHT')
+        self.oht_tank = self._lookup(self.tank_lookup, '-OHT')
+        self.consumer_node = self._lookup(self.node_lookup, '-CN')
+        self.pseudo_pipe = self._lookup(self.link_lookup, '-PseudoP')
+        self.fcv = self._lookup(self.link_lookup, '-FCV')
+        self.pipe_to_oht = self._lookup(self.link_lookup, '-AP_to_OHT')
+        self.pipe_to_consumer = self._lookup(self.link_lookup, '-AP_to_CN')
+
+    def _lookup(self, dict1, str1):
+        """Resolving the artificial element with a given suffix for every original demand node
+        :dict1: name to index dictionary
+        :str1: suffix of the artificial element name
+        :return: array of 0-based indices (-1 if the element does not exist)
+        """
+        return np.array([dict1.get(name + str1, -1) for name in self.node_names], dtype=int)
+
+    def link(self, arr1):
+        """Getting the indices of links from their names
+        :arr1: list of link names
+        :return: array of 0-based link indices
+        """
+        return np.array([self.link_lookup[name] for name in arr1], dtype=int)
+
+    def node(self, arr1):
+        """Getting the indices of nodes from their names
+        :arr1: list of node names
+        :return: array of 0-based node indices
+        """
+        return np.array([self.node_lookup[name] for name in arr1], dtype=int)
+
+    def remap(self, arr1, arr2):
+        """Building the index of the recorded results (see capture_plan)
+        :arr1: 0-based indices of the recorded links
+        :arr2: 0-based indices of the recorded tanks
+        :return: network index whose link and tank positions are columns of the recorded flow and tank volume arrays
+        Node positions are unchanged, as they are only used for querying the EPANET model.
+        """
+        idx = copy.copy(self)
+        link_column = np.full(len(self.link_lookup), -1, dtype=int)
+        link_column[arr1] = np.arange(len(arr1))
+        tank_column = np.full(len(self.tank_lookup), -1, dtype=int)
+        tank_column[arr2] = np.arange(len(arr2))
+        idx.link_lookup = {name: int(link_column[i]) for name, i in self.link_lookup.items() if link_column[i] >= 0}
+        idx.tank_lookup = {name: int(tank_column[i]) for name, i in self.tank_lookup.items() if tank_column[i] >= 0}
+        for name in ['pseudo_pipe', 'fcv', 'pipe_to_oht', 'pipe_to_consumer']:
+            setattr(idx, name, self._remap(getattr(self, name), link_column))
+        idx.oht_tank = self._remap(self.oht_tank, tank_column)
+        return idx
+
+    def _remap(self, arr1, arr2):
+        """Mapping 0-based indices to recorded columns
+        :arr1: array of 0-based indices (-1 if the element does not exist)
+        :arr2: column of every element (-1 if not recorded)
+        :return: array of columns (-1 if the element does not exist or is not recorded)
+        """
+        return np.where(arr1 >= 0, arr2[arr1], -1)
@@ -0,0 +1,125 @@
+import numpy as np
+from EPANET_IWS.iws_log import logger
+
+
+class pattern_aggregator:
+
+    def __init__(self, d, num1, num2, num3, plan=None, callback=None, num4=1, dtype=np.float64):
+        """Averaging pipe flows and tank volumes into pattern steps while the hydraulic simulation runs
+        :d: EPANET model (after network modification)
+        :num1: hydraulic simulation time step in seconds
+        :num2: demand pattern time step in seconds
+        :num3: total number of pattern steps
+        :plan: capture plan (optional, every link and tank is aggregated if not given)
+        :callback: function called with the pattern step number and its averaged rows as soon as a step is complete
+        :num4: every num4-th hydraulic step is averaged (must divide the number of hydraulic steps per pattern step)
+        :dtype: floating point type of the hydraulic steps kept, or dictionary of the type of every variable (the
+        averages are computed in double precision)
+        Only the hydraulic steps of the current pattern step are kept, so the full resolution history is never stored.
+        See results_recorder for the error bounds of float32 values and of averaging every num4-th step.
+        """
+        flow_unit = d.getFlowUnits()
+        self.dh = num1
+        self.m = int(num2 / num1)  # hydraulic steps per pattern step
+        self.stride = int(num4)
+        if self.m % self.stride != 0:
+            raise ValueError("Averaging every %d-th hydraulic step needs a multiple of %d hydraulic steps per pattern "
+                             "step (%d given)." % (self.stride, self.stride, self.m))
+        self.total_p = num3
+        self.callback = callback
+        self.getters = {'Flow': 'getLinkFlows', 'TankVolume': 'getNodeTankVolume'}
+        '''Aggregated columns of every variable (None aggregates every element)'''
+        self.columns = {'Flow': None, 'TankVolume': None}
+        sizes = {'Flow': d.getLinkCount(), 'TankVolume': d.getNodeTankCount()}
+        if plan is not None:
+            self.columns = {'Flow': plan.links, 'TankVolume': plan.tanks}
+            for name, columns in self.columns.items():
+                if np.array_equal(columns, np.arange(sizes[name])):
+                    self.columns[name] = None
+                else:
+                    sizes[name] = len(columns)
+        '''Unit conversion to m3/s and m3 (same as final_report)'''
+        self.factors = {'Flow': 1, 'TankVolume': 1}
+        if flow_unit == 'GPM':
+            self.factors = {'Flow': 6.3e-5, 'TankVolume': 0.0283}
+        elif flow_unit == 'LPS':
+            self.factors['Flow'] = (1/ 1000)
+        elif flow_unit == 'LPM':
+            self.factors['Flow'] = 1.67e-5
+        elif flow_unit == 'CMH':
+            self.factors['Flow'] = (1/ 3600)
+        '''Hydraulic steps of the current pattern step (one row per element, so the averages match np.mean)'''
+        if isinstance(dtype, dict):
+            dtype = {name: dtype.get(name, np.float64) for name in self.names}
+        else:
+            dtype = {name: dtype for name in self.names}
+        self.buffers = {name: np.zeros((sizes[name], self.m // self.stride), dtype=dtype[name]) for name in self.names}
+        self.outputs = {name: np.zeros((num3, sizes[name])) for name in self.names}
+        self.expected_time = 0  # next regular hydraulic time (see filter_time_steps)
+        self.kept_steps = 0
+        self.filtered_steps = 0
+
+    @property
+    def names(self):
+        return ['Flow', 'TankVolume']
+
+    def add(self, d, num1):
+        """Adding the results of the current hydraulic step
+        :d: EPANET model (or iws_engine)
+        :num1: current hydraulic simulation time in seconds
+        :return: True if the step is used, False if it is an intermediate step that is filtered out
+        """
+        '''Filtering out intermediate time steps in the same way as filter_time_steps'''
+        if num1 != self.expected_time:
+            if num1 < self.expected_time:
+                self.filtered_steps += 1
+                return False
+            elif num1 < self.expected_time + 2 * self.dh:
+                self.expected_time += self.dh
+        else:
+            self.expected_time += self.dh
+        pattern_step, slot = divmod(self.kept_steps, self.m)
+        self.kept_steps += 1
+        if pattern_step >= self.total_p:
+            return True  # beyond the last pattern step (e.g. the final time of the simulation)
+        if slot % self.stride != 0:
+            return True  # not averaged (see num4)
+        for name in self.names:
+            columns = self.columns[name]
+            values = getattr(d, self.getters[name])()
+            if columns is not None:
+                values = values[columns]
+            if self.factors[name] != 1:
+                values = np.multiply(values, self.factors[name])
+            self.buffers[name][:, slot // self.stride] = values
+        if slot == self.m - self.stride:
+            self._complete(pattern_step, self.m // self.stride)
+        return True
+
+    def _complete(self, num1, num2):
+        """Writing the averages of a completed pattern step
+        :num1: pattern step number
+        :num2: number of hydraulic steps in the pattern step
+        """
+        rows = {}
+        for name in self.names:
+            rows[name] = self.outputs[name][num1]
+            rows[name][:] = np.mean(self.buffers[name][:, :num2], axis=1, dtype=np.float64)
+        rows['Flow'][rows['Flow'] < 0] = 0
+        if self.callback is not None:
+            self.callback(num1, rows)
+
+    def results(self):
+        """Completing the last pattern step (if the simulation stopped within it)
+        :return: final flow output array and final tank volume output array
+        """
+        pattern_step, slot = divmod(self.kept_steps, self.m)
+        if pattern_step < self.total_p and slot > 0:
+            if slot <= self.m - self.stride:  # otherwise its last averaged step is already in
+                self._complete(pattern_step, -(-slot // self.stride))
+            pattern_step += 1
+        for j in range(pattern_step, self.total_p):
+            self._complete(j, 0)  # no hydraulic steps recorded (same as np.mean of an empty slice)
+        if self.filtered_steps > 0:
+            logger.debug("%d intermediate time steps filtered out.", self.filtered_steps)
+        return [self.outputs['Flow'], self.outputs['TankVolume']]
@@ -0,0 +1,366 @@
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from EPANET_IWS.functions import fn
+from EPANET_IWS.functions import graph
+from EPANET_IWS.network_index import network_index
+from EPANET_IWS.fcv_batch import fcv_batch
+from EPANET_IWS.conversion_cache import conversion_cache
+from EPANET_IWS.results_recorder import results_recorder
+from EPANET_IWS.capture_plan import capture_plan
+from EPANET_IWS.pattern_aggregator import pattern_aggregator
+from EPANET_IWS.result_store import result_writer, atomic_path
+from EPANET_IWS.engine import iws_engine
+from EPANET_IWS.convergence_monitor import convergence_monitor
+from EPANET_IWS.warm_start import warm_start
+from EPANET_IWS.iws_log import logger, verbose, progress
+from EPANET_IWS.profiler import profiler
+
+'''Importable IWS analysis (the steps of Code_main as a function)
+--- Importing this module loads neither EpyT nor matplotlib or pandas: EpyT is imported when a run starts, matplotlib
+only by the plotting stage and pandas only by CSV output. Nothing is installed; EpyT must already be installed
+(pip install epyt) ---
+'''
+
+'''Run settings (same inputs as Code_main)'''
+default_config = {'omitted_nodes': ['1'],  # Name(s) of node(s) omitted from adding artificial elements
+                  'a_nodes': [],  # Name(s) of node(s) with Type A consumer behaviour
+                  'pc_demand': 60,  # Per capita demand in Litres per day
+                  'household': 5,  # Average number of consumers per household
+                  'tank_in_pipe_name': ['1'],  # Name(s) of the inflow pipe(s) to the tank
+                  'tank_out_pipe_name': ['P-448'],  # Name(s) of the outflow pipe(s) from the tank
+                  'supply_hours': None,  # Daily supply periods [[start, end], ...] in hours of the tank inflow pipes
+                  # (None keeps the supply of the input file)
+                  'hydraulic_step': 300,  # Simulation time step in seconds
+                  'days': 20,  # Simulation time duration in days
+                  'use_conversion_cache': False,  # Reuse the artificial element properties of a previous run with
+                  # the same input file and IWS parameters (see conversion_cache)
+                  'conversion_cache_size': 500 * 1024 ** 2,  # Maximum size of the conversion cache in bytes
+                  'cache_folder': None,  # Conversion cache folder (None for IWS_cache next to the network)
+                  'write_results': True,  # Create result files
+                  'result_format': 'npz',  # 'npz', 'parquet' (requires pyarrow) or 'csv' (requires pandas)
+                  'make_plots': True,  # Generate plots of the results (requires matplotlib)
+                  'check_balance': True,  # Check the mass balance of inflows and outflows
+                  'stream_outputs': True,  # Average flows and tank volumes into pattern steps during the simulation
+                  'recorder_folder': None,  # Folder for memory-mapped result buffers (None keeps them in RAM)
+                  'fast_engine': True,  # Run the hydraulic simulation loop on iws_engine
+                  'record_dtype': np.float64,  # Type of the recorded results (see results_recorder)
+                  'record_every': 1,  # Record every k-th hydraulic time step
+                  'convergence_tolerance': None,  # Early stop tolerance (see convergence_monitor, None for none)
+                  'convergence_mode': 'extrapolate',  # After an early stop: 'extrapolate' or 'trim'
+                  'use_warm_start': False,  # Start the household tanks from the state saved by the last run
+                  'warm_start_fcv': True,  # Also start the FCV settings from the saved state
+                  'warm_start_folder': None,  # Snapshot folder (None for IWS_warm_start next to the network)
+                  'plot_processes': 1,  # Number of worker processes rendering the plots
+                  'plot_mode': 'node',  # 'node' (one PNG per node and plot type), 'pdf' or 'png' (report pages)
+                  'plot_dpi': 150,  # Resolution of the 'pdf' and 'png' reports
+                  'plot_nodes': None,  # Name(s) of node(s) included in the reports (None for every Type B node)
+                  'plot_worst': None,  # Number of nodes with the largest mean deficit in the reports (None for all)
+                  'output_folder': None,  # Folder of the result files and plots (None for Analysis_Results in the
+                  # current working directory)
+                  'separate_run_folder': True,  # Run on a copy of the input file and write the modified network,
+                  # result files, plots and profile into a new subfolder <network>_<date>-<time>_<random> of
+                  # output_folder (False writes the modified network next to the input file and the results into
+                  # output_folder, shared by every run of the same network)
+                  'log_interval': 10,  # Seconds between two progress summaries of the hydraulic simulation
+                  'profile': False,  # Save the phase and method profile of the run (Profile.json, see profiler)
+                  'profile_memory': True,  # Track the peak memory of every phase
+                  'profile_cprofile': False}  # Also save the cProfile statistics of the run (Profile.prof)
+
+
+def set_supply_schedule(d, arr1, arr2):
+    """Opening the tank inflow pipes only during the daily supply periods
+    :d: EPANET model
+    :arr1: list of tank inflow pipe names
+    :arr2: list of supply periods [start, end] in hours of the day
+    """
+    start_hour = (d.getTimeStartTime() / 3600) % 24
+    for pipe in arr1:
+        supplied = False
+        for start, end in arr2:
+            d.addControls('LINK %s OPEN AT CLOCKTIME %s' % (pipe, _clock(start)))
+            d.addControls('LINK %s CLOSED AT CLOCKTIME %s' % (pipe, _clock(end)))
+            if start <= start_hour < end or (end < start and (start_hour >= start or start_hour < end)):
+                supplied = True
+        d.setLinkInitialStatus(d.getLinkIndex(pipe), 1 if supplied else 0)
+
+
+def _clock(num1):
+    """Formatting an hour of the day as a clock time
+    :num1: hour of the day
+    :return: clock time (hh:mm)
+    """
+    minutes = int(round((num1 % 24) * 60))
+    return '%d:%02d' % (minutes // 60, minutes % 60)
+
+
+def run_iws(str1, dict1=None, prof=None):
+    """Converting an EPANET network into an IWS network, simulating it and evaluating the results
+    :str1: path of the original input file
+    :dict1: run settings (missing entries are taken from default_config)
+    :prof: profiler receiving the phases and methods of the run (optional, saved by the caller, the profile settings
+    are then ignored)
+    :return: dictionary of the output arrays (Flow_out, TankVolume_out, Required_Demand_out, Demand_deficit_out and
+    Relative_distribution_out, one row per pattern step), the start time of every pattern step (time) and the pattern
+    time step (pattern_step) in seconds, the names of
+    the demand nodes (node_names), the column indices of the recorded flows and tank volumes (out_idx), the number of
+    hydraulic time steps, the warm-up days detected by the convergence monitor (None for none), whether the household
+    tanks started from a saved state (warm_start), the mass balance (None if not checked), the result file paths and
+    the output folder of the run
+    """
+    unknown = set(dict1 or {}) - set(default_config)
+    if unknown != set():
+        raise ValueError("Unknown setting(s): %s" % ', '.join(sorted(unknown)))
+    from epyt import epanet
+    config = dict(default_config, **(dict1 or {}))
+    omitted_nodes = config['omitted_nodes']
+    a_nodes = config['a_nodes']
+    pc_demand = config['pc_demand']
+    household = config['household']
+    tank_in_pipe_name = config['tank_in_pipe_name']
+    tank_out_pipe_name = config['tank_out_pipe_name']
+    write_results = config['write_results']
+    make_plots = config['make_plots']
+    check_balance = config['check_balance']
+    stream_outputs = config['stream_outputs']
+    record_dtype = config['record_dtype']
+    record_every = config['record_every']
+    network = os.path.splitext(os.path.basename(str1))[0]
+    network_folder = os.path.dirname(os.path.abspath(str1))
+    folder_name = config['output_folder'] or os.path.join(os.getcwd(), 'Analysis_Results')
+    file_path_mod = os.path.join(network_folder, network + '_mod.inp')
+    if config['separate_run_folder']:
+        '''New folder for this run, so runs sharing a file system never write to the same files'''
+        if os.path.exists(folder_name) != True:
+            os.makedirs(folder_name, exist_ok=True)
+        folder_name = tempfile.mkdtemp(prefix='%s_%s_' % (network, time.strftime('%Y%m%d-%H%M%S')), dir=folder_name)
+        file_path_mod = os.path.join(folder_name, network + '_mod.inp')
+        '''EpyT works on a copy (<name>_temp.inp) next to the file it opens, so the run opens its own copy'''
+        file_path = os.path.join(folder_name, os.path.basename(str1))
+        shutil.copyfile(str1, file_path)
+    else:
+        file_path = str1
+    owned = prof is None
+    if owned:
+        prof = profiler(config['profile'], config['profile_memory'], config['profile_cprofile'])
+    d = None
+    recorder = None
+    try:
+        prof.instrument(fn)
+        prof.instrument(graph)
+        prof.instrument(result_writer, ['write'])
+
+        '''Load network'''
+        prof.phase('Loading')
+        d = epanet(file_path, display_msg=verbose(), display_warnings=verbose('debug'))
+
+        '''Get consumer type data'''
+        prof.phase('Network conversion')
+        cons_type_info = fn().consumer_type(d, d.getNodeCount(), d.getNodeReservoirCount(), d.getNodeTankCount(),
+                                            a_nodes, omitted_nodes)
+
+        '''Modifying the network'''
+        base_demand_data = fn().node_base_demands(d)
+        demand_nodes_org = d.getNodeCount() - d.getNodeReservoirCount() - d.getNodeTankCount()  # Storing the original
+        # count of demand nodes in the network
+
+        '''Look up the artificial element properties in the conversion cache'''
+        artificial_elements_data = None
+        if config['use_conversion_cache']:
+            cache = conversion_cache(config['cache_folder'] or os.path.join(network_folder, 'IWS_cache'),
+                                     config['conversion_cache_size'])
+            cache_key = cache.key(str1, {'omitted_nodes': omitted_nodes, 'a_nodes': a_nodes, 'pc_demand': pc_demand,
+                                         'household': household})
+            artificial_elements_data = cache.get(cache_key)
+            if artificial_elements_data is not None:
+                logger.info("Artificial element properties reused from the conversion cache.")
+
+        '''Generating the properties of all artificial elements as arrays and adding them in a single pass'''
+        if artificial_elements_data is None:
+            artificial_elements_data = fn().get_artificial_elements_info(d, demand_nodes_org, pc_demand, household,
+                                                                         cons_type_info, base_demand_data)
+            if config['use_conversion_cache']:
+                cache.put(cache_key, artificial_elements_data)
+        fn().add_artificial_elements(d, demand_nodes_org, omitted_nodes, artificial_elements_data)
+
+        '''Save modified network (atomically, runs of the same network may share file_path_mod)'''
+        with atomic_path(file_path_mod) as temp_path:
+            d.saveInputFile(temp_path)
+
+        '''Index the artificial elements of the modified network'''
+        idx = network_index(d, demand_nodes_org, cons_type_info)
+
+        '''Simulation settings'''
+        prof.phase('Simulation setup')
+        if config['supply_hours'] is not None:
+            set_supply_schedule(d, tank_in_pipe_name, config['supply_hours'])
+        d.setTimeHydraulicStep(config['hydraulic_step'])
+        d.setTimeSimulationDuration(int(config['days'] * 24 * 3600))
+        dh = d.getTimeHydraulicStep()
+        T = d.getTimeSimulationDuration()
+        dp = d.getTimePatternStep()
+        total_p = int(T/ dp)
+        '''Record only the nodes, links and tanks needed by the requested outputs (the demand deficit and relative
+        distribution returned need the same elements as the plots)'''
+        plan = capture_plan(d, idx, tank_in_pipe_name, tank_out_pipe_name, write_results, True, check_balance,
+                            config['convergence_tolerance'] is not None)
+        out_idx = idx.remap(plan.links, plan.tanks)  # Index of the recorded flow and tank volume columns
+        fcv = fcv_batch(d, idx, plan.pressure_columns)
+
+        warm_started = False
+        if config['use_warm_start']:
+            '''Start the household tanks from the state saved by a previous run'''
+            snapshots = warm_start(config['warm_start_folder'] or os.path.join(network_folder, 'IWS_warm_start'))
+            snapshot_settings = {'hydraulic_step': dh}
+            if config['supply_hours'] is not None:
+                snapshot_settings['supply_hours'] = config['supply_hours']
+            snapshot_key = snapshots.key(file_path_mod, snapshot_settings)
+            snapshot = snapshots.get(snapshot_key)
+            if snapshot is not None:
+                warm_started = snapshots.apply(snapshot, d, idx, fcv if config['warm_start_fcv'] else None)
+
+        t, t_step = 0, 0
+        aggregator = None
+        monitor = None
+        if config['convergence_tolerance'] is not None:
+            '''Comparing the daily profiles as soon as the pattern step averages are complete'''
+            monitor = convergence_monitor(out_idx, dp, total_p, config['convergence_tolerance'])
+        if stream_outputs or monitor is not None:
+            aggregator = pattern_aggregator(d, dh, dp, total_p, plan, None if monitor is None else monitor.add,
+                                            record_every, record_dtype)
+        if stream_outputs:
+            # Pressures for the FCV settings
+            recorder = results_recorder(d, record_dtype, plan=plan, arr1=['Pressure'], str1=config['recorder_folder'])
+        else:
+            # Preallocated result buffers
+            recorder = results_recorder(d, record_dtype, plan=plan, str1=config['recorder_folder'], num2=record_every)
+
+        '''Hydraulic simulation'''
+        prof.phase('Hydraulic simulation')
+        tracker = progress(T, 'Hydraulic simulation', config['log_interval'])
+        if config['fast_engine']:
+            engine = iws_engine(d, fcv)
+            prof.instrument_loop(engine, recorder, aggregator)
+            t_step = engine.run(T, recorder, aggregator, monitor, tracker)
+            t = engine.time.value
+        else:
+            prof.instrument_loop(d, fcv, recorder, aggregator)
+            d.openHydraulicAnalysis()
+            d.initializeHydraulicAnalysis()
+            while t < T and (monitor is None or monitor.converged != True):
+                fcv.set_settings(d, recorder.last('Pressure'))  # None for the first step
+                t = d.runHydraulicAnalysis()
+                recorder.record(d, t)
+                if aggregator is not None:
+                    aggregator.add(d, t)
+                d.nextHydraulicAnalysisStep()
+                t_step += 1
+                logger.debug("Hydraulic simulation time (s): %d, hydraulic simulation time step: %d", t, t_step)
+                tracker.update(t)
+            d.closeHydraulicAnalysis()
+        tracker.close()
+
+        if config['use_warm_start']:
+            '''Save the final state of the household tanks for the next run'''
+            snapshots.save(snapshot_key, d, idx, fcv if config['warm_start_fcv'] else None, recorder.last('Pressure'),
+                           t)
+
+        prof.phase('Report processing')
+        if stream_outputs:
+            '''Completing the pattern step averages of pipe flows and tank volumes'''
+            Flow_out, TankVolume_out = aggregator.results()
+        else:
+            '''Processing the analysis report'''
+            dr = recorder.interval  # Time between two recorded steps
+            if record_every == 1:  # Recording every k-th step already leaves out the intermediate time steps
+                filtered_steps = fn().filter_time_steps((recorder.count - 1) /
+                                                        (int((recorder.results()[0][-1] / dh) + 1) - 1),
+                                                        recorder.count, dh,
+                                                        recorder.results()[0])
+                recorder.remove_steps(filtered_steps)
+            hydraulic_report = fn().final_report(d, [], *recorder.results())
+            Flow_out = fn().make_Flow_output(d, dr, dp, total_p, hydraulic_report[3])
+            TankVolume_out = fn().make_TankVolume_output(d, dr, dp, total_p, hydraulic_report[4])
+
+        warmup_days = None if monitor is None else monitor.report()
+        if warmup_days is not None:
+            '''Completing the outputs after the early stop'''
+            Flow_out = monitor.complete(Flow_out, config['convergence_mode'])
+            TankVolume_out = monitor.complete(TankVolume_out, config['convergence_mode'])
+            total_p = len(Flow_out)
+            T = total_p * dp
+
+        '''Required demands, demand deficit (%) and relative distribution of water at every pattern step and node'''
+        prof.phase('Demand outputs')
+        Required_Demand_out = fn().make_Required_Demand_output(d, demand_nodes_org, total_p, cons_type_info, idx)
+        Demand_deficit_out = fn().compute_demand_deficit(d, demand_nodes_org, dp, total_p, TankVolume_out,
+                                                         Required_Demand_out, cons_type_info, out_idx)
+        Relative_distribution_out = fn().compute_relative_distribution(d, demand_nodes_org, tank_out_pipe_name,
+                                                                       Flow_out, cons_type_info, out_idx)
+
+        prof.phase('Result files')
+        time_axis = np.arange(total_p) * dp  # Start time of every pattern step in seconds
+        result_files = []
+        if write_results:
+            '''Creating result files (column names are element names, rows are pattern steps)'''
+            writer = result_writer(folder_name, config['result_format'])
+            metadata = {'network': network, 'flow_units': d.getFlowUnits(), 'hydraulic_step': dh, 'pattern_step': dp,
+                        'duration': T, 'omitted_nodes': omitted_nodes, 'a_nodes': a_nodes, 'pc_demand': pc_demand,
+                        'household': household}
+            link_names = d.getLinkNameID()
+            tank_names = d.getNodeTankNameID()
+            result_files = [writer.write('Flow', Flow_out, [link_names[i] for i in plan.links], time_axis, metadata),
+                            writer.write('Tank Volume', TankVolume_out, [tank_names[i] for i in plan.tanks], time_axis,
+                                         metadata),
+                            writer.write('Demand deficit', Demand_deficit_out, idx.node_names, time_axis, metadata),
+                            writer.write('Relative distribution', Relative_distribution_out, idx.node_names, time_axis,
+                                         metadata)]
+
+        prof.phase('Plots')
+        if make_plots and config['plot_mode'] != 'node':
+            '''Creating multi-node report pages'''
+            graph().plot_report(d, demand_nodes_org, dp, TankVolume_out, Required_Demand_out, Demand_deficit_out,
+                                Relative_distribution_out, cons_type_info, folder_name, out_idx, config['plot_mode'],
+                                12, config['plot_dpi'], config['plot_nodes'], config['plot_worst'])
+        elif make_plots:
+            '''Creating plots'''
+            processes = config['plot_processes']
+            graph().plot_stored_volume_vs_time(d, demand_nodes_org, TankVolume_out, cons_type_info, folder_name,
+                                               out_idx, processes)
+            graph().plot_required_volume_vs_time(d, demand_nodes_org, dp, Required_Demand_out, cons_type_info,
+                                                 folder_name, out_idx, processes)
+            graph().plot_volume_surplus_deficit_vs_time(d, demand_nodes_org, dp, TankVolume_out, Required_Demand_out,
+                                                        cons_type_info, folder_name, out_idx, processes)
+            graph().plot_deficit_percent_vs_time(d, demand_nodes_org, Demand_deficit_out, cons_type_info, folder_name,
+                                                 out_idx, processes)
+            graph().plot_relative_distribution_vs_time(d, demand_nodes_org, Relative_distribution_out, cons_type_info,
+                                                       folder_name, out_idx, processes)
+
+        prof.phase('Mass balance')
+        balance = None
+        if check_balance:
+            balance = fn().check_mass_balance(d, demand_nodes_org, tank_in_pipe_name, tank_out_pipe_name, Flow_out,
+                                              cons_type_info, out_idx)
+
+        prof.phase(None)
+        prof.note(network=network, nodes=d.getNodeCount(), links=d.getLinkCount(), hydraulic_step=dh, duration=T,
+                  time_steps=t_step)
+    finally:
+        '''Releasing the model, the result buffers and the instrumented methods also when the run fails (a profiler
+        passed by the caller is closed by the caller)'''
+        if recorder is not None:
+            recorder.close()
+        if d is not None:
+            d.unload()
+        if owned:
+            prof.close()
+    if owned:
+        prof.save(os.path.join(folder_name, 'Profile.json'))
+    logger.info("Analysis completed.")
+    return {'Flow_out': Flow_out, 'TankVolume_out': TankVolume_out, 'Required_Demand_out': Required_Demand_out,
+            'Demand_deficit_out': Demand_deficit_out, 'Relative_distribution_out': Relative_distribution_out,
+            'time': time_axis, 'pattern_step': dp, 'node_names': list(idx.node_names), 'out_idx': out_idx,
+            'time_steps': t_step, 'warmup_days': warmup_days, 'warm_start': warm_started, 'balance': balance,
+            'result_files': result_files, 'output_folder': folder_name}
@@ -0,0 +1,345 @@
+import numpy as np
+import math
+import os
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from matplotlib import pyplot as plt
+import matplotlib as mpl
+from EPANET_IWS.iws_log import logger
+from EPANET_IWS.result_store import atomic_path
+
+'''Plot rendering of a single node
+--- Module level functions, so that they can be sent to the worker processes of render_plots.
+Every function gets only the node name, its own data slices and the output folder ---
+'''
+
+'''Line style, y-axis label and file name suffix of every plot type'''
+plot_styles = {
+    'demand_deficit': {'line': {'marker': 'o', 'markersize': 2, 'markerfacecolor': 'gold', 'markeredgecolor': 'crimson',
+                                'color': 'k'},
+                       'ylabel': 'Demand deficit (%)', 'suffix': ' Demand_deficit_versus_time.png'},
+    'stored_volume': {'line': {'marker': 'o', 'markersize': 2, 'markerfacecolor': 'gold', 'markeredgecolor': 'crimson',
+                               'color': 'k'},
+                      'ylabel': 'Stored volume in the \nnode overhead tank (m$^{3}$)',
+                      'suffix': ' Stored volume_versus_time.png', 'capacity': 'Overhead tank capacity'},
+    'required_volume': {'line': {'marker': 's', 'markersize': 2, 'markerfacecolor': 'cyan',
+                                 'markeredgecolor': 'magenta', 'color': 'k'},
+                        'ylabel': 'Required volume for meeting \nnode demands (m$^{3}$)',
+                        'suffix': ' Required volume_versus_time.png'},
+    'volume_surplus_deficit': {'line': {'marker': '^', 'markersize': 3, 'markerfacecolor': 'w', 'markeredgecolor': 'r',
+                                        'color': 'k'},
+                               'ylabel': 'Volume surplus/ deficit in the \nnode overhead tank(m$^{3}$)',
+                               'suffix': ' Volume surplus or deficit_versus_time.png'},
+    'deficit_percent': {'line': {'marker': 'v', 'markersize': 3, 'markerfacecolor': 'y', 'markeredgecolor': 'b',
+                                 'color': 'k'},
+                        'ylabel': 'Volume deficit in the \nnode overhead tank(%)',
+                        'suffix': ' Volume deficit percentage_versus_time.png'},
+    'relative_distribution': {'line': {'marker': 'o', 'markersize': 2, 'markerfacecolor': 'orange',
+                                       'markeredgecolor': 'g', 'color': 'crimson'},
+                              'ylabel': 'Relative distribution of \ndelivered water',
+                              'suffix': ' Relative distribution_versus_time.png'},
+}
+
+
+class plot_template:
+
+    def __init__(self, str1):
+        """Building the figure, axes, line, labels and legend of a plot type once
+        :str1: plot type (key of plot_styles)
+        """
+        style = plot_styles[str1]
+        mpl.rcParams.update({'font.family':'Sans-Serif'})
+        self.suffix = style['suffix']
+        self.fig = plt.figure()
+        self.ax = self.fig.add_subplot()
+        self.capacity = None
+        if 'capacity' in style:
+            self.capacity = self.ax.axhline(y = 0, linestyle = ':', linewidth = 0.5, color = 'b')
+        self.line, = self.ax.plot([], [], markeredgewidth = 0.5, linestyle = '--', linewidth = 0.5, **style['line'])
+        self.ax.tick_params(labelsize = 6)
+        self.ax.set_ylabel(style['ylabel'], fontsize = 8)
+        self.ax.set_xlabel('Time (h)', fontsize = 8)
+        if 'capacity' in style:
+            self.ax.legend([style['capacity']], loc = 'best', fontsize = 4)
+        self.title = self.ax.set_title('', fontsize = 6, color = 'r')
+
+    def draw(self, str1, arr1, arr2, arr3, num1, str2):
+        """Updating the line data, limits, ticks and title for a node and saving the figure
+        :str1: node name
+        :arr1: y values of the node at every pattern step
+        :arr2: x tick positions
+        :arr3: y tick positions
+        :num1: overhead tank capacity (None if not drawn)
+        :str2: output folder name
+        """
+        self.line.set_data(np.arange(1, len(arr1) + 1), arr1)
+        if self.capacity is not None:
+            self.capacity.set_ydata([num1, num1])
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.set_xticks(arr2)
+        self.ax.set_yticks(arr3)
+        self.title.set_text("Node " + str1)
+        if os.path.exists(str2) != True:
+            os.makedirs(str2, exist_ok=True)
+        with atomic_path(os.path.join(str2, str1 + self.suffix)) as temp_path:
+            self.fig.savefig(temp_path, dpi = 600)
+
+
+_templates = {}
+
+
+def _template(str1):
+    """Getting the template of a plot type (built once per process)
+    :str1: plot type (key of plot_styles)
+    :return: plot template
+    """
+    if str1 not in _templates:
+        _templates[str1] = plot_template(str1)
+    return _templates[str1]
+
+
+def close_templates():
+    """Closing the figures of all plot templates of this process"""
+    for template in _templates.values():
+        plt.close(template.fig)
+    _templates.clear()
+
+
+'''Data of a single node for every plot type
+--- y values, x tick positions, y tick positions and overhead tank capacity (None if not drawn) ---
+'''
+
+
+def demand_deficit_data(arr1):
+    """:arr1: demand deficit of the node at every pattern step"""
+    return arr1, np.arange(0, len(arr1) + 1, 48), np.arange(0, 110, 20), None
+
+
+def stored_volume_data(arr1, num1):
+    """:arr1: overhead tank volume of the node at every pattern step
+    :num1: overhead tank capacity in m3 (rounded up)
+    """
+    ymax = num1
+    if ymax <= 5:
+        o = 1
+    elif ymax <= 15:
+        o = 3
+    elif ymax <= 25:
+        o = 5
+    else:
+        o = 6
+    return arr1, np.arange(0, len(arr1) + 1, 48), np.arange(0, ymax + o, o), ymax
+
+
+def required_volume_data(num1, arr1):
+    """:num1: demand pattern time step in seconds
+    :arr1: required demand of the node at every pattern step
+    """
+    y = np.multiply(arr1, num1/ 1000)
+    ymax = np.max(y)
+    if ymax <= 0.1:
+        o = 0.01
+    elif ymax <= 0.5:
+        o = 0.05
+    elif ymax <= 1:
+        o = 0.1
+    else:
+        o = 0.2
+    return y, np.arange(0, len(arr1) + 1, 48), np.arange(0, ymax + o, o), None
+
+
+def volume_surplus_deficit_data(num1, arr1, arr2):
+    """:num1: demand pattern time step in seconds
+    :arr1: overhead tank volume of the node at every pattern step
+    :arr2: required demand of the node at every pattern step
+    """
+    y2 = np.multiply(arr2, num1/ 1000)
+    y = arr1 - y2
+    ymin = math.floor(np.min(y))
+    ymax = math.ceil(np.max(y))
+    if ymax <= 5:
+        o = 1
+    elif ymax <= 15:
+        o = 3
+    elif ymax <= 25:
+        o = 5
+    else:
+        o = 6
+    return y, np.arange(0, len(arr1) + 1, 48), np.arange(ymin, ymax + o, o), None
+
+
+def deficit_percent_data(arr1):
+    """:arr1: demand deficit (%) of the node at every pattern step"""
+    return arr1, np.arange(0, len(arr1) + 1, 48), np.arange(0, 110, 20), None
+
+
+def relative_distribution_data(arr1, num1):
+    """:arr1: relative distribution of the node at every pattern step
+    :num1: number of x ticks positions (length of the consumer type list, as in the original plots)
+    """
+    ymax = round(np.max(arr1), 1)
+    return arr1, np.arange(0, num1 + 1, 48), np.arange(0, ymax + 0.05, 0.05), None
+
+
+plot_data = {'demand_deficit': demand_deficit_data, 'stored_volume': stored_volume_data,
+             'required_volume': required_volume_data, 'volume_surplus_deficit': volume_surplus_deficit_data,
+             'deficit_percent': deficit_percent_data, 'relative_distribution': relative_distribution_data}
+
+
+def render_demand_deficit(str1, arr1, str2):
+    """Plot of demand deficit versus time of a node
+    :str1: node name
+    :arr1: demand deficit of the node at every pattern step
+    :str2: output folder name
+    """
+    _template('demand_deficit').draw(str1, *demand_deficit_data(arr1), str2)
+
+
+def render_stored_volume(str1, arr1, num1, str2):
+    """Plot of stored water volume versus time of a node
+    :str1: node name
+    :arr1: overhead tank volume of the node at every pattern step
+    :num1: overhead tank capacity in m3 (rounded up)
+    :str2: output folder name
+    """
+    _template('stored_volume').draw(str1, *stored_volume_data(arr1, num1), str2)
+
+
+def render_required_volume(str1, num1, arr1, str2):
+    """Plot of required water volume versus time of a node
+    :str1: node name
+    :num1: demand pattern time step in seconds
+    :arr1: required demand of the node at every pattern step
+    :str2: output folder name
+    """
+    _template('required_volume').draw(str1, *required_volume_data(num1, arr1), str2)
+
+
+def render_volume_surplus_deficit(str1, num1, arr1, arr2, str2):
+    """Plot of surplus or deficit water volume versus time of a node
+    :str1: node name
+    :num1: demand pattern time step in seconds
+    :arr1: overhead tank volume of the node at every pattern step
+    :arr2: required demand of the node at every pattern step
+    :str2: output folder name
+    """
+    _template('volume_surplus_deficit').draw(str1, *volume_surplus_deficit_data(num1, arr1, arr2), str2)
+
+
+def render_deficit_percent(str1, arr1, str2):
+    """Plot of deficit water volume percentage versus time of a node
+    :str1: node name
+    :arr1: demand deficit (%) of the node at every pattern step
+    :str2: output folder name
+    """
+    _template('deficit_percent').draw(str1, *deficit_percent_data(arr1), str2)
+
+
+def render_relative_distribution(str1, arr1, num1, str2):
+    """Plot of relative distribution of delivered volume versus time of a node
+    :str1: node name
+    :arr1: relative distribution of the node at every pattern step
+    :num1: number of x ticks positions (length of the consumer type list, as in the original plots)
+    :str2: output folder name
+    """
+    _template('relative_distribution').draw(str1, *relative_distribution_data(arr1, num1), str2)
+
+
+def render_report(str1, arr1, str2, str3='pdf', num1=12, num2=150):
+    """Rendering many nodes per page (one multi-page PDF or one tiled PNG per page) for a plot type
+    :str1: plot type (key of plot_styles)
+    :arr1: list of (node name, argument tuple of the plot data function) (one per node)
+    :str2: output folder name
+    :str3: output format ('pdf' or 'png')
+    :num1: number of nodes per page
+    :num2: resolution in dots per inch
+    :return: list of created files (none if no node is given)
+    """
+    if arr1 == []:
+        return []  # an empty PDF is never written, so there is nothing to replace the previous one with
+    from matplotlib.backends.backend_pdf import PdfPages
+    style = plot_styles[str1]
+    mpl.rcParams.update({'font.family':'Sans-Serif'})
+    if os.path.exists(str2) != True:
+        os.makedirs(str2, exist_ok=True)
+    name = style['suffix'].strip()[:-len('.png')]
+    per_page = max(1, min(num1, len(arr1)))
+    cols = min(per_page, 4)
+    rows = math.ceil(per_page / cols)
+    pages = [arr1[k: k + per_page] for k in range(0, len(arr1), per_page)]
+    files = []
+    pdf = None
+    with contextlib.ExitStack() as stack:  # the PDF is closed before it replaces the previous one
+        if str3 == 'pdf':
+            files.append(os.path.join(str2, name + '.pdf'))
+            pdf = stack.enter_context(PdfPages(stack.enter_context(atomic_path(files[0]))))
+        for p, page in enumerate(pages):
+            fig, axes = plt.subplots(rows, cols, figsize = (cols * 3.2, rows * 2.4), squeeze = False)
+            for ax, (node, args) in zip(axes.flat, page):
+                y, xticks, yticks, capacity = plot_data[str1](*args)
+                if capacity is not None:
+                    ax.axhline(y = capacity, linestyle = ':', linewidth = 0.5, color = 'b')
+                ax.plot(np.arange(1, len(y) + 1), y, markeredgewidth = 0.5, linestyle = '--', linewidth = 0.5,
+                        **style['line'])
+                ax.set_xticks(xticks)
+                ax.set_yticks(yticks)
+                ax.tick_params(labelsize = 5)
+                ax.set_title("Node " + node, fontsize = 6, color = 'r')
+            for ax in axes.flat[len(page):]:
+                ax.set_visible(False)
+            fig.supxlabel('Time (h)', fontsize = 8)
+            fig.supylabel(style['ylabel'], fontsize = 8)
+            fig.tight_layout()
+            if pdf is not None:
+                pdf.savefig(fig, dpi = num2)
+            else:
+                files.append(os.path.join(str2, '%s page %d.png' % (name, p + 1)))
+                with atomic_path(files[-1]) as temp_path:
+                    fig.savefig(temp_path, dpi = num2)
+            plt.close(fig)
+    return files
+
+
+def _init_worker():
+    """Selecting the non-interactive Agg backend in a worker process"""
+    mpl.use('Agg')
+
+
+def render_plots(func, arr1, num1=1, str1='Plots'):
+    """Rendering the plots of many nodes, serially or with a process pool
+    :func: render function of a single node (first argument is the node name)
+    :arr1: list of argument tuples (one per node)
+    :num1: number of worker processes (1 renders in the current process)
+    :str1: plot description used in the progress messages
+    :return: list of (node name, error message) of the failed plots
+    """
+    errors = []
+    done = 0
+    step = max(1, len(arr1) // 10)
+    if num1 is None or num1 <= 1 or len(arr1) <= 1:
+        try:
+            for args in arr1:
+                done += 1
+                try:
+                    func(*args)
+                except Exception as e:
+                    errors.append((args[0], repr(e)))
+                    logger.warning("%s: plot of node %s failed (%r)", str1, args[0], e)
+                if done % step == 0 or done == len(arr1):
+                    logger.info("%s: %d of %d plots rendered.", str1, done, len(arr1))
+        finally:
+            close_templates()
+        return errors
+    with ProcessPoolExecutor(max_workers=min(num1, len(arr1)), initializer=_init_worker) as pool:
+        futures = {pool.submit(func, *args): args[0] for args in arr1}
+        for future in as_completed(futures):
+            done += 1
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((futures[future], repr(e)))
+                logger.warning("%s: plot of node %s failed (%r)", str1, futures[future], e)
+            if done % step == 0 or done == len(arr1):
+                logger.info("%s: %d of %d plots rendered.", str1, done, len(arr1))
+    return errors
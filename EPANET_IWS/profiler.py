@@ -0,0 +1,217 @@
+import cProfile
+import contextlib
+import functools
+import inspect
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from EPANET_IWS.iws_log import logger
+from EPANET_IWS.result_store import atomic_path
+
+'''Methods of the hydraulic simulation loop timed by instrument_loop (iws_engine, fcv_batch and EpyT names, missing
+methods are skipped)'''
+loop_methods = ['set_settings', 'compute_settings', 'run_step', 'next_step', 'runHydraulicAnalysis',
+                'nextHydraulicAnalysisStep', 'getNodePressure', 'getNodeActualDemand', 'getLinkFlows',
+                'getNodeTankVolume', 'record', 'add']
+
+
+class profiler:
+
+    def __init__(self, bool1=True, bool2=True, bool3=False):
+        """Wall time, call counts and peak memory of the phases of a run and of its key methods
+        :bool1: enable profiling (every method is a no-op otherwise, so a script can call them unconditionally)
+        :bool2: track the peak memory of every phase (tracemalloc, slows allocation heavy code down)
+        :bool3: also collect cProfile statistics of the whole run (saved next to the summary, see save)
+        Phases are either sequential (phase, for scripts like Code_main) or nested (section). Times and memory of a
+        phase include its nested sections and the methods called in it; method times include the methods they call.
+        The peak memory of a phase is the largest amount of memory allocated by Python and NumPy above its start.
+        """
+        self.enabled = bool1
+        self.memory = bool1 and bool2
+        self.phases = {}
+        self.methods = {}
+        self.info = {}
+        self.stack = []
+        self.current = None
+        self.patched = []
+        self.cprofile = cProfile.Profile() if bool1 and bool3 else None
+        self.start_time = time.perf_counter()
+        self.tracing = self.memory and tracemalloc.is_tracing() != True  # stopped by close if started here
+        if self.tracing:
+            tracemalloc.start()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+    def _flush_peak(self):
+        """Passing the memory peak since the last reset to every open phase and resetting it"""
+        peak = tracemalloc.get_traced_memory()[1]
+        for entry in self.stack:
+            entry[2] = max(entry[2], peak)
+        tracemalloc.reset_peak()
+
+    def _open(self, str1):
+        """Opening a phase
+        :str1: phase name
+        """
+        current = 0
+        if self.memory:
+            self._flush_peak()
+            current = tracemalloc.get_traced_memory()[0]
+        self.phases.setdefault(str1, {'time': 0.0, 'calls': 0, 'peak_memory': 0})
+        self.stack.append([str1, time.perf_counter(), current, current])  # name, start, peak, start memory
+
+    def _close(self):
+        """Closing the innermost phase and adding its time and memory to the phase totals"""
+        if self.memory:
+            self._flush_peak()
+        name, start, peak, start_memory = self.stack.pop()
+        record = self.phases[name]
+        record['time'] += time.perf_counter() - start
+        record['calls'] += 1
+        record['peak_memory'] = max(record['peak_memory'], peak - start_memory)
+
+    def phase(self, str1=None):
+        """Ending the current sequential phase and starting the next one
+        :str1: name of the next phase (None only ends the current phase)
+        """
+        if self.enabled != True:
+            return
+        if self.current is not None:
+            while self.stack[-1][0] != self.current:
+                self._close()  # sections left open by an exception
+            self._close()
+        self.current = str1
+        if str1 is not None:
+            self._open(str1)
+
+    @contextlib.contextmanager
+    def section(self, str1):
+        """Timing a nested phase (with statement)
+        :str1: phase name (given with the names of the enclosing phases, e.g. 'Hydraulic simulation/Plots')
+        """
+        if self.enabled != True:
+            yield
+            return
+        self._open('/'.join([entry[0] for entry in self.stack] + [str1]))
+        try:
+            yield
+        finally:
+            self._close()
+
+    def instrument(self, obj, arr1=None, str1=None):
+        """Counting the calls and the time of methods (until close restores them)
+        :obj: class (every instance is timed) or object
+        :arr1: list of method names (optional, every public method of a class if not given, missing names are
+        skipped)
+        :str1: name used in the summary (optional, the class name if not given)
+        """
+        if self.enabled != True:
+            return
+        cls = obj if inspect.isclass(obj) else type(obj)
+        prefix = str1 or cls.__name__
+        if arr1 is None:
+            arr1 = [name for name, value in vars(cls).items() if name.startswith('_') != True and callable(value)]
+        for name in arr1:
+            if hasattr(obj, name) != True:
+                continue
+            key = prefix + '.' + name
+            self.methods.setdefault(key, {'time': 0.0, 'calls': 0})
+            original = vars(obj).get(name)  # None if the method is inherited (or a class method of an object)
+            self.patched.append((obj, name, original))
+            setattr(obj, name, self._timed(getattr(obj, name) if original is None else original, key))
+
+    def instrument_loop(self, *objs):
+        """Timing the methods of the hydraulic simulation loop (see loop_methods)
+        :objs: objects of the loop (EPANET model or iws_engine, fcv_batch, results_recorder, pattern_aggregator)
+        """
+        for obj in objs:
+            if obj is not None:
+                self.instrument(obj, loop_methods)
+
+    def _timed(self, func, str1):
+        """Wrapping a method with a call counter and a timer
+        :func: method
+        :str1: method name in the summary
+        :return: wrapped method
+        """
+        record = self.methods[str1]
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record['time'] += time.perf_counter() - start
+                record['calls'] += 1
+        return timed
+
+    def note(self, **kwargs):
+        """Adding run information to the summary (e.g. network name, number of time steps)"""
+        self.info.update(kwargs)
+
+    def summary(self):
+        """Collecting the profile of the run
+        :return: dictionary of run information, total time, peak memory and the phase and method records (phases in
+        the order they started, methods by decreasing time, methods never called are left out)
+        """
+        summary = {'info': dict(self.info, python=platform.python_version(), platform=sys.platform),
+                   'total_time': time.perf_counter() - self.start_time, 'memory_tracked': self.memory,
+                   'phases': self.phases,
+                   'methods': {name: record for name, record in sorted(self.methods.items(),
+                                                                        key=lambda item: -item[1]['time'])
+                               if record['calls'] > 0}}
+        if self.memory:
+            summary['peak_memory'] = max([record['peak_memory'] for record in self.phases.values()] + [0])
+        try:
+            import resource
+            scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is in bytes on macOS, kilobytes on Linux
+            summary['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        except ImportError:  # Windows
+            pass
+        return summary
+
+    def close(self):
+        """Ending profiling without saving (restores the instrumented methods and stops the memory tracking started
+        here, calling it again does nothing)
+        """
+        if self.enabled != True:
+            return
+        self.phase(None)
+        while self.stack != []:
+            self._close()
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        for obj, name, original in reversed(self.patched):
+            if original is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self.patched = []
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def save(self, str1):
+        """Ending profiling (see close) and saving the summary as JSON (and the cProfile statistics as .prof next to it)
+        :str1: path of the summary file
+        :return: summary (see summary)
+        """
+        if self.enabled != True:
+            return None
+        self.close()
+        summary = self.summary()
+        folder = os.path.dirname(str1)
+        if folder != '' and os.path.exists(folder) != True:
+            os.makedirs(folder, exist_ok=True)
+        with atomic_path(str1) as temp_path:
+            with open(temp_path, 'w') as f:
+                json.dump(summary, f, indent=2, default=float)
+        if self.cprofile is not None:
+            with atomic_path(os.path.splitext(str1)[0] + '.prof') as temp_path:
+                self.cprofile.dump_stats(temp_path)
+        logger.info("Profile of %.1f s saved to %s", summary['total_time'], str1)
+        return summary
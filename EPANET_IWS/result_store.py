@@ -0,0 +1,177 @@
+import contextlib
+import json
+import os
+import uuid
+import numpy as np
+
+
+@contextlib.contextmanager
+def atomic_path(str1):
+    """Writing a file atomically (with statement): the file is written under a temporary name in the same folder and
+    renamed once complete, so concurrent runs and readers never see a partial file
+    :str1: path of the file
+    :return: temporary path to write to (same extension, for writers choosing the format from it)
+    """
+    folder, name = os.path.split(str1)
+    base, extension = os.path.splitext(name)
+    temp_path = os.path.join(folder, '.%s.%s.tmp%s' % (base, uuid.uuid4().hex[:12], extension))
+    try:
+        yield temp_path
+        os.replace(temp_path, str1)  # Atomic on the same file system
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+'''Result table writers
+--- Every writer gets the file path (without extension), the table (one row per pattern step), the column names,
+the time axis and the run metadata, and returns the path of the created file (written with atomic_path) ---
+'''
+
+
+def write_csv(str1, arr1, arr2, arr3, dict1):
+    """Writing a table as an extension-less CSV file (same layout as make_csv_out, without names or metadata)
+    :str1: file path without extension
+    :arr1: table
+    :arr2: list of column names
+    :arr3: time axis in seconds
+    :dict1: run metadata
+    :return: path of the created file
+    """
+    import pandas as pd
+    with atomic_path(str1) as temp_path:
+        pd.DataFrame(arr1). to_csv(temp_path)
+    return str1
+
+
+def write_npz(str1, arr1, arr2, arr3, dict1):
+    """Writing a table as a compressed NPZ file with one member per column
+    :str1: file path without extension
+    :arr1: table
+    :arr2: list of column names
+    :arr3: time axis in seconds
+    :dict1: run metadata
+    :return: path of the created file
+    """
+    members = {'columns': np.array(arr2, dtype=str), 'time': np.asarray(arr3),
+               'metadata': np.array(json.dumps(dict1, default=str))}
+    for i in range(arr1.shape[1]):
+        members['c%d' % i] = np.ascontiguousarray(arr1[:, i])
+    with atomic_path(str1 + '.npz') as temp_path:
+        np.savez_compressed(temp_path, **members)
+    return str1 + '.npz'
+
+
+def write_parquet(str1, arr1, arr2, arr3, dict1):
+    """Writing a table as a Parquet file (requires pyarrow)
+    :str1: file path without extension
+    :arr1: table
+    :arr2: list of column names
+    :arr3: time axis in seconds
+    :dict1: run metadata
+    :return: path of the created file
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("The 'parquet' result format requires pyarrow (pip install pyarrow).")
+    arrays = [pa.array(np.asarray(arr3))] + [pa.array(np.ascontiguousarray(arr1[:, i])) for i in range(arr1.shape[1])]
+    table = pa.Table.from_arrays(arrays, names=['time'] + list(arr2))
+    table = table.replace_schema_metadata({'metadata': json.dumps(dict1, default=str)})
+    with atomic_path(str1 + '.parquet') as temp_path:
+        pq.write_table(table, temp_path, compression='zstd')
+    return str1 + '.parquet'
+
+
+class result_writer:
+
+    formats = {'csv': write_csv, 'npz': write_npz, 'parquet': write_parquet}
+
+    def __init__(self, str1, str2='npz'):
+        """Writing result tables in a selectable format
+        :str1: output folder name
+        :str2: result format ('csv', 'npz', 'parquet' or any format added with register)
+        """
+        if str2 not in self.formats:
+            raise ValueError("Unknown result format '%s' (available: %s)." % (str2, ', '.join(self.formats)))
+        self.folder = str1
+        self.format = str2
+        if os.path.exists(self.folder) != True:
+            os.makedirs(self.folder, exist_ok=True)
+
+    @classmethod
+    def register(cls, str1, func):
+        """Adding a result format
+        :str1: format name
+        :func: writer function (same arguments as write_npz)
+        """
+        cls.formats[str1] = func
+
+    def write(self, str1, arr1, arr2, arr3, dict1):
+        """Writing a result table
+        :str1: table name (file name without extension)
+        :arr1: table (one row per pattern step)
+        :arr2: list of column names
+        :arr3: time axis in seconds
+        :dict1: run metadata
+        :return: path of the created file
+        """
+        arr1 = np.asarray(arr1)
+        if arr1.shape[1] != len(arr2):
+            raise ValueError("Table '%s' has %d columns but %d column names." % (str1, arr1.shape[1], len(arr2)))
+        return self.formats[self.format](os.path.join(self.folder, str1), arr1, list(arr2), arr3, dict1)
+
+
+class result_reader:
+
+    def __init__(self, str1):
+        """Reading a result table written by result_writer, one column at a time
+        :str1: path of an NPZ or Parquet result file
+        Columns are only decompressed (NPZ) or read (Parquet) when requested.
+        """
+        self.path = str1
+        if str1.endswith('.npz'):
+            self.format = 'npz'
+            self.file = np.load(str1)
+            self.columns = [str(name) for name in self.file['columns']]
+            self.time = self.file['time']
+            self.metadata = json.loads(str(self.file['metadata']))
+        elif str1.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            self.format = 'parquet'
+            self.file = pq.ParquetFile(str1)
+            self.columns = [name for name in self.file.schema_arrow.names if name != 'time']
+            self.time = self.file.read(columns=['time']).column(0).to_numpy()
+            self.metadata = json.loads(self.file.schema_arrow.metadata[b'metadata'])
+        else:
+            raise ValueError("Unsupported result file '%s' (NPZ or Parquet expected)." % str1)
+        self.positions = {name: i for i, name in enumerate(self.columns)}
+
+    def column(self, str1):
+        """Loading a single column
+        :str1: column name (node, link or tank name)
+        :return: array of the column values at every pattern step
+        """
+        if str1 not in self.positions:
+            raise KeyError("Column '%s' not found in %s." % (str1, self.path))
+        if self.format == 'npz':
+            return self.file['c%d' % self.positions[str1]]
+        return self.file.read(columns=[str1]).column(0).to_numpy()
+
+    def load(self, arr1=None):
+        """Loading several columns as a table
+        :arr1: list of column names (optional, every column if not given)
+        :return: array with one row per pattern step and one column per requested name
+        """
+        if arr1 is None:
+            arr1 = self.columns
+        if len(arr1) == 0:
+            return np.zeros((len(self.time), 0))
+        return np.column_stack([self.column(name) for name in arr1])
+
+    def close(self):
+        """Closing the result file"""
+        if self.format == 'npz':
+            self.file.close()
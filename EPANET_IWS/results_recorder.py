@@ -0,0 +1,213 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+class results_recorder:
+
+    def __init__(self, d, dtype=np.float64, num1=1.5, plan=None, arr1=None, str1=None, num2=1):
+        """Preallocated buffers for the hydraulic analysis results
+        :d: EPANET model (with the final hydraulic time step and simulation duration)
+        :dtype: floating point type of the stored results, or dictionary of the type of every variable
+        (e.g. {'Pressure': np.float64, 'Flow': np.float32}, variables not given are stored as float64)
+        :num1: growth factor applied when EPANET reports more steps than expected (intermediate time steps)
+        :plan: capture plan (optional, every node, link and tank is recorded if not given)
+        :arr1: list of recorded variables (optional, e.g. ['Pressure'] when flows and tank volumes are aggregated
+        by pattern_aggregator)
+        :str1: folder of memory-mapped buffer files (optional, the buffers are kept in RAM if not given, every recorder
+        writes into its own new subfolder, so recorders sharing the folder never open the same files)
+        :num2: every num2-th hydraulic time step is recorded (1 records every step, including intermediate steps)
+        With num2 > 1 the intermediate time steps are left out while recording (same rule as filter_time_steps) and
+        every num2-th of the remaining steps is stored; the pressures of the other steps are still kept for the FCV
+        settings (see last).
+        Error bounds against full precision runs of every step (Suvarnadhara_final3, 20 days, pattern step outputs):
+        float32 pressures and tank volumes are exact (the toolkit values are single precision), float32 flows change
+        the outputs by less than 1e-7 relative (rounding of the unit conversion). Recording every 2nd/3rd/4th step
+        keeps 95% of the overhead tank volumes within 0.02/0.04/0.05 m3 (at most 0.2/0.7/0.7 m3 when a tank fills or
+        empties between two recorded steps). The demand deficit changes by 0.12/0.28/0.35 percentage points on
+        average (99th percentile 1.7/3.8/5.6), but single pattern step values can be completely wrong: the maximum
+        error is 99.9 points for every k (99.8 for k = 3 in a 3 day run), and 0.2/0.4/0.5% of the values are off by
+        more than 10 points. The mean deficit of a node over the last day changes by up to 1.8/5.3/4.7 points.
+        """
+        self.dh = d.getTimeHydraulicStep()
+        self.stride = int(num2)
+        self.interval = self.dh * self.stride  # time between two recorded steps
+        expected_steps = int(d.getTimeSimulationDuration() / self.interval) + 1
+        self.growth = num1
+        self.count = 0
+        self.pending = False  # pressures of a step that is not recorded are waiting in the next row
+        self.expected_time = 0  # next regular hydraulic time (see filter_time_steps)
+        self.regular_steps = 0
+        self.folder = None
+        self.generation = 0  # increased whenever the buffers are enlarged, so the new files get new names
+        if str1 is not None:
+            if os.path.exists(str1) != True:
+                os.makedirs(str1, exist_ok=True)
+            self.folder = tempfile.mkdtemp(prefix='recorder_', dir=str1)  # removed by close
+        self.plan = plan
+        '''Recorded columns of every variable (None records every element)'''
+        self.columns = {'Pressure': None, 'Demand': None, 'Flow': None, 'TankVolume': None}
+        sizes = {'Pressure': d.getNodeCount(), 'Demand': d.getNodeCount(), 'Flow': d.getLinkCount(),
+                 'TankVolume': d.getNodeTankCount()}
+        if plan is not None:
+            self.columns = {'Pressure': plan.nodes, 'Demand': plan.demand_nodes, 'Flow': plan.links,
+                            'TankVolume': plan.tanks}
+            for name, columns in self.columns.items():
+                if np.array_equal(columns, np.arange(sizes[name])):
+                    self.columns[name] = None  # every element is recorded, no need to select
+                else:
+                    sizes[name] = len(columns)
+        if arr1 is not None:
+            for name in self.columns:
+                if name not in arr1:
+                    self.columns[name] = np.array([], dtype=int)
+                    sizes[name] = 0
+        if isinstance(dtype, dict):
+            self.dtypes = {name: np.dtype(dtype.get(name, np.float64)) for name in self.columns}
+        else:
+            self.dtypes = {name: np.dtype(dtype) for name in self.columns}
+        self.getters = {'Pressure': 'getNodePressure', 'Demand': 'getNodeActualDemand', 'Flow': 'getLinkFlows',
+                        'TankVolume': 'getNodeTankVolume'}
+        self.Time = np.zeros(expected_steps, dtype=np.int64)
+        self.Pressure = self._allocate('Pressure', (expected_steps, sizes['Pressure']), self.dtypes['Pressure'])
+        self.Demand = self._allocate('Demand', (expected_steps, sizes['Demand']), self.dtypes['Demand'])
+        self.Flow = self._allocate('Flow', (expected_steps, sizes['Flow']), self.dtypes['Flow'])
+        self.TankVolume = self._allocate('TankVolume', (expected_steps, sizes['TankVolume']), self.dtypes['TankVolume'])
+
+    @property
+    def names(self):
+        return ['Time', 'Pressure', 'Demand', 'Flow', 'TankVolume']
+
+    @property
+    def capacity(self):
+        return len(self.Time)
+
+    def _allocate(self, str1, arr1, dtype):
+        """Allocating a result buffer in RAM or as a memory-mapped file
+        :str1: variable name
+        :arr1: buffer shape
+        :dtype: buffer data type
+        :return: zero filled buffer
+        """
+        if self.folder is None or arr1[1] == 0:
+            return np.zeros(arr1, dtype=dtype)
+        file_path = os.path.join(self.folder, '%s_%d.dat' % (str1, self.generation))
+        return np.memmap(file_path, dtype=dtype, mode='w+', shape=arr1)
+
+    def _release(self, arr1):
+        """Removing the file of a memory-mapped buffer that is no longer used
+        :arr1: buffer
+        """
+        if isinstance(arr1, np.memmap) and arr1.filename is not None:
+            file_path = arr1.filename
+            arr1.flush()
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass  # still mapped (Windows), the file is left behind
+
+    def _grow(self, num1=4096):
+        """Enlarging the buffers geometrically (the recorded rows are kept)
+        :num1: number of rows copied at a time
+        """
+        capacity = max(int(self.capacity * self.growth), self.capacity + 1)
+        self.generation += 1
+        for name in self.names:
+            old = getattr(self, name)
+            if name == 'Time':
+                new = np.zeros(capacity, dtype=old.dtype)
+            else:
+                new = self._allocate(name, (capacity,) + old.shape[1:], old.dtype)
+            for start in range(0, self.count, num1):
+                stop = min(start + num1, self.count)
+                new[start: stop] = old[start: stop]
+            setattr(self, name, new)
+            self._release(old)
+
+    def record(self, d, num1):
+        """Recording the results of the current hydraulic step
+        :d: EPANET model (or iws_engine)
+        :num1: current hydraulic simulation time in seconds
+        :return: True if the step is recorded, False if only its pressures are kept (see num2)
+        """
+        if self.count == self.capacity:
+            self._grow()
+        row = self.count
+        recorded = self.stride == 1 or (self._regular(num1) and (self.regular_steps - 1) % self.stride == 0)
+        for name, columns in self.columns.items():
+            if recorded != True and name != 'Pressure':
+                continue  # only the pressures of a step that is not recorded are needed (FCV settings)
+            if columns is None:
+                getattr(self, name)[row] = getattr(d, self.getters[name])()
+            elif len(columns) > 0:
+                np.take(getattr(d, self.getters[name])(), columns, out=getattr(self, name)[row])  # written in place
+        self.pending = recorded != True
+        if recorded:
+            self.Time[row] = num1
+            self.count += 1
+        return recorded
+
+    def _regular(self, num1):
+        """Checking whether a hydraulic step is a regular step, in the same way as filter_time_steps
+        :num1: current hydraulic simulation time in seconds
+        :return: False for an intermediate time step
+        """
+        if num1 != self.expected_time:
+            if num1 < self.expected_time:
+                return False
+            elif num1 < self.expected_time + 2 * self.dh:
+                self.expected_time += self.dh
+        else:
+            self.expected_time += self.dh
+        self.regular_steps += 1
+        return True
+
+    def last(self, str1):
+        """Getting the most recently recorded row of a variable
+        :str1: variable name ('Pressure', 'Demand', 'Flow' or 'TankVolume')
+        :return: view of the last recorded row (None before the first step); for pressures this includes the
+        steps that are not recorded
+        """
+        if self.pending and str1 == 'Pressure':
+            return self.Pressure[self.count]
+        if self.count == 0:
+            return None
+        return getattr(self, str1)[self.count - 1]
+
+    def remove_steps(self, arr1, num1=4096):
+        """Removing unwanted time steps in place (without copying the buffers)
+        :arr1: list of unwanted time steps
+        :num1: number of rows moved at a time
+        """
+        removed = sorted(set(int(step) for step in arr1 if 0 <= step < self.count))
+        if removed == []:
+            return
+        bounds = removed + [self.count]
+        destination = removed[0]
+        for i in range(len(removed)):
+            start = bounds[i] + 1
+            stop = bounds[i + 1]
+            while start < stop:
+                size = min(num1, stop - start)
+                for name in self.names:
+                    buffer = getattr(self, name)
+                    buffer[destination: destination + size] = buffer[start: start + size]
+                destination += size
+                start += size
+        self.count -= len(removed)
+
+    def results(self):
+        """Getting the recorded results
+        :return: list of views of Time, Pressure, Demand, Flow and Tank volume (recorded rows only)
+        """
+        return [getattr(self, name)[:self.count] for name in self.names]
+
+    def close(self):
+        """Removing the memory-mapped buffer files and the subfolder of this recorder (the recorded results are no
+        longer available)
+        """
+        for name in self.names:
+            self._release(getattr(self, name))
+        if self.folder is not None:
+            shutil.rmtree(self.folder, ignore_errors=True)
@@ -0,0 +1,202 @@
+import math
+import numpy as np
+from EPANET_IWS.functions import fn
+from EPANET_IWS.capture_plan import capture_plan
+from EPANET_IWS.results_recorder import results_recorder
+from EPANET_IWS.engine import iws_engine
+from EPANET_IWS.iws_log import logger
+
+
+class screening_solver:
+
+    def __init__(self, d, idx, fcv, num1=60, num2=5):
+        """Approximate household tank model for screening many variants of an IWS network
+        :d: EPANET model (after network modification, with the final hydraulic time step)
+        :idx: network index of the modified network
+        :fcv: artificial FCV data (fcv_batch)
+        :num1: per capita demand the network was modified with
+        :num2: number of consumers per household the network was modified with
+        The network is not solved again: the ferrule pressures of a base run are held fixed and only the household
+        side is integrated for every consumer and variant at once. At every hydraulic step the inflow of an overhead
+        tank is the FCV setting of the previous step's pressure (compute_artificial_FCV_setting, with the variant's
+        pipe), limited by the inflow the network delivered in the base run if it is given, otherwise by the same
+        formula applied to the head left above the water level. The outflow is the consumer demand, limited by the
+        stored volume when the tank runs empty, and a full tank takes no inflow.
+        Since the pressures do not respond to the variant, the results drift from a full simulation whenever a
+        variant draws more or less water than the base run (benchmarks/screening_check.py reports the deviation).
+        """
+        self.d = d
+        self.idx = idx
+        self.fcv = fcv
+        self.pc_demand = num1
+        self.household = num2
+        consumers = idx.consumers
+        self.dh = d.getTimeHydraulicStep()
+        self.dp = d.getTimePatternStep()
+        self.length_factor = 0.3048 if d.getFlowUnits() == 'GPM' else 1
+        '''Overhead tanks of the modified network (cubic metres and metres)'''
+        tanks = idx.oht_tank[consumers]
+        diameters = np.asarray(d.getNodeTankDiameter(), dtype=float).reshape(-1)[tanks]
+        self.max_level = np.asarray(d.getNodeTankMaximumWaterLevel(), dtype=float).reshape(-1)[tanks] * \
+            self.length_factor
+        if d.getFlowUnits() == 'GPM':
+            diameters = diameters / 39.37
+        self.area = math.pi * diameters ** 2 / 4
+        '''Consumer demands in cubic metres per second and their pattern multipliers'''
+        consumer_nodes = idx.consumer_node[consumers]
+        base_demands = np.asarray(d.getNodeBaseDemands()[1], dtype=float)[consumer_nodes]
+        self.demand = base_demands / fcv.flow_factor
+        patterns = np.asarray(d.getNodeDemandPatternIndex()[1])[consumer_nodes]
+        pattern_arrays = np.asarray(d.getPattern())
+        pattern_arrays = pattern_arrays.reshape(-1, pattern_arrays.shape[-1])
+        self.multipliers = np.where(patterns[:, None] > 0, pattern_arrays[np.maximum(patterns, 1) - 1], 1)
+
+    def households(self, num1, num2):
+        """Number of households of every consumer (same rule as get_artificial_elements_info)
+        :num1: per capita demand
+        :num2: number of consumers per household
+        :return: array of number of households
+        """
+        return np.ceil((self.demand * (24 * 3600 * 1000) / num1) / num2)
+
+    def variant_properties(self, arr1):
+        """Household tank and pipe properties of every variant
+        :arr1: list of variant dictionaries with any of 'pc_demand' and 'household' (overhead tank and pipe sizes,
+        the modified network's values if not given), 'demand_multiplier' (scales the consumer demands) and
+        'initial_level' (initial overhead tank level in metres, 0 if not given)
+        :return: dictionary of arrays (one row per variant, one column per consumer): tank area, maximum volume, pipe
+        resistance (A + B of compute_artificial_FCV_setting), demand multiplier and initial volume
+        """
+        count = len(arr1)
+        n = len(self.demand)
+        properties = {'area': np.tile(self.area, (count, 1)),
+                      'max_volume': np.tile(self.area * self.max_level, (count, 1)),
+                      'resistance': np.tile(self.fcv.A + self.fcv.B, (count, 1)),
+                      'demand_multiplier': np.ones((count, 1)), 'initial_volume': np.zeros((count, n))}
+        for i, variant in enumerate(arr1):
+            if 'pc_demand' in variant or 'household' in variant:
+                households = self.households(variant.get('pc_demand', self.pc_demand),
+                                             variant.get('household', self.household))
+                volume = 1 * households  # 1 cub.m per household, 2 m maximum level (see get_artificial_oht_info)
+                properties['max_volume'][i] = volume
+                properties['area'][i] = volume / self.max_level
+                '''Pipe to the overhead tank, truncated to the model units in the same way as fcv_batch'''
+                diameter = 19.03 * households ** 0.38
+                if self.length_factor != 1:
+                    diameter = np.trunc(diameter * 0.0394) / 0.0394
+                else:
+                    diameter = np.trunc(diameter)
+                length = np.trunc(10 / self.length_factor) * self.length_factor
+                A = 10.68 * length / (np.trunc(130) * (diameter / 1000) ** 4.87)
+                B = 8 * 5.90 / (9.81 * (diameter / 1000) ** 2)
+                properties['resistance'][i] = A + B
+            properties['demand_multiplier'][i] = variant.get('demand_multiplier', 1)
+            properties['initial_volume'][i] = np.minimum(variant.get('initial_level', 0) * properties['area'][i],
+                                                         properties['max_volume'][i])
+        return properties
+
+    def base_run(self, num1):
+        """Running the full hydraulic simulation once and recording the ferrule pressures and inflows of the consumers
+        :num1: simulation time duration in seconds
+        :return: array of hydraulic simulation times (intermediate time steps included), array of pressure heads
+        (model units) and array of inflows to the overhead tanks (m3/s), with one row per time step and one column
+        per consumer
+        """
+        plan = capture_plan(self.d, self.idx, [], [], False, False, True)  # consumer pressures and inflows only
+        out_idx = self.idx.remap(plan.links, plan.tanks)
+        recorder = results_recorder(self.d, plan=plan, arr1=['Pressure', 'Flow'])
+        steps = iws_engine(self.d, self.fcv).run(num1, recorder)
+        Time, Pressure, Demand, Flow = recorder.results()[:4]
+        logger.info("Base pressures and inflows recorded at %d hydraulic time steps.", steps)
+        return (np.array(Time), np.array(Pressure[:, plan.pressure_columns]),
+                Flow[:, out_idx.pipe_to_oht[self.idx.consumers]] / self.fcv.flow_factor)
+
+    def save_base_run(self, str1, arr1, arr2, arr3=None):
+        """Saving the results of a base run, so later screening runs do not need the full hydraulic simulation
+        :str1: file path (.npz)
+        :arr1: hydraulic simulation times
+        :arr2: pressure heads (one column per consumer)
+        :arr3: inflows to the overhead tanks (optional)
+        """
+        np.savez(str1, time=arr1, pressure=arr2, inflow=np.array([]) if arr3 is None else arr3,
+                 nodes=np.array([self.idx.node_names[n] for n in self.idx.consumers]), hydraulic_step=self.dh)
+
+    def load_base_run(self, str1):
+        """Loading the saved results of a base run
+        :str1: file path (.npz)
+        :return: array of hydraulic simulation times, array of pressure heads and array of inflows (None if not saved)
+        """
+        with np.load(str1) as data:
+            nodes = [str(name) for name in data['nodes']]
+            if nodes != [self.idx.node_names[n] for n in self.idx.consumers] or int(data['hydraulic_step']) != self.dh:
+                raise ValueError("Base run '%s' belongs to other consumers or another hydraulic time step." % str1)
+            return data['time'], data['pressure'], data['inflow'] if data['inflow'].size > 0 else None
+
+    def run(self, arr1, arr2, arr3, num1=None, arr4=None):
+        """Integrating the overhead tank volumes of every consumer and variant
+        :arr1: hydraulic simulation times of the pressures in seconds (intermediate time steps included)
+        :arr2: pressure heads at the ferrule points (one row per time step, one column per consumer)
+        :arr3: list of variant dictionaries (see variant_properties)
+        :num1: total number of pattern steps (optional, every complete pattern step of the pressures if not given)
+        :arr4: inflows to the overhead tanks in the base run (optional, same rows and columns as arr2, m3/s)
+        :return: pattern step averages of the overhead tank volumes (m3) and inflows (m3/s), and the required demands
+        (flow units, as make_Required_Demand_output), each with one row per variant and pattern step and one column
+        per consumer
+        Every time step is integrated over its own duration; as in Code_main, only the regular time steps enter the
+        pattern step averages (see filter_time_steps).
+        """
+        time = np.asarray(arr1, dtype=np.int64)
+        properties = self.variant_properties(arr3)
+        m = int(self.dp / self.dh)
+        regular = np.ones(len(time), dtype=bool)
+        regular[fn().filter_time_steps((len(time) - 1) / (int((time[-1] / self.dh) + 1) - 1), len(time), self.dh,
+                                       time)] = False
+        slots = np.cumsum(regular) - 1  # row of every regular time step in the filtered report
+        if num1 is None:
+            num1 = int(slots[-1] + 1) // m
+        steps = int(np.searchsorted(slots, num1 * m))  # time steps up to the last averaged regular step
+        durations = np.diff(time, append=time[-1])[:steps]  # the last time step ends the simulation
+        available_head = np.asarray(arr2, dtype=float)[:steps] * self.fcv.pressure_factor - \
+            self.fcv.elevation_difference
+        pattern_steps = (time // self.dp) % self.multipliers.shape[1]
+        demand = self.demand * properties['demand_multiplier']
+        resistance = properties['resistance']
+        area = properties['area']
+        max_volume = properties['max_volume']
+        volume = properties['initial_volume'].copy()
+        settings = np.zeros_like(volume)  # FCV settings of the first step (no previous pressures)
+        TankVolume = np.zeros((len(arr3), num1, len(self.demand)))
+        Inflow = np.zeros_like(TankVolume)
+        counts = np.zeros((num1, 1))
+        for k in range(steps):
+            if arr4 is None:
+                inflow = np.minimum(settings, np.sqrt(np.maximum(available_head[k] - volume / area, 0) / resistance))
+            else:
+                inflow = np.minimum(settings, arr4[k])
+            inflow[volume >= max_volume] = 0
+            if regular[k]:
+                # volume reported at the start of the step and inflow through the pipe to the overhead tank
+                slot = slots[k] // m
+                TankVolume[:, slot] += volume
+                Inflow[:, slot] += inflow
+                counts[slot] += 1
+            if durations[k] > 0:
+                outflow = np.minimum(demand * self.multipliers[:, pattern_steps[k]], volume / durations[k] + inflow)
+                volume = np.minimum(volume + (inflow - outflow) * durations[k], max_volume)
+            settings = np.sqrt(np.maximum(available_head[k], 0) / resistance)  # FCV settings of the next step
+        TankVolume /= np.maximum(counts, 1)
+        Inflow /= np.maximum(counts, 1)
+        Required_Demand = np.tile(self.multipliers.T, (-(-num1 // self.multipliers.shape[1]), 1))[:num1] * \
+            (self.demand * self.fcv.flow_factor)[None, :] * properties['demand_multiplier'][:, None]
+        return TankVolume, Inflow, Required_Demand
+
+    def demand_deficit(self, arr1, arr2):
+        """Demand deficit (%) of every consumer (same rule as compute_demand_deficit)
+        :arr1: overhead tank volumes (see run)
+        :arr2: required demands (see run)
+        :return: array of demand deficit (%) with one row per variant and pattern step and one column per consumer
+        """
+        required_volume = arr2 * (self.dp / 1000)
+        volume_deficit = arr1 - required_volume
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(volume_deficit < 0, (np.abs(volume_deficit) / required_volume) * 100, 0)
@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import importlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from EPANET_IWS.result_store import result_writer
+from EPANET_IWS.pipeline import run_iws
+from EPANET_IWS.iws_log import logger, levels, configure
+from EPANET_IWS.profiler import profiler
+
+'''Scenario sweeps
+--- Every scenario (one set of IWS parameters) is converted, simulated and evaluated in its own worker process,
+since an EPANET model cannot be shared between threads. The node results of all the scenarios are collected in
+one result store, together with a table of summary statistics (one row per scenario) ---
+'''
+
+'''IWS parameters of a scenario (same inputs as Code_main)'''
+default_parameters = {'omitted_nodes': ['1'],  # Name(s) of node(s) omitted from adding artificial elements
+                      'a_nodes': [],  # Name(s) of node(s) with Type A consumer behaviour
+                      'pc_demand': 60,  # Per capita demand in Litres per day
+                      'household': 5,  # Average number of consumers per household
+                      'tank_in_pipe_name': ['1'],  # Name(s) of the inflow pipe(s) to the tank
+                      'tank_out_pipe_name': ['P-448'],  # Name(s) of the outflow pipe(s) from the tank
+                      'supply_hours': None,  # Daily supply periods [[start, end], ...] in hours (None keeps the
+                      # supply schedule of the input file)
+                      'hydraulic_step': 300,  # Simulation time step in seconds
+                      'days': 20,  # Simulation time duration in days
+                      'record_every': 1,  # Average every k-th hydraulic time step (see results_recorder)
+                      'record_dtype': 'float64',  # Type of the recorded values ('float32' halves them)
+                      'convergence_tolerance': None,  # Early stop tolerance (see convergence_monitor, None for none)
+                      'summary_days': 1}  # Number of final days used for the summary statistics
+
+'''Summary statistics of every scenario (columns of the summary table)'''
+summary_names = ['mean_deficit', 'max_deficit', 'deficit_nodes', 'deficit_spread', 'net_tank_inflow',
+                 'net_tank_outflow', 'node_withdrawal', 'balance_difference', 'warmup_days', 'warm_start', 'run_time']
+
+
+def scenario_grid(dict1):
+    """Expanding a grid of parameter values into a list of scenarios
+    :dict1: dictionary of parameter name and list of values
+    :return: list of parameter dictionaries (every combination of the values)
+    """
+    names = list(dict1)
+    return [dict(zip(names, values)) for values in itertools.product(*[dict1[name] for name in names])]
+
+
+def scenario_name(num1, dict1):
+    """Naming a scenario
+    :num1: scenario number
+    :dict1: scenario parameters (a 'name' entry is used if given)
+    :return: scenario name
+    """
+    return str(dict1.get('name', 's%03d' % num1))
+
+
+def summary_statistics(arr1, num1, dict1):
+    """Computing the summary statistics of a scenario over its final pattern steps
+    :arr1: array of demand deficit (%) in every demand node (-100 value indicate omitted node)
+    :num1: number of final pattern steps included
+    :dict1: mass balance dictionary (see check_mass_balance)
+    :return: dictionary of summary statistics (run_time excluded)
+    Arrays with leading dimensions (e.g. one result set per scenario) give one value per set.
+    """
+    deficit = np.asarray(arr1, dtype=float)[..., -num1:, :]
+    consumers = deficit[..., 0, :] != -100  # same consumers at every pattern step
+    node_deficit = np.where(consumers, deficit.mean(axis=-2), np.nan)  # mean deficit of every consumer
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {'mean_deficit': np.nanmean(node_deficit, axis=-1),
+                'max_deficit': np.max(np.where(consumers[..., None, :], deficit, -np.inf), axis=(-2, -1)),
+                'deficit_nodes': np.sum(node_deficit > 0, axis=-1) / np.sum(consumers, axis=-1) * 100,
+                'deficit_spread': np.nanstd(node_deficit, axis=-1),
+                'net_tank_inflow': dict1['net_tank_inflow'], 'net_tank_outflow': dict1['net_tank_outflow'],
+                'node_withdrawal': dict1['node_withdrawal'], 'balance_difference': dict1['difference_percent']}
+
+
+def run_scenario(str1, dict1, str2, prof=None):
+    """Converting, simulating and evaluating one scenario (see run_iws)
+    :str1: path of the original input file
+    :dict1: scenario parameters (missing entries are taken from default_parameters)
+    :str2: working folder (the run writes its copy of the input file and the modified network into a new subfolder)
+    :prof: profiler receiving the phases of the scenario (optional)
+    :return: dictionary of node names, time axis, demand deficit, relative distribution and summary statistics
+    """
+    importlib.import_module('epyt')  # imported once per worker process, left out of the run time
+    start_time = time.perf_counter()
+    parameters = dict(default_parameters, **dict1)
+    config = {name: parameters[name] for name in ['omitted_nodes', 'a_nodes', 'pc_demand', 'household',
+                                                  'tank_in_pipe_name', 'tank_out_pipe_name', 'supply_hours',
+                                                  'hydraulic_step', 'days', 'record_every', 'record_dtype',
+                                                  'convergence_tolerance']}
+    config.update({'use_conversion_cache': parameters.get('cache_folder') is not None,
+                   'cache_folder': parameters.get('cache_folder'),
+                   'use_warm_start': parameters.get('warm_start_folder') is not None,
+                   'warm_start_folder': parameters.get('warm_start_folder'), 'write_results': False,
+                   'make_plots': False, 'check_balance': True, 'stream_outputs': True, 'fast_engine': True,
+                   'output_folder': str2, 'separate_run_folder': True})
+    results = run_iws(str1, config, prof)
+    total_p = len(results['time'])
+    summary_steps = max(1, min(total_p, int(parameters['summary_days'] * 24 * 3600 / results['pattern_step'])))
+    summary = summary_statistics(results['Demand_deficit_out'], summary_steps, results['balance'])
+    summary['warmup_days'] = np.nan if results['warmup_days'] is None else results['warmup_days']
+    summary['warm_start'] = results['warm_start']
+    summary['run_time'] = time.perf_counter() - start_time
+    return {'node_names': results['node_names'], 'time': results['time'],
+            'Demand deficit': results['Demand_deficit_out'],
+            'Relative distribution': results['Relative_distribution_out'],
+            'summary': {name: float(value) for name, value in summary.items()}}
+
+
+def _run_logged(str1, dict1, str2, str3, str4='info', bool1=False):
+    """Running a scenario with its messages written to a log file
+    :str1: path of the original input file
+    :dict1: scenario parameters
+    :str2: working folder
+    :str3: log file path
+    :str4: log level of the scenario ('debug', 'info' or 'quiet', see iws_log.configure)
+    :bool1: save the profile of the scenario next to its log file (.profile.json, see profiler)
+    :return: scenario results (see run_scenario)
+    """
+    with open(str3, 'w') as log, contextlib.redirect_stdout(log):
+        level = logger.level
+        if logger.handlers == []:
+            configure(str4)  # new worker process
+        logger.setLevel(levels[str4])
+        prof = profiler(bool1)
+        try:
+            return run_scenario(str1, dict1, str2, prof)
+        finally:
+            prof.save(os.path.splitext(str3)[0] + '.profile.json')
+            logger.setLevel(level)
+            shutil.rmtree(str2, ignore_errors=True)
+
+
+def run_sweep(str1, arr1, str2, num1=None, str3='npz', dict1=None, str4='info', bool1=False):
+    """Running many scenarios of a network, each in its own worker process
+    :str1: path of the original input file
+    :arr1: list of scenario parameter dictionaries (see scenario_grid)
+    :str2: output folder name
+    :num1: number of worker processes (None uses every CPU, 1 runs the scenarios in this process)
+    :str3: result format ('csv', 'npz', 'parquet' or any format added with result_writer.register)
+    :dict1: parameters shared by every scenario (optional, e.g. a conversion cache or warm start folder)
+    :str4: log level of the scenario log files ('debug', 'info' or 'quiet')
+    :bool1: save the profile (phase times, calls and peak memory) of every scenario next to its log file
+    :return: summary table (one row per scenario, columns in summary_names) and list of (scenario name, error message)
+    of the failed scenarios
+    """
+    if num1 is None:
+        num1 = os.cpu_count() or 1
+    writer = result_writer(str2, str3)
+    log_folder = os.path.join(str2, 'logs')
+    if os.path.exists(log_folder) != True:
+        os.makedirs(log_folder, exist_ok=True)
+    names = [scenario_name(i, scenario) for i, scenario in enumerate(arr1)]
+    if len(set(names)) != len(names):
+        raise ValueError("Scenario names must be unique.")
+    scenarios = [dict(dict1 or {}, **{key: value for key, value in scenario.items() if key != 'name'})
+                 for scenario in arr1]
+    for scenario in scenarios:
+        unknown = set(scenario) - set(default_parameters) - {'cache_folder', 'warm_start_folder'}
+        if unknown != set():
+            raise ValueError("Unknown scenario parameter(s): %s" % ', '.join(sorted(unknown)))
+    jobs = [(str1, scenarios[i], tempfile.mkdtemp(prefix=names[i] + '_', dir=str2),
+             os.path.join(log_folder, names[i] + '.log'), str4, bool1) for i in range(len(arr1))]
+    results = {}
+    errors = []
+    logger.info("Running %d scenarios with %d worker processes.", len(jobs), min(num1, len(jobs)))
+    if num1 <= 1 or len(jobs) <= 1:
+        for i, args in enumerate(jobs):
+            try:
+                results[i] = _run_logged(*args)
+            except Exception as e:
+                errors.append((names[i], repr(e)))
+                logger.warning("Scenario %s failed (%r), see %s", names[i], e, args[3])
+            logger.info("Scenario %s completed (%d of %d).", names[i], i + 1, len(jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=min(num1, len(jobs))) as pool:
+            futures = {pool.submit(_run_logged, *args): i for i, args in enumerate(jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    errors.append((names[i], repr(e)))
+                    logger.warning("Scenario %s failed (%r), see %s", names[i], e, jobs[i][3])
+                logger.info("Scenario %s completed (%d of %d).", names[i], len(results) + len(errors), len(jobs))
+
+    '''Summary table (failed scenarios are NaN)'''
+    summary = np.full((len(arr1), len(summary_names)), np.nan)
+    for i, result in results.items():
+        summary[i] = [result['summary'][name] for name in summary_names]
+    metadata = {'network': os.path.basename(str1), 'scenarios': dict(zip(names, scenarios)), 'failed': dict(errors)}
+    writer.write('Summary', summary, summary_names, np.arange(len(arr1)), dict(metadata, rows=names))
+
+    '''Node results of all the scenarios (column names are scenario name/node name, shorter runs are NaN padded)'''
+    if results != {}:
+        total_p = max(len(result['time']) for result in results.values())
+        time_axis = max((result['time'] for result in results.values()), key=len)
+        for table in ['Demand deficit', 'Relative distribution']:
+            columns = []
+            column_names = []
+            for i in sorted(results):
+                values = np.full((total_p, len(results[i]['node_names'])), np.nan)
+                values[:len(results[i]['time'])] = results[i][table]
+                columns.append(values)
+                column_names += [names[i] + '/' + node for node in results[i]['node_names']]
+            writer.write(table, np.hstack(columns), column_names, time_axis, metadata)
+    logger.info("%d of %d scenarios completed, results in %s", len(results), len(arr1), str2)
+    return summary, errors
+
+
+def main(arr1=None):
+    """Command line interface of run_sweep
+    :arr1: list of command line arguments (optional, sys.argv if not given)
+    """
+    parser = argparse.ArgumentParser(description='Run a sweep of IWS scenarios of an EPANET network.')
+    parser.add_argument('network', help='path of the EPANET input file')
+    parser.add_argument('--scenarios', help='JSON file with a list of scenario parameter dictionaries '
+                                            '(instead of a grid)')
+    parser.add_argument('--pc_demand', type=float, nargs='+', help='per capita demands in Litres per day')
+    parser.add_argument('--household', type=float, nargs='+', help='average numbers of consumers per household')
+    parser.add_argument('--a_nodes', type=json.loads, nargs='+', help='JSON lists of Type A node names')
+    parser.add_argument('--omitted_nodes', type=json.loads, nargs='+', help='JSON lists of omitted node names')
+    parser.add_argument('--supply_hours', type=json.loads, nargs='+',
+                        help='JSON lists of daily supply periods in hours, e.g. "[[6, 10], [17, 20]]" or "null" '
+                             '(keeps the supply schedule of the input file)')
+    parser.add_argument('--tank_in_pipe_name', type=json.loads, help='JSON list of tank inflow pipe names')
+    parser.add_argument('--tank_out_pipe_name', type=json.loads, help='JSON list of tank outflow pipe names')
+    parser.add_argument('--days', type=float, help='simulation duration in days')
+    parser.add_argument('--hydraulic_step', type=int, help='hydraulic time step in seconds')
+    parser.add_argument('--record_every', type=int, help='average every k-th hydraulic time step')
+    parser.add_argument('--record_dtype', help='type of the recorded values (float64 or float32)')
+    parser.add_argument('--convergence_tolerance', type=float, help='stop each scenario once its daily profiles '
+                                                                    'repeat within this tolerance')
+    parser.add_argument('--cache', help='conversion cache folder shared by the scenarios')
+    parser.add_argument('--warm_start', help='folder of saved household tank states (each scenario starts from the '
+                                             'state of the last run with the same network and supply hours)')
+    parser.add_argument('--processes', type=int, help='number of worker processes (default: every CPU)')
+    parser.add_argument('--format', default='npz', help='result format (npz, parquet or csv)')
+    parser.add_argument('--output', default='Sweep_Results', help='output folder')
+    parser.add_argument('--log_level', default='info', choices=sorted(levels),
+                        help='messages shown and written to the scenario logs (debug lists every element and time '
+                             'step)')
+    parser.add_argument('--log_file', help='file receiving a time stamped copy of the sweep messages')
+    parser.add_argument('--profile', action='store_true', help='save the phase times, call counts and peak memory '
+                                                               'of every scenario next to its log')
+    args = parser.parse_args(arr1)
+    configure(args.log_level, args.log_file)
+    if args.scenarios is not None:
+        with open(args.scenarios) as f:
+            scenarios = json.load(f)
+    else:
+        grid = {name: getattr(args, name) for name in ['pc_demand', 'household', 'a_nodes', 'omitted_nodes',
+                                                        'supply_hours'] if getattr(args, name) is not None}
+        scenarios = scenario_grid(grid)
+    shared = {name: getattr(args, name) for name in ['tank_in_pipe_name', 'tank_out_pipe_name', 'days',
+                                                      'hydraulic_step', 'record_every', 'record_dtype',
+                                                      'convergence_tolerance']
+              if getattr(args, name) is not None}
+    if args.cache is not None:
+        shared['cache_folder'] = args.cache
+    if args.warm_start is not None:
+        shared['warm_start_folder'] = args.warm_start
+    summary, errors = run_sweep(args.network, scenarios, args.output, args.processes, args.format, shared,
+                                args.log_level, args.profile)
+    names = [scenario_name(i, scenario) for i, scenario in enumerate(scenarios)]
+    print('\n' + 'scenario'.ljust(12) + ''.join(name.rjust(20) for name in summary_names))
+    for i in range(len(names)):
+        print(names[i].ljust(12) + ''.join(('%.3f' % value).rjust(20) for value in summary[i]))
+
+
+if __name__ == '__main__':
+    main()
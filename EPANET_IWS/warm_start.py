@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import numpy as np
+from EPANET_IWS.result_store import atomic_path
+from EPANET_IWS.iws_log import logger
+
+
+class warm_start:
+
+    version = 1  # Increase whenever the saved state changes, so older snapshots are not reused
+
+    def __init__(self, str1):
+        """Snapshots of the household tank states at the end of a run, used as initial conditions of later runs
+        :str1: snapshot folder name
+        Every run starts the artificial overhead tanks empty (see get_artificial_oht_info) and needs a few simulated
+        days to fill them. A snapshot holds the water levels of the overhead tanks at the end of a run and the FCV
+        settings given by its last pressures; a later run of the same modified network starts from them instead.
+        """
+        self.folder = str1
+        if os.path.exists(self.folder) != True:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def key(self, str1, dict1):
+        """Generating the snapshot key of a run
+        :str1: path of the modified network file
+        :dict1: simulation parameters changing the tank states (hydraulic time step, supply hours, ...)
+        :return: SHA-256 hash of the modified network contents and the parameters
+        """
+        h = hashlib.sha256()
+        with open(str1, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        h.update(json.dumps({'version': self.version, 'parameters': dict1}, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def path(self, str1):
+        """Getting the file path of a snapshot
+        :str1: snapshot key
+        :return: path of the snapshot file
+        """
+        return os.path.join(self.folder, str1 + '.npz')
+
+    def get(self, str1):
+        """Loading a snapshot
+        :str1: snapshot key
+        :return: dictionary of tank names, levels, FCV settings (empty if not saved) and time (None if not saved)
+        """
+        file_path = self.path(str1)
+        if os.path.exists(file_path) != True:
+            return None
+        with np.load(file_path) as data:
+            return {name: data[name] for name in data.files}
+
+    def save(self, str1, d, idx, fcv=None, arr1=None, num1=0):
+        """Saving the household tank states at the end of a run
+        :str1: snapshot key
+        :d: EPANET model (after the hydraulic simulation)
+        :idx: network index of the modified network
+        :fcv: artificial FCV data (optional, the FCV settings are not saved if not given)
+        :arr1: recorded pressure heads of the last hydraulic step (required with fcv)
+        :num1: hydraulic simulation time of the saved state in seconds
+        :return: path of the snapshot file
+        """
+        tanks = idx.oht_tank[idx.consumers]
+        nodes = np.asarray(d.getNodeTankIndex(), dtype=int).reshape(-1)[tanks] - 1
+        heads = np.asarray(d.getNodeHydraulicHead(), dtype=float)[nodes]
+        levels = heads - np.asarray(d.getNodeElevations(), dtype=float)[nodes]
+        tank_names = d.getNodeTankNameID()
+        settings = np.array([]) if fcv is None else fcv.compute_settings(arr1)
+        file_path = self.path(str1)
+        with atomic_path(file_path) as temp_path:  # concurrent runs never read a partial file
+            np.savez(temp_path, tank_names=np.array([tank_names[i] for i in tanks]), levels=levels, settings=settings,
+                     time=np.array(num1))
+        return file_path
+
+    def apply(self, dict1, d, idx, fcv=None):
+        """Setting the initial household tank levels (and the first FCV settings) of a run from a snapshot
+        :dict1: snapshot (see get)
+        :d: EPANET model (before the hydraulic simulation)
+        :idx: network index of the modified network
+        :fcv: artificial FCV data (optional, the first FCV settings are computed from zero pressures if not given)
+        :return: True if the snapshot was applied, False if it does not match the network
+        """
+        tanks = idx.oht_tank[idx.consumers]
+        tank_names = d.getNodeTankNameID()
+        if [tank_names[i] for i in tanks] != [str(name) for name in dict1['tank_names']]:
+            logger.warning("Warm start snapshot does not match the household tanks of the network, the tanks start "
+                           "empty.")
+            return False
+        tank_index = np.asarray(d.getNodeTankIndex(), dtype=int).reshape(-1)[tanks]
+        minimum = np.asarray(d.getNodeTankMinimumWaterLevel(), dtype=float).reshape(-1)[tanks]
+        maximum = np.asarray(d.getNodeTankMaximumWaterLevel(), dtype=float).reshape(-1)[tanks]
+        levels = np.clip(dict1['levels'], minimum, maximum)
+        for node, level in zip(tank_index.tolist(), levels.tolist()):
+            d.setNodeTankInitialLevel(node, level)
+        if fcv is not None and len(dict1['settings']) == len(fcv.nodes):
+            fcv.initial_settings = np.array(dict1['settings'], dtype=float)
+        logger.info("Household tanks warm started from the state at %.1f days of a previous run.",
+                    dict1['time'] / 86400)
+        return True
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+'''Cold start time of a process running the IWS pipeline
+--- Every measurement runs in a new Python process (nothing imported yet, as in a sweep worker) and the fastest of the
+repeats is kept. The package import is measured without EpyT, which run_iws imports when a run starts. EpyT itself
+imports matplotlib and pandas, so its import time is the floor of every run and is reported without a target ---
+'''
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+'''Modules that must not be loaded by the package import'''
+heavy_modules = ['epyt', 'matplotlib', 'pandas', 'pyarrow']
+
+'''Measurement name, target in seconds (None for none) and the code timed in a new process (prints the time taken
+and the heavy modules loaded as JSON, {network} and {output} are the paths of the run)'''
+measurements = [('Interpreter start', None, 'pass'),
+                ('Package import', 0.25, 'import EPANET_IWS.pipeline'),
+                ('EpyT import', None, 'import epyt'),
+                ('First run', 1.0,
+                 'from EPANET_IWS.pipeline import run_iws\n'
+                 'from EPANET_IWS.iws_log import configure\n'
+                 'configure("quiet")\n'
+                 'run_iws({network!r}, {{"tank_in_pipe_name": [], "tank_out_pipe_name": ["1"], "days": 1, '
+                 '"use_conversion_cache": False, "write_results": False, "make_plots": False, '
+                 '"output_folder": {output!r}}})')]
+
+'''Wrapper printing the time taken by the code and the heavy modules it loaded'''
+wrapper = '''import sys, time, json, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{code}
+print(json.dumps({{'time': time.perf_counter() - start,
+                  'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+'''
+
+
+def measure(str1, num1=5):
+    """Running code in new Python processes
+    :str1: code
+    :num1: number of processes (the fastest is kept)
+    :return: fastest time of the code, fastest time of the whole process (interpreter start included) in seconds and
+    the heavy modules loaded
+    """
+    source = wrapper.format(root=root, code=str1, heavy=heavy_modules)
+    times, process_times = [], []
+    for i in range(num1):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', source], capture_output=True, text=True, check=True).stdout
+        process_times.append(time.perf_counter() - start)
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result['time'])
+    return min(times), min(process_times), result['loaded']
+
+
+def main(arr1=None):
+    """Command line interface
+    :arr1: list of command line arguments (optional, sys.argv if not given)
+    """
+    parser = argparse.ArgumentParser(description='Cold start time of a process running the IWS pipeline.')
+    parser.add_argument('--repeat', type=int, default=5, help='number of processes per measurement')
+    parser.add_argument('--pip', action='store_true',
+                        help='also time the "pip install epyt" call Code_main used to make at every start')
+    args = parser.parse_args(arr1)
+    folder = tempfile.mkdtemp()
+    try:
+        network = os.path.join(folder, 'Test.inp')
+        shutil.copyfile(os.path.join(root, 'Networks', 'Test.inp'), network)
+        results = []
+        for name, target, code in measurements:
+            code = code.format(network=network, output=os.path.join(folder, 'Analysis_Results'))
+            results.append((name, target) + measure(code, args.repeat))
+        if args.pip:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-m', 'pip', 'install', 'epyt'], capture_output=True)
+            results.append(('pip install epyt', None, time.perf_counter() - start, None, []))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    failed = False
+    print('\n%-20s%10s%14s%10s  %s' % ('measurement', 'time (s)', 'process (s)', 'target', 'heavy modules loaded'))
+    for name, target, code_time, process_time, loaded in results:
+        missed = target is not None and code_time > target
+        failed = failed or missed
+        print('%-20s%10.3f%14s%10s  %s%s' % (name, code_time, '-' if process_time is None else '%.3f' % process_time,
+                                             '-' if target is None else '%.2f' % target, ', '.join(loaded) or '-',
+                                             '  TARGET MISSED' if missed else ''))
+    package = [loaded for name, target, code_time, process_time, loaded in results if name == 'Package import'][0]
+    if package != []:
+        print('The package import loads %s.' % ', '.join(package))
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from EPANET_IWS.functions import fn
+from EPANET_IWS.network_index import network_index
+from EPANET_IWS.fcv_batch import fcv_batch
+from EPANET_IWS.results_recorder import results_recorder
+from EPANET_IWS.capture_plan import capture_plan
+from EPANET_IWS.pattern_aggregator import pattern_aggregator
+from EPANET_IWS.engine import iws_engine
+
+'''Per-step overhead of the hydraulic simulation loop: EpyT calls (Code_main loop) versus iws_engine
+--- Both loops apply the artificial FCV settings, record the pressures and aggregate flows and tank volumes as
+Code_main does with stream_outputs. The time spent inside runH/nextH (the hydraulic solver) is measured separately,
+so the overhead of a loop is its total time minus the solver time ---
+'''
+
+
+def convert(str1, str2, dict1):
+    """Converting a network into an IWS network (same inputs as Code_main)
+    :str1: path of the original input file
+    :str2: path of the modified input file
+    :dict1: IWS parameters
+    :return: original number of demand nodes and consumer type list
+    """
+    from epyt import epanet
+    d = epanet(str1)
+    cons_type_info = fn().consumer_type(d, d.getNodeCount(), d.getNodeReservoirCount(), d.getNodeTankCount(),
+                                        dict1['a_nodes'], dict1['omitted_nodes'])
+    base_demand_data = fn().node_base_demands(d)
+    demand_nodes_org = d.getNodeCount() - d.getNodeReservoirCount() - d.getNodeTankCount()
+    data = fn().get_artificial_elements_info(d, demand_nodes_org, dict1['pc_demand'], dict1['household'],
+                                             cons_type_info, base_demand_data)
+    fn().add_artificial_elements(d, demand_nodes_org, dict1['omitted_nodes'], data)
+    d.saveInputFile(str2)
+    d.unload()
+    return demand_nodes_org, cons_type_info
+
+
+def simulate(str1, num1, arr1, num2, dict1, engine):
+    """Running the hydraulic simulation loop once
+    :str1: path of the modified input file
+    :num1: original number of demand nodes
+    :arr1: consumer type list
+    :num2: simulation duration in days
+    :dict1: IWS parameters
+    :engine: True runs the loop on iws_engine, False on the EpyT methods
+    :return: total loop time, solver time, number of steps, flow output and tank volume output
+    """
+    from epyt import epanet
+    d = epanet(str1)
+    idx = network_index(d, num1, arr1)
+    d.setTimeHydraulicStep(300)
+    d.setTimeSimulationDuration(int(num2 * 24 * 3600))
+    dh = d.getTimeHydraulicStep()
+    T = d.getTimeSimulationDuration()
+    dp = d.getTimePatternStep()
+    plan = capture_plan(d, idx, dict1['tank_in_pipe_name'], dict1['tank_out_pipe_name'])
+    fcv = fcv_batch(d, idx, plan.pressure_columns)
+    aggregator = pattern_aggregator(d, dh, dp, int(T/ dp), plan)
+    recorder = results_recorder(d, plan=plan, arr1=['Pressure'])
+    solver_time = 0
+    steps = 0
+    t = 0
+    d.openHydraulicAnalysis()
+    d.initializeHydraulicAnalysis()
+    if engine:
+        source = iws_engine(d, fcv)
+        start = time.perf_counter()
+        while t < T:
+            source.set_settings(recorder.last('Pressure'))
+            solver_start = time.perf_counter()
+            t = source.run_step()
+            solver_time += time.perf_counter() - solver_start
+            recorder.record(source, t)
+            aggregator.add(source, t)
+            solver_start = time.perf_counter()
+            source.next_step()
+            solver_time += time.perf_counter() - solver_start
+            steps += 1
+    else:
+        source = d
+        start = time.perf_counter()
+        while t < T:
+            fcv.set_settings(d, recorder.last('Pressure'))
+            solver_start = time.perf_counter()
+            t = d.runHydraulicAnalysis()
+            solver_time += time.perf_counter() - solver_start
+            recorder.record(d, t)
+            aggregator.add(d, t)
+            solver_start = time.perf_counter()
+            d.nextHydraulicAnalysisStep()
+            solver_time += time.perf_counter() - solver_start
+            steps += 1
+    total_time = time.perf_counter() - start
+    d.closeHydraulicAnalysis()
+    d.unload()
+    Flow_out, TankVolume_out = aggregator.results()
+    return total_time, solver_time, steps, Flow_out, TankVolume_out
+
+
+def main(arr1=None):
+    """Command line interface
+    :arr1: list of command line arguments (optional, sys.argv if not given)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Per-step overhead of the hydraulic simulation loop.')
+    parser.add_argument('--network', default=os.path.join(root, 'Networks', 'Suvarnadhara_final3.inp'))
+    parser.add_argument('--days', type=float, default=20, help='simulation duration in days')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs of every loop (the fastest is kept)')
+    args = parser.parse_args(arr1)
+    warnings.filterwarnings('ignore')
+    parameters = {'omitted_nodes': ['1'], 'a_nodes': [], 'pc_demand': 60, 'household': 5,
+                  'tank_in_pipe_name': ['1'], 'tank_out_pipe_name': ['P-448']}
+    folder = tempfile.mkdtemp()
+    file_path_mod = os.path.join(folder, 'network_mod.inp')
+    num1, cons_type_info = convert(args.network, file_path_mod, parameters)
+    results = {}
+    for name, engine in [('EpyT loop', False), ('iws_engine', True)]:
+        runs = [simulate(file_path_mod, num1, cons_type_info, args.days, parameters, engine)
+                for i in range(args.repeat)]
+        results[name] = min(runs, key=lambda run: run[0])
+    os.remove(file_path_mod)
+    os.rmdir(folder)
+    print('\n%-12s%8s%14s%14s%16s' % ('loop', 'steps', 'total (s)', 'solver (s)', 'overhead/step'))
+    for name, (total_time, solver_time, steps, Flow_out, TankVolume_out) in results.items():
+        print('%-12s%8d%14.3f%14.3f%13.1f us' % (name, steps, total_time, solver_time,
+                                                 (total_time - solver_time) / steps * 1e6))
+    old, new = results['EpyT loop'], results['iws_engine']
+    print('Overhead reduced %.1fx, identical outputs: %s' % (
+        ((old[0] - old[1]) / old[2]) / ((new[0] - new[1]) / new[2]),
+        np.array_equal(old[3], new[3]) and np.array_equal(old[4], new[4])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from EPANET_IWS.functions import fn
+from EPANET_IWS.network_index import network_index
+from EPANET_IWS.fcv_batch import fcv_batch
+from EPANET_IWS.results_recorder import results_recorder
+from EPANET_IWS.capture_plan import capture_plan
+from EPANET_IWS.engine import iws_engine
+from EPANET_IWS.iws_log import configure
+from benchmarks.engine_step import convert
+
+'''Regression check of the vectorized pattern step outputs
+--- make_Flow_output, make_TankVolume_output (pattern_step_mean) and make_Required_Demand_output are compared with
+the loops they replaced (kept below) on the recorded hydraulic steps of a network. The recorded steps are also cut
+short, so the last pattern steps are partial (fewer hydraulic steps than a pattern step) or empty. The outputs must
+be identical (NaN for empty pattern steps in both). The required demands of a partial last pattern cycle are the one
+intended difference: the old loop left them zero (infinite deficit), they now continue the pattern ---
+'''
+
+
+def old_pattern_output(num1, num2, num3, arr1):
+    """Loop of make_Flow_output and make_TankVolume_output before pattern_step_mean
+    :num1: hydraulic simulation time step in seconds
+    :num2: demand pattern time step in seconds
+    :num3: total number of pattern steps
+    :arr1: filtered output (one column per recorded element)
+    :return: array of pattern step averages
+    """
+    out = np.zeros((num3, arr1.shape[1]))
+    for i in range(arr1.shape[1]):
+        m = int(num2/ num1)
+        a = 0
+        b = a + m
+        for j in range(num3):
+            out[j, i] = np.mean(arr1[a : b, i])
+            a += m
+            b += m
+    return out
+
+
+def old_required_demand_output(d, num1, num2, arr1, idx):
+    """Loop of make_Required_Demand_output before its vectorization
+    :d: EPANET model
+    :num1: original number of demand nodes (before network modification)
+    :num2: total number of pattern steps
+    :arr1: consumer type list
+    :idx: network index of the modified network
+    :return: final array of required nodal demands
+    """
+    patterns = list(d.getNodeDemandPatternIndex().items())[0][1]
+    Required_Demand_out = np.zeros((num2, num1))
+    for n in range(num1):
+        if arr1[n] != '' and arr1[n] == 'B':
+            pattern_id = patterns[idx.consumer_node[n]]  # same pattern as the original node
+            pattern_array = d.getPattern()[pattern_id - 1]
+            artificial_consumer_node_index = idx.consumer_node[n] + 1
+            base_demand = list(d.getNodeBaseDemands().items())[0][1][artificial_consumer_node_index - 1]
+            m = int(len(pattern_array))
+            a = 0
+            b = a + m
+            for j in range(int(num2/ len(pattern_array))):
+                Required_Demand_out[a: b, n] = np.multiply(pattern_array, base_demand)
+                a += m
+                b += m
+    return Required_Demand_out
+
+
+def record(str1, num1, num2):
+    """Simulating a modified network and recording every hydraulic step (as Code_main without stream_outputs)
+    :str1: path of the modified input file
+    :num1: original number of demand nodes
+    :num2: consumer type list
+    :return: EPANET model (loaded), network index, hydraulic and pattern time steps, number of pattern steps and the
+    filtered flows and tank volumes (one row per hydraulic step)
+    """
+    from epyt import epanet
+    d = epanet(str1, display_msg=False, display_warnings=False)
+    idx = network_index(d, num1, num2)
+    d.setTimeHydraulicStep(300)
+    d.setTimeSimulationDuration(2 * 24 * 3600)
+    dh = d.getTimeHydraulicStep()
+    T = d.getTimeSimulationDuration()
+    dp = d.getTimePatternStep()
+    plan = capture_plan(d, idx, [], ['1'], True, True, True)
+    recorder = results_recorder(d, plan=plan)
+    iws_engine(d, fcv_batch(d, idx, plan.pressure_columns)).run(T, recorder)
+    filtered_steps = fn().filter_time_steps((recorder.count - 1) / (int((recorder.results()[0][-1] / dh) + 1) - 1),
+                                            recorder.count, dh, recorder.results()[0])
+    recorder.remove_steps(filtered_steps)
+    hydraulic_report = fn().final_report(d, [], *recorder.results())
+    recorder.close()
+    return d, idx, dh, dp, int(T/ dp), np.asarray(hydraulic_report[3]), np.asarray(hydraulic_report[4])
+
+
+def main(arr1=None):
+    """Command line interface
+    :arr1: list of command line arguments (optional, sys.argv if not given)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Regression check of the vectorized pattern step outputs.')
+    parser.add_argument('--network', default=os.path.join(root, 'Networks', 'Test.inp'))
+    args = parser.parse_args(arr1)
+    configure('quiet')
+    parameters = {'omitted_nodes': ['1'], 'a_nodes': [], 'pc_demand': 60, 'household': 5}
+    folder = tempfile.mkdtemp()
+    try:
+        file_path = os.path.join(folder, os.path.basename(args.network))  # EpyT writes next to the file it opens
+        shutil.copyfile(args.network, file_path)
+        num1, cons_type_info = convert(file_path, os.path.join(folder, 'network_mod.inp'), parameters)
+        warnings.filterwarnings('ignore')  # EpyT shows every warning of the conversion run
+        d, idx, dh, dp, total_p, flows, volumes = record(os.path.join(folder, 'network_mod.inp'), num1,
+                                                         cons_type_info)
+        m = int(dp/ dh)
+        failed = []
+        '''Full recording, partial last pattern step, empty last pattern steps'''
+        for name, cut in [('full', 0), ('partial last step', m // 2), ('empty last steps', 2 * m + 1)]:
+            f, v = flows[:len(flows) - cut], volumes[:len(volumes) - cut]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                old_flow = old_pattern_output(dh, dp, total_p, f)
+                old_flow[old_flow < 0] = 0
+                checks = [('Flow_out', fn().make_Flow_output(d, dh, dp, total_p, f), old_flow),
+                          ('TankVolume_out', fn().make_TankVolume_output(d, dh, dp, total_p, v),
+                           old_pattern_output(dh, dp, total_p, v))]
+            for output, new, old in checks:
+                identical = np.array_equal(new, old, equal_nan=True)
+                print('%-16s%-20s%s' % (output, name, 'identical' if identical else 'DIFFERENT'))
+                if identical != True:
+                    failed.append((output, name))
+        '''Whole and partial pattern cycles'''
+        pattern_length = np.asarray(d.getPattern()).reshape(-1, np.asarray(d.getPattern()).shape[-1]).shape[1]
+        for name, steps in [('whole cycles', total_p), ('partial cycle', total_p - pattern_length // 3)]:
+            new = fn().make_Required_Demand_output(d, num1, steps, cons_type_info, idx)
+            old = old_required_demand_output(d, num1, steps, cons_type_info, idx)
+            whole = steps // pattern_length * pattern_length
+            identical = np.array_equal(new[:whole], old[:whole]) and \
+                np.array_equal(new[whole:], new[:steps - whole])  # partial cycle continues the pattern
+            print('%-16s%-20s%s' % ('Required_Demand', name, 'identical' if identical else 'DIFFERENT'))
+            if identical != True:
+                failed.append(('Required_Demand_out', name))
+        d.unload()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    if failed != []:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from EPANET_IWS.pipeline import run_iws
+from EPANET_IWS.iws_log import configure
+from EPANET_IWS.profiler import profiler
+from benchmarks.synthetic_network import synthetic_network
+
+'''Scaling of the IWS pipeline on synthetic networks (see synthetic_network)
+--- Every network size runs in a new process, so its peak resident memory (EPANET included) is its own. The phases
+of run_iws are timed separately and their peak memory is tracked (Python and NumPy allocations, see profiler). The
+results of every size are compared with the stored baseline, and stages slower than the baseline by more than the
+threshold are reported, so the exit status can gate regressions ---
+'''
+
+'''Pipeline stages in the order they run (network generation, then the phases of run_iws)'''
+stages = ['Generation', 'Loading', 'Network conversion', 'Simulation setup', 'Hydraulic simulation',
+          'Report processing', 'Demand outputs', 'Result files', 'Mass balance']
+
+'''Result values compared with the baseline'''
+result_names = ['time_steps', 'mean_deficit', 'mean_tank_volume', 'mean_flow', 'node_withdrawal']
+
+
+def run_pipeline(num1, num2=0, num3=12, bool1=True):
+    """Generating a synthetic network and running the IWS pipeline on it (run_iws with its default settings, npz
+    result files and no plots)
+    :num1: number of consumer junctions
+    :num2: random seed of the network
+    :num3: simulation duration in hours
+    :bool1: track the peak memory of every stage (tracemalloc, slows the stages down)
+    :return: dictionary of stage records (time and peak memory), total time, peak resident memory and result values
+    """
+    importlib.import_module('epyt')  # imported before the stages are timed
+    configure('quiet')
+    warnings.filterwarnings('ignore')
+    folder = tempfile.mkdtemp()
+    prof = profiler(True, bool1)
+    try:
+        prof.phase('Generation')
+        file_path = os.path.join(folder, 'synthetic.inp')
+        parameters = synthetic_network(num1, file_path, num2)
+        results = run_iws(file_path, dict(parameters, hydraulic_step=300, days=num3 / 24, result_format='npz',
+                                          make_plots=False, output_folder=folder), prof)
+        prof.note(junctions=num1)
+        summary = prof.save(os.path.join(folder, 'profile.json'))
+    finally:
+        prof.close()
+        shutil.rmtree(folder, ignore_errors=True)
+    consumers = results['Demand_deficit_out'][0] != -100
+    return {'stages': summary['phases'], 'total_time': sum(record['time'] for record in summary['phases'].values()),
+            'max_rss': summary.get('max_rss'), 'nodes': summary['info']['nodes'], 'links': summary['info']['links'],
+            'results': {'time_steps': results['time_steps'],
+                        'mean_deficit': float(results['Demand_deficit_out'][:, consumers].mean()),
+                        'mean_tank_volume': float(results['TankVolume_out'].sum(axis=1).mean()),
+                        'mean_flow': float(np.abs(results['Flow_out']).sum(axis=1).mean()),
+                        'node_withdrawal': float(results['balance']['node_withdrawal'])}}
+
+
+def compare(dict1, dict2, num1=1.25, num2=0.5, num3=1e-6):
+    """Comparing a benchmark run with its baseline
+    :dict1: run (see run_pipeline)
+    :dict2: baseline run
+    :num1: time ratio above which a stage is a regression
+    :num2: stage time in seconds below which time ratios are ignored (timer noise)
+    :num3: relative tolerance of the result values
+    :return: list of differing result names and list of (stage, time ratio) of the regressions
+    """
+    differences = [name for name in result_names
+                   if np.isclose(dict1['results'][name], dict2['results'][name], rtol=num3, atol=0) != True]
+    regressions = []
+    for stage, record in dict1['stages'].items():
+        base = dict2['stages'].get(stage)
+        if base is not None and max(record['time'], base['time']) >= num2 and \
+                record['time'] > num1 * base['time']:
+            regressions.append((stage, record['time'] / base['time']))
+    return differences, regressions
+
+
+def main(arr1=None):
+    """Command line interface
+    :arr1: list of command line arguments (optional, sys.argv if not given)
+    """
+    parser = argparse.ArgumentParser(description='Scaling of the IWS pipeline on synthetic networks.')
+    parser.add_argument('--junctions', type=int, nargs='+', default=[100, 1000],
+                        help='network sizes (consumer junctions, e.g. 100 1000 10000 50000)')
+    parser.add_argument('--hours', type=float, default=12, help='simulation duration in hours')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the networks')
+    parser.add_argument('--no_memory', action='store_true', help='do not track the peak memory of the stages')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           'baseline.json'), help='baseline file')
+    parser.add_argument('--save_baseline', action='store_true', help='store this run as the baseline of its sizes')
+    parser.add_argument('--threshold', type=float, default=1.25, help='time ratio reported as a regression')
+    parser.add_argument('--output', help='JSON file receiving the full records of this run')
+    args = parser.parse_args(arr1)
+    settings = {'hours': args.hours, 'seed': args.seed, 'memory': args.no_memory != True}
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    runs = {}
+    for size in args.junctions:
+        with ProcessPoolExecutor(max_workers=1) as pool:  # new process for every size
+            runs[str(size)] = dict(pool.submit(run_pipeline, size, args.seed, args.hours, settings['memory']).result(),
+                                   settings=settings)
+        run = runs[str(size)]
+        print('\n%d junctions (%d nodes, %d links after conversion), %d hydraulic time steps, %.2f s' % (
+            size, run['nodes'], run['links'], run['results']['time_steps'], run['total_time']))
+        base = baseline.get(str(size))
+        comparable = base is not None and base['settings'] == settings
+        print('%-24s%12s%16s%14s' % ('stage', 'time (s)', 'peak memory', 'vs baseline'))
+        for stage in stages:
+            record = run['stages'][stage]
+            ratio = '%.2fx' % (record['time'] / base['stages'][stage]['time']) if comparable and \
+                stage in base['stages'] and base['stages'][stage]['time'] > 0 else '-'
+            memory = '%.1f MB' % (record['peak_memory'] / 1024 ** 2) if settings['memory'] else '-'
+            print('%-24s%12.3f%16s%14s' % (stage, record['time'], memory, ratio))
+        if run['max_rss'] is not None:
+            print('Peak resident memory %.1f MB' % (run['max_rss'] / 1024 ** 2))
+
+    '''Comparison with the baseline'''
+    failed = False
+    print()
+    for size, run in runs.items():
+        base = baseline.get(size)
+        if base is None or base['settings'] != settings:
+            print('%s junctions: no baseline with these settings' % size)
+            continue
+        differences, regressions = compare(run, base, args.threshold)
+        failed = failed or differences != [] or regressions != []
+        print('%s junctions: results %s, %s' % (
+            size, 'identical' if differences == [] else 'DIFFER (%s)' % ', '.join(differences),
+            'no regression' if regressions == [] else 'REGRESSION ' + ', '.join(
+                '%s %.2fx' % (stage, ratio) for stage, ratio in regressions)))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(runs, f, indent=2)
+    if args.save_baseline:
+        baseline.update(runs)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('Baseline of %s junctions saved to %s' % (', '.join(runs), args.baseline))
+    elif failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
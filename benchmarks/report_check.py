@@ -0,0 +1,62 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from EPANET_IWS.pipeline import run_iws
+from EPANET_IWS.iws_log import configure
+
+'''Regression check of the multi-node report pages
+--- run_iws renders the reports of a network with every Type B node, with a node list matching no node and with
+plot_worst = 0. A run must complete in every case, create one PDF per plot type (or one PNG per page) when nodes are
+selected and no report file otherwise ---
+'''
+
+'''Case name, report settings and whether report files are expected'''
+cases = [('every node', {}, True),
+         ('no matching node', {'plot_nodes': ['no such node']}, False),
+         ('no worst node', {'plot_worst': 0}, False)]
+
+
+def main(arr1=None):
+    """Command line interface
+    :arr1: list of command line arguments (optional, sys.argv if not given)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Regression check of the multi-node report pages.')
+    parser.add_argument('--network', default=os.path.join(root, 'Networks', 'Test.inp'))
+    parser.add_argument('--tank_out_pipe_name', default='1', help='name of the tank outflow pipe')
+    args = parser.parse_args(arr1)
+    configure('quiet')
+    warnings.filterwarnings('ignore')
+    failed = []
+    folder = tempfile.mkdtemp()
+    try:
+        for plot_mode in ['pdf', 'png']:
+            for name, settings, expected in cases:
+                try:
+                    results = run_iws(args.network, dict({'tank_in_pipe_name': [],
+                                                          'tank_out_pipe_name': [args.tank_out_pipe_name],
+                                                          'days': 1, 'write_results': False, 'plot_mode': plot_mode,
+                                                          'output_folder': folder}, **settings))
+                    reports = [file for file in os.listdir(results['output_folder'])
+                               if file.endswith('.' + plot_mode)]
+                    passed = (reports != []) == expected
+                    outcome = '%d report files' % len(reports)
+                except Exception as e:
+                    passed = False
+                    outcome = repr(e)
+                print('%-6s%-20s%-50s%s' % (plot_mode, name, outcome, 'ok' if passed else 'FAILED'))
+                if passed != True:
+                    failed.append((plot_mode, name))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    if failed != []:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
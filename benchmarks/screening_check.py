@@ -0,0 +1,150 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from EPANET_IWS.functions import fn
+from EPANET_IWS.network_index import network_index
+from EPANET_IWS.fcv_batch import fcv_batch
+from EPANET_IWS.results_recorder import results_recorder
+from EPANET_IWS.capture_plan import capture_plan
+from EPANET_IWS.pattern_aggregator import pattern_aggregator
+from EPANET_IWS.engine import iws_engine
+from EPANET_IWS.screening import screening_solver
+from benchmarks.engine_step import convert
+
+'''Deviation of the screening solver from full hydraulic simulations
+--- The ferrule pressures (and inflows) of one base run are reused for every variant by screening_solver, with and
+without the base inflows. Every variant is also converted and simulated in full (iws_engine), and the overhead tank
+volumes and demand deficits are compared at every pattern step ---
+'''
+
+'''Variants compared (see screening_solver.variant_properties)'''
+variants = [{},
+            {'pc_demand': 40}, {'pc_demand': 80}, {'pc_demand': 135},
+            {'household': 4}, {'household': 8},
+            {'demand_multiplier': 0.8}, {'demand_multiplier': 1.2},
+            {'initial_level': 1}, {'pc_demand': 100, 'household': 4, 'demand_multiplier': 1.1}]
+
+
+def simulate(str1, num1, arr1, num2, dict1, dict2):
+    """Running the full hydraulic simulation of a variant
+    :str1: path of the original input file
+    :num1: hydraulic time step in seconds
+    :arr1: list of tank outflow pipe names
+    :num2: simulation duration in days
+    :dict1: IWS parameters of the base network
+    :dict2: variant
+    :return: overhead tank volumes and demand deficits (one row per pattern step, one column per consumer)
+    """
+    from epyt import epanet
+    folder = tempfile.mkdtemp()
+    file_path_mod = os.path.join(folder, 'variant_mod.inp')
+    parameters = dict(dict1, **{name: dict2[name] for name in ['pc_demand', 'household'] if name in dict2})
+    demand_nodes_org, cons_type_info = convert(str1, file_path_mod, parameters)
+    d = epanet(file_path_mod)
+    idx = network_index(d, demand_nodes_org, cons_type_info)
+    consumers = idx.consumers
+    if dict2.get('demand_multiplier', 1) != 1:
+        for node in idx.consumer_node[consumers] + 1:
+            d.setNodeBaseDemands(int(node), d.getNodeBaseDemands()[1][node - 1] * dict2['demand_multiplier'])
+    if dict2.get('initial_level', 0) != 0:
+        levels = np.minimum(dict2['initial_level'], d.getNodeTankMaximumWaterLevel())
+        for tank in idx.oht_tank[consumers]:
+            d.setNodeTankInitialLevel(int(d.getNodeTankIndex()[tank]), float(levels[tank]))
+    d.setTimeHydraulicStep(num1)
+    d.setTimeSimulationDuration(int(num2 * 24 * 3600))
+    dh = d.getTimeHydraulicStep()
+    T = d.getTimeSimulationDuration()
+    dp = d.getTimePatternStep()
+    total_p = int(T/ dp)
+    plan = capture_plan(d, idx, [], arr1, False, True, False)
+    out_idx = idx.remap(plan.links, plan.tanks)
+    fcv = fcv_batch(d, idx, plan.pressure_columns)
+    aggregator = pattern_aggregator(d, dh, dp, total_p, plan)
+    recorder = results_recorder(d, plan=plan, arr1=['Pressure'])
+    iws_engine(d, fcv).run(T, recorder, aggregator)
+    Flow_out, TankVolume_out = aggregator.results()
+    Required_Demand_out = fn().make_Required_Demand_output(d, demand_nodes_org, total_p, cons_type_info, idx)
+    Demand_deficit_out = fn().compute_demand_deficit(d, demand_nodes_org, dp, total_p, TankVolume_out,
+                                                     Required_Demand_out, cons_type_info, out_idx)
+    d.unload()
+    os.remove(file_path_mod)
+    os.rmdir(folder)
+    return TankVolume_out[:, out_idx.oht_tank[consumers]], Demand_deficit_out[:, consumers]
+
+
+def main(arr1=None):
+    """Command line interface
+    :arr1: list of command line arguments (optional, sys.argv if not given)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Deviation of the screening solver from full simulations.')
+    parser.add_argument('--network', default=os.path.join(root, 'Networks', 'Test.inp'))
+    parser.add_argument('--tank_out_pipe_name', default=['1'], nargs='+', help='tank outflow pipe names')
+    parser.add_argument('--days', type=float, default=3, help='simulation duration in days')
+    parser.add_argument('--hydraulic_step', type=int, default=300, help='hydraulic time step in seconds')
+    parser.add_argument('--bulk', type=int, default=10000, help='number of variants of the timing run')
+    args = parser.parse_args(arr1)
+    warnings.filterwarnings('ignore')
+    from epyt import epanet
+    parameters = {'omitted_nodes': ['1'], 'a_nodes': [], 'pc_demand': 60, 'household': 5}
+
+    '''Base run (full simulation) giving the ferrule pressures'''
+    folder = tempfile.mkdtemp()
+    file_path_mod = os.path.join(folder, 'network_mod.inp')
+    demand_nodes_org, cons_type_info = convert(args.network, file_path_mod, parameters)
+    d = epanet(file_path_mod)
+    idx = network_index(d, demand_nodes_org, cons_type_info)
+    d.setTimeHydraulicStep(args.hydraulic_step)
+    T = int(args.days * 24 * 3600)
+    d.setTimeSimulationDuration(T)
+    fcv = fcv_batch(d, idx)
+    solver = screening_solver(d, idx, fcv, parameters['pc_demand'], parameters['household'])
+    start = time.perf_counter()
+    Time, Pressure, Inflow_base = solver.base_run(T)
+    base_time = time.perf_counter() - start
+    total_p = int(T / d.getTimePatternStep())
+
+    '''Screening of every variant at once (pressures and base inflows, pressures only)'''
+    start = time.perf_counter()
+    screened = {}
+    for mode, inflows in [('inflow', Inflow_base), ('pressure', None)]:
+        TankVolume, Inflow, Required_Demand = solver.run(Time, Pressure, variants, total_p, inflows)
+        screened[mode] = (TankVolume, solver.demand_deficit(TankVolume, Required_Demand))
+    screening_time = (time.perf_counter() - start) / 2
+    start = time.perf_counter()
+    solver.run(Time, Pressure, [variants[i % len(variants)] for i in range(args.bulk)], total_p, Inflow_base)
+    bulk_time = time.perf_counter() - start
+    d.unload()
+    os.remove(file_path_mod)
+    os.rmdir(folder)
+
+    '''Full simulation of every variant'''
+    print('\nTank volume error (max / mean, m3) and mean demand deficit error (percentage points) against full runs')
+    print('%-60s%12s%16s%10s%16s%10s' % ('variant', 'max volume', 'with inflows', 'deficit', 'pressures only',
+                                         'deficit'))
+    full_time = 0
+    for i, variant in enumerate(variants):
+        start = time.perf_counter()
+        TankVolume_full, Demand_deficit_full = simulate(args.network, args.hydraulic_step, args.tank_out_pipe_name,
+                                                        args.days, parameters, variant)
+        full_time += time.perf_counter() - start
+        errors = []
+        for mode in ['inflow', 'pressure']:
+            TankVolume, Demand_deficit = screened[mode]
+            error = np.abs(TankVolume[i] - TankVolume_full)
+            errors += ['%.1f / %.1f' % (error.max(), error.mean()),
+                       '%.2f' % np.abs(Demand_deficit[i] - Demand_deficit_full).mean()]
+        print('%-60s%12.0f%16s%10s%16s%10s' % ((str(variant or 'base'), TankVolume_full.max()) + tuple(errors)))
+    print('\nBase run %.2f s, full runs %.2f s per variant, screening %.4f s for %d variants (%.2e s per variant '
+          'with %d variants)' % (base_time, full_time / len(variants), screening_time, len(variants),
+                                 bulk_time / args.bulk, args.bulk))
+
+
+if __name__ == '__main__':
+    main()
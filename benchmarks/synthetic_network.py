@@ -0,0 +1,136 @@
+import argparse
+import math
+import os
+import numpy as np
+
+'''Synthetic IWS networks of any size
+--- The consumer junctions lie on a square grid (100 m spacing) fed from a single elevated tank at its centre. The
+tank is filled from a supply junction with a negative demand during the daily supply hours (as the tank of
+Suvarnadhara_final3), so the supply junction is omitted from the IWS conversion. Pipes of a spanning tree of the grid
+are sized by the peak demand downstream of them, the remaining grid pipes close loops with the smallest diameter.
+Every junction follows one of several diurnal demand patterns (shifted peaks). The same arguments always give the
+same network ---
+'''
+
+'''Standard pipe diameters in mm'''
+diameters = [50, 63, 75, 90, 110, 125, 160, 200, 250, 315, 400, 500, 600, 700, 800, 900, 1000, 1200, 1400, 1600,
+             1800, 2000]
+
+'''Diurnal demand pattern (hourly multipliers, morning and evening peaks)'''
+diurnal = np.array([0.3, 0.2, 0.2, 0.2, 0.3, 0.6, 1.4, 2.0, 1.9, 1.5, 1.1, 0.9,
+                    0.9, 0.8, 0.7, 0.7, 0.8, 1.1, 1.6, 1.9, 1.7, 1.3, 0.8, 0.5])
+
+
+def synthetic_network(num1, str1, num2=0, num3=4, num4=0.2, arr1=None):
+    """Writing a synthetic IWS network
+    :num1: number of consumer junctions
+    :str1: path of the input file written
+    :num2: random seed
+    :num3: number of demand patterns (the diurnal pattern with its peaks shifted by 0, 1, 2, ... hours)
+    :num4: fraction of the non-tree grid pipes kept as loops
+    :arr1: daily supply period [start, end] in hours (optional, [6, 12] if not given)
+    :return: IWS parameters of the network (Code_main inputs: omitted_nodes, a_nodes, pc_demand, household,
+    tank_in_pipe_name and tank_out_pipe_name)
+    """
+    rng = np.random.default_rng(num2)
+    start, end = arr1 or [6, 12]
+    cols = int(math.ceil(math.sqrt(num1)))
+    row, col = np.divmod(np.arange(num1), cols)
+    '''Junctions: elevations rising across the grid, base demands in LPS and patterns'''
+    elevations = 100 + 20 * col / max(cols - 1, 1) + rng.uniform(0, 10, num1)
+    demands = rng.uniform(0.02, 0.12, num1)
+    patterns = rng.integers(0, num3, num1)
+    '''Grid pipes (right and lower neighbours) and the spanning tree from the centre junction'''
+    right = np.nonzero((col + 1 < cols) & (np.arange(num1) + 1 < num1))[0]
+    down = np.nonzero(np.arange(num1) + cols < num1)[0]
+    edges = np.concatenate([np.stack([right, right + 1], axis=1), np.stack([down, down + cols], axis=1)])
+    neighbours = [[] for i in range(num1)]
+    for k, (a, b) in enumerate(edges.tolist()):
+        neighbours[a].append((b, k))
+        neighbours[b].append((a, k))
+    centre = min((cols // 2) * cols + cols // 2, num1 - 1)
+    parent_edge = np.full(num1, -1)
+    parent = np.full(num1, -1)
+    order = [centre]
+    seen = np.zeros(num1, dtype=bool)
+    seen[centre] = True
+    for node in order:  # breadth first search, order grows while it is read
+        for other, k in neighbours[node]:
+            if seen[other] != True:
+                seen[other] = True
+                parent[other] = node
+                parent_edge[other] = k
+                order.append(other)
+    '''Peak flow of every tree pipe (demand downstream of it) and its diameter at 1 m/s'''
+    downstream = demands * diurnal.max() / 1000  # cub.m/s
+    for node in reversed(order[1:]):
+        downstream[parent[node]] += downstream[node]
+    flows = np.zeros(len(edges))
+    flows[parent_edge[order[1:]]] = downstream[order[1:]]
+    tree = np.zeros(len(edges), dtype=bool)
+    tree[parent_edge[order[1:]]] = True
+    kept = tree | (rng.random(len(edges)) < num4)
+    sizes = np.array(diameters)
+    pipe_diameters = sizes[np.minimum(np.searchsorted(sizes, np.sqrt(4 * flows / math.pi) * 1000), len(sizes) - 1)]
+    '''Tank holding a day of demand and the supply junction filling it during the supply hours'''
+    daily_volume = demands.sum() / 1000 * 24 * 3600
+    tank_elevation = 150
+    tank_diameter = math.sqrt(4 * daily_volume / (math.pi * 4))  # 4 m maximum level
+    supply = daily_volume / ((end - start) % 24 * 3600) * 1000  # LPS
+    outlet_diameter = sizes[min(int(np.searchsorted(sizes, math.sqrt(4 * downstream[centre] / math.pi) * 1000)),
+                                len(sizes) - 1)]
+    supply_pattern = [1 if (start <= h < end if start < end else (h >= start or h < end)) else 0 for h in range(24)]
+
+    lines = ['[TITLE]', 'Synthetic IWS network: %d junctions, seed %d' % (num1, num2), '',
+             '[JUNCTIONS]', ';ID\tElev\tDemand\tPattern']
+    lines += ['J%d\t%.2f\t%.4f\tD%d\t;' % (i + 1, e, q, p + 1)
+              for i, (e, q, p) in enumerate(zip(elevations.tolist(), demands.tolist(), patterns.tolist()))]
+    lines += ['S\t%.2f\t%.4f\tSUPPLY\t;' % (tank_elevation + 5, -supply), '',
+              '[RESERVOIRS]', ';ID\tHead\tPattern', '',
+              '[TANKS]', ';ID\tElevation\tInitLevel\tMinLevel\tMaxLevel\tDiameter\tMinVol\tVolCurve',
+              'T\t%.2f\t1\t0.01\t4\t%.2f\t0\t\t;' % (tank_elevation, tank_diameter), '',
+              '[PIPES]', ';ID\tNode1\tNode2\tLength\tDiameter\tRoughness\tMinorLoss\tStatus',
+              'SUPPLY\tS\tT\t0.01\t%d\t130\t0\tOpen\t;' % outlet_diameter,
+              'OUTLET\tT\tJ%d\t100\t%d\t130\t0\tOpen\t;' % (centre + 1, outlet_diameter)]
+    lines += ['P%d\tJ%d\tJ%d\t100\t%d\t%d\t0\tOpen\t;' % (k + 1, a + 1, b + 1, pipe_diameters[k], 130 if tree[k] else 110)
+              for k, (a, b) in enumerate(edges.tolist()) if kept[k]]
+    lines += ['', '[PATTERNS]', ';ID\tMultipliers']
+    for p in range(num3):
+        multipliers = np.roll(diurnal, p) / diurnal.mean()
+        lines += ['D%d\t' % (p + 1) + '\t'.join('%.4f' % m for m in multipliers[i:i + 6]) for i in range(0, 24, 6)]
+    lines += ['SUPPLY\t' + '\t'.join(str(m) for m in supply_pattern[i:i + 6]) for i in range(0, 24, 6)]
+    lines += ['', '[TIMES]', ' Duration\t24:00', ' Hydraulic Timestep\t0:05', ' Pattern Timestep\t1:00',
+              ' Report Timestep\t1:00', ' Start ClockTime\t12 am', '',
+              '[OPTIONS]', ' Units\tLPS', ' Headloss\tH-W', ' Trials\t40', ' Accuracy\t0.001', ' Unbalanced\tContinue 10',
+              ' Pattern\t1', '', '[COORDINATES]', ';Node\tX-Coord\tY-Coord']
+    lines += ['J%d\t%d\t%d' % (i + 1, c * 100, -r * 100) for i, (r, c) in enumerate(zip(row.tolist(), col.tolist()))]
+    lines += ['T\t%d\t%d' % (col[centre] * 100 + 50, -row[centre] * 100 + 50),
+              'S\t%d\t%d' % (col[centre] * 100 + 50, -row[centre] * 100 + 100), '', '[END]', '']
+    folder = os.path.dirname(str1)
+    if folder != '' and os.path.exists(folder) != True:
+        os.makedirs(folder, exist_ok=True)
+    with open(str1, 'w') as f:
+        f.write('\n'.join(lines))
+    return {'omitted_nodes': ['S'], 'a_nodes': [], 'pc_demand': 60, 'household': 5, 'tank_in_pipe_name': ['SUPPLY'],
+            'tank_out_pipe_name': ['OUTLET']}
+
+
+def main(arr1=None):
+    """Command line interface
+    :arr1: list of command line arguments (optional, sys.argv if not given)
+    """
+    parser = argparse.ArgumentParser(description='Write a synthetic IWS network.')
+    parser.add_argument('junctions', type=int, help='number of consumer junctions')
+    parser.add_argument('output', help='path of the input file written')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--patterns', type=int, default=4, help='number of demand patterns')
+    parser.add_argument('--loops', type=float, default=0.2, help='fraction of the non-tree grid pipes kept')
+    parser.add_argument('--supply_hours', type=float, nargs=2, default=[6, 12], help='daily supply period in hours')
+    args = parser.parse_args(arr1)
+    parameters = synthetic_network(args.junctions, args.output, args.seed, args.patterns, args.loops,
+                                   args.supply_hours)
+    print('%s written, IWS parameters: %s' % (args.output, parameters))
+
+
+if __name__ == '__main__':
+    main()